@@ -13,6 +13,47 @@ const uint16_t SERVER_PORT = 5000;
 const uint32_t SEND_INTERVAL_MS = 20; // 50Hz
 // ====================================================
 
+// ===================== 재접속 설정 =====================
+// 끊기면 바로 재시도 후 지수 백오프, 접속 즉시 HELLO:<MAC>로 서버 세션을 이어받음
+const uint32_t RECONNECT_MIN_MS = 100;
+const uint32_t RECONNECT_MAX_MS = 2000;
+uint32_t reconnectDelayMs = RECONNECT_MIN_MS;
+uint32_t lastReconnectMs = 0;
+char deviceId[13];
+const char* PROFILE_NAME = "";      // 비워두면 대시보드에서 선택한 프로필 사용 (예: "alice" → HELLO:<MAC>,alice)
+
+// 연결이 끊긴 동안의 샘플 보관 (재접속 후 먼저 전송, 50Hz 기준 약 5초)
+struct Sample { int16_t ax, ay, az, gx, gy, gz; uint8_t btn; };
+const uint16_t BACKLOG_SIZE = 256;
+Sample backlog[BACKLOG_SIZE];
+uint16_t backlogHead = 0;
+uint16_t backlogCount = 0;
+// ====================================================
+
+// ===================== 적응형 전송 설정 =====================
+// 세트가 꺼져 있고 움직임이 없으면 요약(SUM)만 저속 전송, 움직임 감지 시 즉시 전체 속도 복귀
+// 서버가 접속 직후 "CFG:<threshold>,<window_ms>,<idle_enabled>" 로 값을 내려줌
+int32_t motionThreshold = 600;      // idle 평균 대비 가속도 변화량 (raw)
+uint32_t summaryWindowMs = 1000;    // 요약 전송 주기
+bool idleEnabled = false;           // 서버가 허용하기 전까지는 항상 전체 속도
+const uint32_t IDLE_HOLD_MS = 1500; // 마지막 움직임 이후 이 시간이 지나야 idle 진입
+
+bool idleMode = false;
+uint32_t lastMotionMs = 0;
+uint32_t windowStartMs = 0;
+// 움직임 판단 기준: 전체 속도에서는 최근 샘플의 이동 평균(1/REF_DIV), idle에서는 직전 요약 창의 평균
+// (중력이 포함된 원시값이므로 0이 아닌 현재 자세의 정지값과 비교해야 함)
+int32_t idleRef[3] = {0, 0, 0};
+bool idleRefValid = false;          // 첫 샘플로 초기화 전
+const int32_t REF_DIV = 4;
+int16_t winMin[3], winMax[3];
+int32_t winSum[3];
+uint16_t winCount = 0;
+
+char cfgLine[48];
+uint8_t cfgLen = 0;
+// ==========================================================
+
 // ===================== 버튼 설정 =====================
 #define BUTTON_PIN 3
 // bool sendingEnabled = false; // 제거됨
@@ -72,6 +113,67 @@ bool connectTCPOnce() {
   }
 }
 
+// 서버에 기기 식별자 전송 (재접속 시 같은 세션으로 이어받기)
+void sendHello() {
+  client.print("HELLO:");
+  client.print(deviceId);
+  if (PROFILE_NAME[0] != '\0') {
+    client.print(",");
+    client.print(PROFILE_NAME);
+  }
+  client.println();
+}
+
+void sendSample(const Sample &s) {
+  client.print(s.ax); client.print(",");
+  client.print(s.ay); client.print(",");
+  client.print(s.az); client.print(",");
+  client.print(s.gx); client.print(",");
+  client.print(s.gy); client.print(",");
+  client.print(s.gz); client.print(",");
+  client.println(s.btn); // 7번째 열: 세트 진행 상태
+}
+
+void pushBacklog(const Sample &s) {
+  backlog[(backlogHead + backlogCount) % BACKLOG_SIZE] = s;
+  if (backlogCount < BACKLOG_SIZE) backlogCount++;
+  else backlogHead = (backlogHead + 1) % BACKLOG_SIZE; // 가장 오래된 샘플부터 버림
+}
+
+void flushBacklog() {
+  if (backlogCount == 0) return;
+  Serial.print("Flushing backlog: ");
+  Serial.println(backlogCount);
+  while (backlogCount > 0 && client.connected()) {
+    sendSample(backlog[backlogHead]);
+    backlogHead = (backlogHead + 1) % BACKLOG_SIZE;
+    backlogCount--;
+  }
+}
+
+// 비차단 재접속: WiFi/TCP가 끊겼으면 백오프 간격으로 한 번씩만 시도 (그 사이 샘플은 backlog에 보관)
+void maintainConnection() {
+  if (client.connected()) return;
+  if (millis() - lastReconnectMs < reconnectDelayMs) return;
+  lastReconnectMs = millis();
+
+  if (WiFi.status() != WL_CONNECTED) {
+    Serial.println("WiFi lost, rejoining...");
+    WiFi.begin(WIFI_SSID, WIFI_PASS);
+  }
+  client.stop();
+  if (WiFi.status() == WL_CONNECTED && connectTCPOnce()) {
+    reconnectDelayMs = RECONNECT_MIN_MS;
+    // 새 연결은 서버 설정을 받을 때까지 전체 속도로 시작
+    idleEnabled = false;
+    idleMode = false;
+    sendHello();
+    flushBacklog();
+  } else {
+    reconnectDelayMs = min(reconnectDelayMs * 2, RECONNECT_MAX_MS);
+  }
+}
+
 void stopTCP() {
   if (client.connected()) {
     client.stop();
@@ -82,6 +184,77 @@ void stopTCP() {
 // 버튼 처리(눌렀을 때 세트 상태 토글)
 bool setInProgress = false;
 
+// 서버 설정 수신: "CFG:threshold,window_ms,idle_enabled"
+void readServerConfig() {
+  while (client.available()) {
+    char c = client.read();
+    if (c == '\n') {
+      cfgLine[cfgLen] = '\0';
+      if (strncmp(cfgLine, "CFG:", 4) == 0) {
+        long thr = 0, win = 0, idle = 0;
+        if (sscanf(cfgLine + 4, "%ld,%ld,%ld", &thr, &win, &idle) == 3) {
+          motionThreshold = thr;
+          summaryWindowMs = win;
+          idleEnabled = (idle != 0);
+          Serial.print("Stream config: threshold=");
+          Serial.print(motionThreshold);
+          Serial.print(" window=");
+          Serial.print(summaryWindowMs);
+          Serial.print(" idle=");
+          Serial.println(idleEnabled ? "ON" : "OFF");
+        }
+      }
+      cfgLen = 0;
+    } else if (c != '\r' && cfgLen < sizeof(cfgLine) - 1) {
+      cfgLine[cfgLen++] = c;
+    }
+  }
+}
+
+void resetWindow(uint32_t now) {
+  windowStartMs = now;
+  winCount = 0;
+  for (int i = 0; i < 3; i++) {
+    winMin[i] = 32767;
+    winMax[i] = -32768;
+    winSum[i] = 0;
+  }
+}
+
+// SUM:n,minx,miny,minz,maxx,maxy,maxz,meanx,meany,meanz,btn
+void sendSummary(uint32_t now) {
+  if (winCount > 0) {
+    client.print("SUM:");
+    client.print(winCount);
+    for (int i = 0; i < 3; i++) { client.print(","); client.print(winMin[i]); }
+    for (int i = 0; i < 3; i++) { client.print(","); client.print(winMax[i]); }
+    for (int i = 0; i < 3; i++) {
+      idleRef[i] = winSum[i] / winCount;
+      client.print(","); client.print(idleRef[i]);
+    }
+    client.print(",");
+    client.println(setInProgress ? 1 : 0);
+  }
+  resetWindow(now);
+}
+
+bool isMoving(const VectorInt16 &a) {
+  if (!idleRefValid) {
+    idleRef[0] = a.x; idleRef[1] = a.y; idleRef[2] = a.z;
+    idleRefValid = true;
+  }
+  return abs(a.x - idleRef[0]) > motionThreshold ||
+         abs(a.y - idleRef[1]) > motionThreshold ||
+         abs(a.z - idleRef[2]) > motionThreshold;
+}
+
+// 전체 속도 전송 중 기준값을 현재 자세로 따라감 (내려놓은 자세가 바뀌어도 정지 판정 가능)
+void trackRestRef(const VectorInt16 &a) {
+  idleRef[0] += (a.x - idleRef[0]) / REF_DIV;
+  idleRef[1] += (a.y - idleRef[1]) / REF_DIV;
+  idleRef[2] += (a.z - idleRef[2]) / REF_DIV;
+}
+
 void handleButtonToggle() {
   bool reading = digitalRead(BUTTON_PIN);
 
@@ -119,6 +292,11 @@ void setup() {
 
   // WiFi
   connectWiFi();
+  uint8_t mac[6];
+  WiFi.macAddress(mac);
+  snprintf(deviceId, sizeof(deviceId), "%02X%02X%02X%02X%02X%02X", mac[0], mac[1], mac[2], mac[3], mac[4], mac[5]);
+  Serial.print("Device ID: ");
+  Serial.println(deviceId);
 
   // MPU init
   Serial.println("Initializing MPU6050...");
@@ -157,14 +335,10 @@ void loop() {
   // 버튼 토글 처리 (세트 상태만 관리)
   handleButtonToggle();
 
-  // 상시 연결 유지 시도 (자동 연결)
-  static uint32_t lastReconnectMs = 0;
-  if (!client.connected() && millis() - lastReconnectMs > 2000) {
-    lastReconnectMs = millis();
-    Serial.println("Attempting automatic TCP connection...");
-    connectTCPOnce();
-  }
-  if (!client.connected()) return;
+  // 상시 연결 유지 시도 (자동 연결, 백오프)
+  maintainConnection();
+  bool online = client.connected();
+  if (online) readServerConfig();
 
   // 전송 주기 제한 (상시 전송)
   uint32_t now = millis();
@@ -197,15 +371,44 @@ void loop() {
       mpu.dmpGetAccel(&aa, fifoBuffer);
       mpu.dmpGetGyro(&gg, fifoBuffer);
 
+      Sample cur = {aa.x, aa.y, aa.z, gg.x, gg.y, gg.z, (uint8_t)(setInProgress ? 1 : 0)};
+
+      // 연결이 끊긴 동안에는 전체 샘플을 보관했다가 재접속 직후 전송
+      if (!online) {
+        pushBacklog(cur);
+        return;
+      }
+
+      // 적응형 전송: 세트 중이거나 움직임이 있으면 전체 속도, 아니면 요약만 누적
+      // 움직임 여부는 기준값 갱신 전에 판단 (이동 평균 대비 변화량)
+      bool moving = isMoving(aa);
+      if (!idleMode) trackRestRef(aa);
+      if (setInProgress || !idleEnabled || moving) {
+        lastMotionMs = now;
+        if (idleMode) {
+          sendSummary(now); // 남은 요약을 먼저 보내고 전체 속도로 복귀
+          idleMode = false;
+        }
+      } else if (!idleMode && now - lastMotionMs > IDLE_HOLD_MS) {
+        // 기준값은 정지 구간의 이동 평균 그대로 사용, 이후 요약 창마다 창 평균으로 갱신
+        idleMode = true;
+        resetWindow(now);
+      }
+
+      if (idleMode) {
+        int16_t v[3] = {aa.x, aa.y, aa.z};
+        for (int i = 0; i < 3; i++) {
+          if (v[i] < winMin[i]) winMin[i] = v[i];
+          if (v[i] > winMax[i]) winMax[i] = v[i];
+          winSum[i] += v[i];
+        }
+        winCount++;
+        if (now - windowStartMs >= summaryWindowMs) sendSummary(now);
+        return;
+      }
+
       // CSV 전송
-      client.print(aa.x); client.print(",");
-      client.print(aa.y); client.print(",");
-      client.print(aa.z); client.print(",");
-      client.print(gg.x); client.print(",");
-      client.print(gg.y); client.print(",");
-      client.print(gg.z); client.print(",");
-      client.println(setInProgress ? 1 : 0); // 7번째 열: 세트 진행 상태
+      sendSample(cur);
     }
   }
 }
-
@@ -1,9 +1,15 @@
 import json
 import os
 import math
+from collections import namedtuple
 from datetime import datetime
+import numpy as np
 from config import *
 
+def new_channel_buffer():
+    """Empty per-channel sample buffer (accel + gyro)"""
+    return {ch: [] for ch in CHANNELS}
+
 def get_active_axes(ref_data, baseline):
     """Identify axes that show significant movement compared to baseline in expert data"""
     if not ref_data or not baseline:
@@ -37,63 +43,204 @@ def get_expert_peak(ref_data, active_axes=None):
         
     return max(mags) if mags else 0.0
 
-def save_set_to_json(set_data, set_num, avg_similarity):
-    """Archive entire set data into a single JSON file"""
+def get_active_channels(ref_data, baseline):
+    """Identify accel and gyro channels that move significantly in expert data"""
+    if not ref_data or not baseline:
+        return list(ACCEL_AXES)
+
+    active = get_active_axes(ref_data, baseline)
+
+    # 자이로 채널: 이전 버전 Reference에는 자이로 데이터가 없을 수 있음
+    for ch in GYRO_AXES:
+        if not ref_data.get(ch):
+            continue
+        base_val = baseline.get(ch, 0.0)
+        tol = max(abs(base_val) * MOVEMENT_TOLERANCE_PERCENT, GYRO_MIN_ABS_DIFF)
+        if abs(max(ref_data[ch]) - base_val) > tol or abs(min(ref_data[ch]) - base_val) > tol:
+            active.append(ch)
+
+    return active
+
+def get_tolerances(baseline, movement_tol_pct=MOVEMENT_TOLERANCE_PERCENT, min_abs_diff=MIN_ABS_DIFF,
+                   noise_sigma_k=NOISE_SIGMA_K, min_noise_tol=MIN_NOISE_TOLERANCE):
+    """Per-axis movement tolerance around the baseline.
+
+    In "NOISE" mode the tolerance is NOISE_SIGMA_K times the sigma measured during
+    calibration; baselines saved without noise stats fall back to the percent rule.
+    The parameters default to config.py (the tuner replays other values).
+    """
+    std = baseline.get("std")
+    if THRESHOLD_MODE == "NOISE" and std:
+        return {axis: max(noise_sigma_k * std[axis], min_noise_tol) for axis in ACCEL_AXES}
+    return {axis: max(abs(baseline[axis]) * movement_tol_pct, min_abs_diff) for axis in ACCEL_AXES}
+
+def track_baseline(baseline, sample, alpha=BASELINE_TRACK_ALPHA):
+    """Nudge the baseline toward a still sample (slow EMA to follow sensor drift)"""
+    for axis in ACCEL_AXES:
+        baseline[axis] += alpha * (sample[axis] - baseline[axis])
+
+def movement_mask(ax_list, ay_list, az_list, baseline, min_run=SPIKE_MIN_RUN):
+    """Boolean out-of-range mask for a whole buffer (one NumPy expression, tolerances computed once)"""
+    tols = get_tolerances(baseline)
+    acc = np.asarray([ax_list, ay_list, az_list], dtype=float)
+    base = np.asarray([baseline[axis] for axis in ACCEL_AXES], dtype=float)[:, None]
+    tol = np.asarray([tols[axis] for axis in ACCEL_AXES], dtype=float)[:, None]
+    mask = (np.abs(acc - base) > tol).any(axis=0)
+    return suppress_short_runs(mask, min_run) if min_run > 1 else mask
+
+def suppress_short_runs(mask, min_run):
+    """Clear out-of-range runs shorter than min_run samples (isolated spikes)"""
+    edges = np.diff(mask.astype(np.int8), prepend=0, append=0)
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+    short = (ends - starts) < min_run
+    if not short.any():
+        return mask
+    # 짧은 구간의 시작(-1)/끝(+1) 표시를 누적합하여 해당 샘플만 지움
+    clear = np.zeros(len(mask) + 1, dtype=np.int32)
+    np.add.at(clear, starts[short], 1)
+    np.add.at(clear, ends[short], -1)
+    return mask & (np.cumsum(clear[:-1]) == 0)
+
+def movement_bursts(out_mask, still_samples):
+    """(starts, ends) of movement bursts for a boolean out-of-range mask.
+
+    A burst starts on the first out-of-range sample and ends on the in-range sample
+    that comes more than still_samples after the first still one, as in DeviceHandler.
+    """
+    n = len(out_mask)
+    out_idx = np.flatnonzero(out_mask)
+    if len(out_idx) == 0:
+        return out_idx, out_idx
+    gaps = np.diff(out_idx) - 1
+    # 정지 판정은 첫 정지 샘플 이후 still_samples를 "초과"한 다음 샘플에서 이뤄짐 (still_samples + 2개 필요)
+    breaks = np.flatnonzero(gaps > still_samples + 1)
+    starts = out_idx[np.concatenate(([0], breaks + 1))]
+    last_out = out_idx[np.concatenate((breaks, [len(out_idx) - 1]))]
+    ends = np.minimum(last_out + still_samples + 2, n)
+    return starts, ends
+
+def split_movement_bursts(set_data, baseline, still_samples=None):
+    """Split a recorded set into per-rep bursts offline.
+
+    Mirrors the live start/stop rule in DeviceHandler, but measures the still period
+    in samples (STILL_TIME_LIMIT * SAMPLE_RATE_HZ) instead of wall-clock time.
+    """
+    if still_samples is None:
+        still_samples = max(1, int(STILL_TIME_LIMIT * SAMPLE_RATE_HZ))
+    mask = movement_mask(set_data["ax"], set_data["ay"], set_data["az"], baseline)
+    starts, ends = movement_bursts(mask, still_samples)
+    
+    return [{ch: vals[s:e] for ch, vals in set_data.items()}
+            for s, e in zip(starts.tolist(), ends.tolist()) if e - s >= MIN_MOVEMENT_SAMPLES]
+
+def save_set_to_json(set_data, set_num, avg_similarity, reps_dir=REPS_DIR, offsets=None, motion_baseline=None,
+                     rep_features=None):
+    """Archive entire set data into a single JSON file (returns the file name).
+
+    offsets, motion_baseline, the filter chain and the per-rep features let report.py
+    rebuild the set report without the live session. The data itself stays raw.
+    """
     if not set_data or not set_data.get("ax"): return
     
-    os.makedirs(REPS_DIR, exist_ok=True)
+    os.makedirs(reps_dir, exist_ok=True)
     ts = datetime.now().strftime("%Y%m%d_%H%M%S")
     filename = f"set_{set_num}_{ts}.json"
-    filepath = os.path.join(REPS_DIR, filename)
+    filepath = os.path.join(reps_dir, filename)
     
     data = {
         "set_num": set_num,
         "timestamp": ts,
         "avg_similarity": avg_similarity,
+        "offsets": list(offsets or []),
+        "motion_baseline": motion_baseline,
+        "filters": list(FILTER_CHAIN),  # 검출에 쓰인 필터 (filters.filter_batch로 재현)
+        "rep_features": [f._asdict() for f in rep_features or []],
         "data": set_data
     }
     
     with open(filepath, "w") as f:
-        json.dump(data, f)
+        json.dump(data, f, default=float)
     print(f">>> Full Set #{set_num} Data Archived: {filepath}")
+    return filename
 
 # def save_rep_to_json(ax_list, ay_list, az_list, rep_num, similarity):
 #     """(Deprecated) Archive single rep data"""
 
+def _padded_bounds(first, last, n):
+    """Apply the ±2 sample margin and the minimum-length rule to first/last out-of-range indices"""
+    # 시작과 종료 지점에 약간의 마진(Padding) 추가
+    final_start = max(0, first - 2)
+    final_end = min(n - 1, last + 2)
+    if final_end - final_start + 1 >= MIN_MOVEMENT_SAMPLES:
+        return final_start, final_end + 1
+    return None
+
+def find_movement_bounds(ax_list, ay_list, az_list, baseline, min_run=SPIKE_MIN_RUN):
+    """Return (start, end) slice bounds of the active movement portion, or None"""
+    out_idx = np.flatnonzero(movement_mask(ax_list, ay_list, az_list, baseline, min_run))
+    if len(out_idx) == 0:
+        return None
+    return _padded_bounds(int(out_idx[0]), int(out_idx[-1]), len(ax_list))
+
+def find_movement_bounds_batch(reps, baseline, min_run=SPIKE_MIN_RUN):
+    """find_movement_bounds for every rep of a set with a single mask computation.
+
+    Reps are concatenated with one NaN sample between them (never out of range), so
+    spike runs cannot merge across reps; first/last indices per rep come from the
+    offsets of the flattened mask.
+    """
+    if not reps:
+        return []
+    lengths = np.asarray([len(rep["ax"]) for rep in reps])
+    starts = np.concatenate(([0], np.cumsum(lengths + 1)[:-1]))
+    sep = np.array([np.nan])
+    joined = {axis: np.concatenate([part for rep in reps for part in (np.asarray(rep[axis], dtype=float), sep)])
+              for axis in ACCEL_AXES}
+    out_idx = np.flatnonzero(movement_mask(joined["ax"], joined["ay"], joined["az"], baseline, min_run))
+
+    # 각 rep의 첫/마지막 이탈 인덱스 (out_idx는 정렬되어 있으므로 rep 번호별 첫 등장/마지막 등장 위치)
+    rep_of = np.searchsorted(starts, out_idx, side="right") - 1
+    first = np.full(len(reps), -1)
+    last = np.full(len(reps), -1)
+    ids, pos = np.unique(rep_of, return_index=True)
+    first[ids] = out_idx[pos] - starts[ids]
+    ids, pos = np.unique(rep_of[::-1], return_index=True)
+    last[ids] = out_idx[len(out_idx) - 1 - pos] - starts[ids]
+    return [_padded_bounds(int(f), int(l), int(n)) if f >= 0 else None for f, l, n in zip(first, last, lengths)]
+
 def extract_movement_segment(ax_list, ay_list, az_list, baseline):
     """Extract active movement portion using baseline values and thresholds"""
     if not baseline or len(ax_list) < MIN_MOVEMENT_SAMPLES:
         return ax_list, ay_list, az_list
     
-    start_idx = -1
-    end_idx = -1
-    
-    for i in range(len(ax_list)):
-        diff_x = abs(ax_list[i] - baseline["ax"])
-        diff_y = abs(ay_list[i] - baseline["ay"])
-        diff_z = abs(az_list[i] - baseline["az"])
-        
-        # MOVEMENT_TOLERANCE_PERCENT 기준으로 임계치 계산
-        tol_x = max(abs(baseline["ax"]) * MOVEMENT_TOLERANCE_PERCENT, MIN_ABS_DIFF)
-        tol_y = max(abs(baseline["ay"]) * MOVEMENT_TOLERANCE_PERCENT, MIN_ABS_DIFF)
-        tol_z = max(abs(baseline["az"]) * MOVEMENT_TOLERANCE_PERCENT, MIN_ABS_DIFF)
-
-        if diff_x > tol_x or diff_y > tol_y or diff_z > tol_z:
-            if start_idx == -1:
-                start_idx = i
-            end_idx = i
-            
-    if start_idx != -1 and end_idx != -1:
-        # 시작과 종료 지점에 약간의 마진(Padding) 추가
-        final_start = max(0, start_idx - 2)
-        final_end = min(len(ax_list) - 1, end_idx + 2)
-        
-        trimmed_len = final_end - final_start + 1
-        if trimmed_len >= MIN_MOVEMENT_SAMPLES:
-            return ax_list[final_start:final_end+1], ay_list[final_start:final_end+1], az_list[final_start:final_end+1]
+    bounds = find_movement_bounds(ax_list, ay_list, az_list, baseline)
+    if bounds:
+        start, end = bounds
+        return ax_list[start:end], ay_list[start:end], az_list[start:end]
     
     return [], [], []
 
+def extract_movement_channels(rep_data, baseline):
+    """Extract the active movement portion of every channel (accel + gyro) in rep_data"""
+    return extract_movement_channels_batch([rep_data], baseline)[0]
+
+def extract_movement_channels_batch(reps, baseline):
+    """extract_movement_channels over all reps of a set at once"""
+    if not baseline:
+        return list(reps)
+    # 짧은 rep은 그대로 두고 나머지만 한 번에 구간 탐색
+    todo = [i for i, rep in enumerate(reps) if len(rep["ax"]) >= MIN_MOVEMENT_SAMPLES]
+    out = list(reps)
+    for i, bounds in zip(todo, find_movement_bounds_batch([reps[i] for i in todo], baseline)):
+        # 가속도 기준으로 찾은 구간을 자이로 채널에도 동일하게 적용
+        if not bounds:
+            out[i] = {}
+        else:
+            start, end = bounds
+            out[i] = {ch: vals[start:end] for ch, vals in reps[i].items()}
+    return out
+
 def calculate_similarity(ref_list, cur_list):
     if not ref_list or not cur_list: return 0.0
     n_ref = len(ref_list)
@@ -114,6 +261,112 @@ def calculate_similarity(ref_list, cur_list):
     sim = max(0, 100 * (1 - (diff_sum / max_diff)))
     return sim
 
+def resample_rows(rows, n_out):
+    """Linearly resample every row of a (channels, n) array to n_out points (calculate_similarity's rule)"""
+    n_in = rows.shape[1]
+    if n_in == 1:
+        return np.repeat(rows, n_out, axis=1)
+    # 모든 채널이 같은 리샘플링 위치를 공유하므로 인덱스/보간 계수는 한 번만 계산
+    pos = np.arange(n_out) * ((n_in - 1) / (n_out - 1)) if n_out > 1 else np.zeros(1)
+    idx = np.minimum(pos.astype(int), n_in - 2)
+    frac = pos - idx
+    return rows[:, idx] * (1 - frac) + rows[:, idx + 1] * frac
+
+def build_expert_template(takes):
+    """Expert reference from several recorded takes: per-point mean trajectory and std envelope.
+
+    Each take is time-normalized to the mean take length, so the template keeps the
+    usual {channel: values} layout (everything reading ref_data[channel] sees the mean)
+    plus "std" ({channel: values}) and "takes" for the ZSCORE scoring mode.
+    """
+    channels = [ch for ch in CHANNELS if all(len(take.get(ch, ())) for take in takes)]
+    n = max(2, int(round(np.mean([len(take["ax"]) for take in takes]))))
+    # (takes, channels, n): 모든 기록을 같은 길이로 맞춘 뒤 점별 평균/표준편차를 한 번에 계산
+    stack = np.stack([resample_rows(np.asarray([take[ch] for ch in channels], dtype=float), n) for take in takes])
+    mean, std = stack.mean(axis=0), stack.std(axis=0)
+    template = {ch: np.round(mean[i], 2).tolist() for i, ch in enumerate(channels)}
+    template["std"] = {ch: np.round(std[i], 2).tolist() for i, ch in enumerate(channels)}
+    template["takes"] = len(takes)
+    return template
+
+def calculate_similarity_multi(ref_data, cur_data, channels):
+    """Vectorized similarity over several channels at once, normalized per channel.
+
+    Returns (average, {channel: score}). Each channel uses the same resampling and
+    scoring rule as calculate_similarity, so "ACCEL" mode matches the legacy result.
+    In "ZSCORE" mode a reference with a std envelope (build_expert_template) scores the
+    per-point deviation in units of the expert's own spread instead of the channel range.
+    """
+    channels = [ch for ch in channels if len(ref_data.get(ch, ())) and len(cur_data.get(ch, ()))]
+    if not channels:
+        return 0.0, {}
+    n_cur = len(cur_data[channels[0]])
+    if n_cur < 5:
+        return 0.0, {ch: 0.0 for ch in channels}
+
+    ref = np.asarray([ref_data[ch] for ch in channels], dtype=float)
+    cur = np.asarray([cur_data[ch] for ch in channels], dtype=float)
+    n_ref = ref.shape[1]
+    resampled = resample_rows(cur, n_ref)
+
+    floors = np.array([MIN_GYRO_RANGE if ch in GYRO_AXES else MIN_ACCEL_RANGE for ch in channels])
+    ranges = np.maximum(ref.max(axis=1) - ref.min(axis=1), floors)
+    std = ref_data.get("std") if SCORING_MODE == "ZSCORE" else None
+    if std and all(ch in std for ch in channels):
+        # 점별 표준편차(하한: 범위 비율)로 나눈 편차 중 허용 범위(σ)를 넘은 부분의 평균으로 감점
+        sigma = np.maximum(np.asarray([std[ch] for ch in channels], dtype=float), (ranges * ZSCORE_STD_FLOOR)[:, None])
+        excess = np.maximum(np.abs(ref - resampled) / sigma - ZSCORE_TOLERANCE, 0)
+        scores = np.maximum(0, 100 * (1 - excess.mean(axis=1) / ZSCORE_LIMIT))
+    else:
+        diff_sum = np.abs(ref - resampled).sum(axis=1)
+        scores = np.maximum(0, 100 * (1 - diff_sum / (ranges * n_ref)))
+
+    return float(scores.mean()), {ch: float(sc) for ch, sc in zip(channels, scores)}
+
+def get_scoring_channels(ref_data, baseline):
+    """Channels used for similarity according to SIMILARITY_MODE"""
+    if SIMILARITY_MODE == "SIX_AXIS":
+        return get_active_channels(ref_data, baseline)
+    return list(ACCEL_AXES)
+
+# 회차 종료 시 한 번 계산해 세트 정산, 아카이브, 보고서, 대시보드가 그대로 재사용하는 회차 특징
+RepFeatures = namedtuple("RepFeatures", ["start", "end", "samples", "duration", "peak_mag", "rms",
+                                         "concentric", "eccentric", "similarity", "scores"])
+
+def compute_rep_features(rep_data, baseline, ref_data, channels, active_axes, sample_rate=SAMPLE_RATE_HZ):
+    """(RepFeatures, trimmed channels) for one rep, or (None, None) if it has no movement segment.
+
+    The buffers are converted to arrays once; segment bounds, active-axis magnitude
+    (peak, RMS and the concentric/eccentric split at the peak) and the similarity scores
+    all come from that single conversion.
+    """
+    arrays = {ch: np.asarray(vals, dtype=float) for ch, vals in rep_data.items() if len(vals)}
+    n = len(arrays["ax"])
+    if not baseline or n < MIN_MOVEMENT_SAMPLES:
+        start, end = 0, n
+    else:
+        bounds = find_movement_bounds(arrays["ax"], arrays["ay"], arrays["az"], baseline)
+        if bounds is None:
+            return None, None
+        start, end = bounds
+    trimmed = {ch: a[start:end] for ch, a in arrays.items()}
+
+    mag = np.sqrt(sum(trimmed[axis] ** 2 for axis in active_axes))
+    peak = int(mag.argmax())
+    similarity, scores = calculate_similarity_multi(ref_data, trimmed, channels) if ref_data else (0.0, {})
+    features = RepFeatures(
+        start=start, end=end, samples=end - start,
+        duration=round((end - start) / sample_rate, 2),
+        peak_mag=round(float(mag[peak]), 1),
+        rms=round(float(np.sqrt(np.mean(mag ** 2))), 1),
+        # 활성 축 크기가 최대인 지점을 기준으로 들어올리는 구간 / 내리는 구간 시간
+        concentric=round(peak / sample_rate, 2),
+        eccentric=round((end - start - 1 - peak) / sample_rate, 2),
+        similarity=round(similarity, 2),
+        scores={ch: round(sc, 2) for ch, sc in scores.items()},
+    )
+    return features, trimmed
+
 def process_rep(ax_buf, ay_buf, az_buf, stats, session_reps=None):
     """Simple activity burst counting: count any significant movement that stopped"""
     if len(ax_buf) >= MIN_MOVEMENT_SAMPLES:
@@ -122,9 +375,9 @@ def process_rep(ax_buf, ay_buf, az_buf, stats, session_reps=None):
         
         if session_reps is not None:
             # Store the raw burst for later analysis
-            session_reps.append((list(ax_buf), list(ay_buf), list(az_buf)))
+            session_reps.append({"ax": list(ax_buf), "ay": list(ay_buf), "az": list(az_buf)})
         
         stats["similarity"] = 0 
-        stats["current_distribution"] = []
+        stats["current_samples"] = 0
         return True
     return False
@@ -0,0 +1,339 @@
+import asyncio
+import io
+import socket
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import unquote
+
+from config import WEB_WSGI_WORKERS, SSE_TICK, SSE_MAX_BUFFER, SSE_HEARTBEAT, OVERVIEW_INTERVAL
+from web_server import wave_frame, update_frame, stats_changed, station_summaries, overview_frame
+
+MAX_HEADER_BYTES = 64 * 1024
+MAX_BODY_BYTES = 1024 * 1024  # 대시보드 요청 본문(프로필 선택 등)은 작으므로 이보다 크면 413
+SSE_HEADERS = (b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nCache-Control: no-cache\r\n"
+               b"X-Accel-Buffering: no\r\nConnection: keep-alive\r\n\r\n")
+
+OVERVIEW = object()  # 전체 아령 요약 채널 (기기 ID와 겹치지 않는 키)
+
+class _StreamClient:
+    __slots__ = ("writer", "channel", "waveform", "wave_seq", "wave_value", "needs_update")
+
+    def __init__(self, writer, channel):
+        self.writer = writer
+        self.channel = channel    # 기기 ID, None (가장 최근 아령) 또는 OVERVIEW
+        self.waveform = None
+        self.wave_seq = 0
+        self.wave_value = 0
+        self.needs_update = True  # 접속 직후 현재 상태 한 번 전송
+
+class AsyncWebServer:
+    """Production serving mode: one asyncio loop for all dashboard connections.
+
+    /stream, /stream/<device> and /overview/stream clients are plain coroutines fed by a
+    single broadcaster that encodes each frame once per tick and channel and writes it to
+    every client of that channel (no thread per client). Other routes are handed to the
+    Flask app on a small thread pool. A client whose unsent buffer exceeds SSE_MAX_BUFFER
+    is dropped instead of growing server memory.
+    """
+
+    def __init__(self, web_server, host, port):
+        self.web_server = web_server
+        self.wsgi_app = web_server.app.wsgi_app
+        self.app_state = web_server.app_state
+        self.host = host
+        self.port = port
+        self.clients = set()
+        self._last_sent = {}        # 채널별 마지막으로 보낸 상태
+        self._overview = None       # 마지막으로 보낸 요약 목록
+        self._overview_at = 0.0
+        self.executor = ThreadPoolExecutor(max_workers=WEB_WSGI_WORKERS, thread_name_prefix="wsgi")
+        self.handlers = set()   # 연결별 처리 태스크
+        self.idle = set()       # 다음 요청을 기다리는 keep-alive 연결 (종료 시 바로 닫아도 됨)
+        self.loop = None
+        self.started = threading.Event()
+        self.stopping = False
+
+    def serve_forever(self):
+        asyncio.run(self._main())
+
+    def shutdown(self, timeout=5.0):
+        """Thread-safe graceful stop: stop accepting, tell streams to go away, drain requests"""
+        if self.loop is None or self.stopping:
+            return
+        future = asyncio.run_coroutine_threadsafe(self._shutdown(timeout), self.loop)
+        try:
+            future.result(timeout + 1.0)
+        except Exception as e:
+            print(f"[WEB] Shutdown did not finish cleanly: {e}")
+
+    async def _main(self):
+        self.loop = asyncio.get_running_loop()
+        self.server = await asyncio.start_server(self._handle_connection, self.host, self.port,
+                                                 limit=MAX_HEADER_BYTES, backlog=1024)
+        self.port = self.server.sockets[0].getsockname()[1]
+        self.broadcaster = asyncio.create_task(self._broadcast_loop())
+        self.stopped = asyncio.Event()
+        print(f">>> Web server (async) on {self.host}:{self.port}")
+        self.started.set()
+        await self.stopped.wait()
+
+    async def _shutdown(self, timeout):
+        self.stopping = True
+        self.server.close()
+        self.broadcaster.cancel()
+        # EventSource는 끊기면 자동 재접속하므로 재시도 간격을 늘려 안내 후 종료
+        for client in list(self.clients):
+            client.writer.write(b"retry: 5000\nevent: shutdown\ndata: {}\n\n")
+            client.writer.close()
+        self.clients.clear()
+        for writer in list(self.idle):
+            writer.close()
+        # 처리 중인 일반 요청은 응답까지 마치도록 대기, 시간 초과분만 강제 종료
+        if self.handlers:
+            _, pending = await asyncio.wait(list(self.handlers), timeout=timeout)
+            for task in pending:
+                task.cancel()
+        await self.loop.run_in_executor(None, self.executor.shutdown, True)
+        print(">>> Web server stopped")
+        self.stopped.set()
+
+    def _channel_update(self, channel, clients):
+        """(waveform, changed, encoded update or None) for one device channel, once per tick"""
+        stats, waveform = self.app_state.view(channel)
+        changed = stats_changed(stats, self._last_sent.get(channel, {}))
+        if changed:
+            self._last_sent[channel] = stats
+        last = self._last_sent.get(channel, stats)
+        update = update_frame(last).encode() if changed or any(c.needs_update for c in clients) else None
+        return waveform, changed, update
+
+    def _overview_update(self, clients):
+        """Encoded overview frame for this tick, or None (capped at OVERVIEW_INTERVAL)"""
+        now = self.loop.time()
+        if now - self._overview_at >= OVERVIEW_INTERVAL:
+            self._overview_at = now
+            summaries = station_summaries(self.app_state.sessions)
+            if summaries != self._overview:
+                self._overview = summaries
+                for client in clients:
+                    client.needs_update = True
+        if self._overview is None or not any(c.needs_update for c in clients):
+            return None
+        return overview_frame(self._overview).encode()
+
+    async def _broadcast_loop(self):
+        idle = 0.0
+        while True:
+            await asyncio.sleep(SSE_TICK)
+            if not self.clients:
+                continue
+            channels = {}
+            for client in list(self.clients):
+                channels.setdefault(client.channel, []).append(client)
+            # 구독자가 없는 채널의 상태는 버림 (다시 접속하면 needs_update로 전체 전송)
+            self._last_sent = {ch: v for ch, v in self._last_sent.items() if ch in channels}
+
+            sent_any = False
+            for channel, clients in channels.items():
+                if channel is OVERVIEW:
+                    update = self._overview_update(clients)
+                    if update:
+                        sent_any = True
+                        for client in clients:
+                            if client.needs_update:
+                                client.needs_update = False
+                                self._send(client, update)
+                    continue
+
+                waveform, changed, update = self._channel_update(channel, clients)
+                # 같은 파형 상태의 클라이언트끼리는 프레임을 한 번만 만듦 (보통 전원이 같은 상태)
+                wave_frames = {}
+                for client in clients:
+                    if client.waveform is not waveform:
+                        # 다른 아령(새 세션)으로 바뀌면 파형을 처음부터 다시 보냄
+                        client.waveform = waveform
+                        client.wave_seq = client.wave_value = 0
+                    key = (client.wave_seq, client.wave_value)
+                    if key not in wave_frames:
+                        delta = waveform.delta_since(*key)
+                        wave_frames[key] = (delta[0], delta[3], wave_frame(delta).encode()) if delta else None
+                    frames = []
+                    wave = wave_frames[key]
+                    if wave:
+                        client.wave_seq, client.wave_value, data = wave
+                        frames.append(data)
+                    if update and (changed or client.needs_update):
+                        client.needs_update = False
+                        frames.append(update)
+                    if frames:
+                        sent_any = True
+                        self._send(client, b"".join(frames))
+
+            idle = 0.0 if sent_any else idle + SSE_TICK
+            if idle >= SSE_HEARTBEAT:
+                idle = 0.0
+                for client in list(self.clients):
+                    self._send(client, b": ping\n\n")
+
+    def _send(self, client, data):
+        transport = client.writer.transport
+        if transport.is_closing() or transport.get_write_buffer_size() > SSE_MAX_BUFFER:
+            self.clients.discard(client)
+            transport.abort()
+            return
+        client.writer.write(data)
+
+    async def _handle_connection(self, reader, writer):
+        task = asyncio.current_task()
+        self.handlers.add(task)
+        try:
+            while not self.stopping:
+                self.idle.add(writer)
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                    break
+                finally:
+                    self.idle.discard(writer)
+                request_line, headers = self._parse_head(head)
+                if request_line is None:
+                    writer.write(b"HTTP/1.1 400 Bad Request\r\nContent-Length: 0\r\nConnection: close\r\n\r\n")
+                    break
+                method, target, version = request_line
+                length, error = self._body_length(headers)
+                if error:
+                    writer.write(f"HTTP/1.1 {error}\r\nContent-Length: 0\r\nConnection: close\r\n\r\n".encode())
+                    break
+                body = b""
+                if length:
+                    body = await reader.readexactly(length)
+
+                path = target.split("?", 1)[0]
+                channel = self._stream_channel(path) if method == "GET" else False
+                if channel is not False:
+                    await self._serve_stream(reader, writer, channel)
+                    return
+
+                keep_alive = self._keep_alive(version, headers)
+                response = await self.loop.run_in_executor(
+                    self.executor, self._call_wsgi, method, target, version, headers, body, writer)
+                writer.write(response(keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, RuntimeError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            pass
+        finally:
+            self.handlers.discard(task)
+            if not writer.transport.is_closing():
+                writer.close()
+
+    @staticmethod
+    def _stream_channel(path):
+        """SSE channel for a request path, or False for ordinary (Flask) routes"""
+        if path == "/stream":
+            return None
+        if path == "/overview/stream":
+            return OVERVIEW
+        if path.startswith("/stream/") and len(path) > len("/stream/"):
+            return unquote(path[len("/stream/"):])
+        return False
+
+    async def _serve_stream(self, reader, writer, channel):
+        sock = writer.get_extra_info("socket")
+        if sock is not None:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        writer.write(SSE_HEADERS)
+        client = _StreamClient(writer, channel)
+        self.clients.add(client)
+        try:
+            # 브라우저는 더 보내지 않으므로 EOF(연결 종료)까지 대기
+            while await reader.read(1024):
+                pass
+        except ConnectionError:
+            pass
+        finally:
+            self.clients.discard(client)
+
+    @staticmethod
+    def _parse_head(head):
+        try:
+            lines = head.decode("latin-1").split("\r\n")
+            method, target, version = lines[0].split(" ", 2)
+        except ValueError:
+            return None, None
+        headers = {}
+        for line in lines[1:]:
+            if ":" in line:
+                name, value = line.split(":", 1)
+                headers[name.strip().lower()] = value.strip()
+        return (method, target, version), headers
+
+    @staticmethod
+    def _body_length(headers):
+        """(body length, None) for a readable request body, or (0, error status line)"""
+        if "transfer-encoding" in headers:
+            # chunked 본문은 지원하지 않음: Content-Length를 요구
+            return 0, "411 Length Required"
+        value = headers.get("content-length", "") or "0"
+        if not (value.isascii() and value.isdigit()):
+            return 0, "400 Bad Request"
+        length = int(value)
+        if length > MAX_BODY_BYTES:
+            return 0, "413 Payload Too Large"
+        return length, None
+
+    @staticmethod
+    def _keep_alive(version, headers):
+        conn = headers.get("connection", "").lower()
+        return conn == "keep-alive" if version == "HTTP/1.0" else conn != "close"
+
+    def _call_wsgi(self, method, target, version, headers, body, writer):
+        """Run the Flask app for one request (worker thread); returns a function building the response bytes"""
+        path, _, query = target.partition("?")
+        peer = writer.get_extra_info("peername") or ("", 0)
+        environ = {
+            "REQUEST_METHOD": method,
+            "SCRIPT_NAME": "",
+            "PATH_INFO": unquote(path, "latin-1"),
+            "QUERY_STRING": query,
+            "SERVER_NAME": self.host,
+            "SERVER_PORT": str(self.port),
+            "SERVER_PROTOCOL": version,
+            "REMOTE_ADDR": peer[0],
+            "REMOTE_PORT": str(peer[1]),
+            "CONTENT_TYPE": headers.get("content-type", ""),
+            "CONTENT_LENGTH": str(len(body)) if body else "",
+            "wsgi.version": (1, 0),
+            "wsgi.url_scheme": "http",
+            "wsgi.input": io.BytesIO(body),
+            "wsgi.errors": sys.stderr,
+            "wsgi.multithread": True,
+            "wsgi.multiprocess": False,
+            "wsgi.run_once": False,
+        }
+        for name, value in headers.items():
+            if name not in ("content-type", "content-length"):
+                environ["HTTP_" + name.upper().replace("-", "_")] = value
+
+        status_headers = []
+        def start_response(status, response_headers, exc_info=None):
+            status_headers[:] = [status, response_headers]
+        result = self.wsgi_app(environ, start_response)
+        try:
+            payload = b"".join(result)
+        finally:
+            if hasattr(result, "close"):
+                result.close()
+        status, response_headers = status_headers
+
+        def build(keep_alive):
+            names = {name.lower() for name, _ in response_headers}
+            lines = [f"HTTP/1.1 {status}"] + [f"{name}: {value}" for name, value in response_headers]
+            if "content-length" not in names:
+                lines.append(f"Content-Length: {len(payload)}")
+            lines.append("Connection: keep-alive" if keep_alive else "Connection: close")
+            head = ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+            return head if method == "HEAD" else head + payload
+        return build
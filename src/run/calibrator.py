@@ -0,0 +1,46 @@
+import math
+from config import CHANNELS
+
+class RunningStats:
+    """Welford running mean/variance for one channel (O(1) memory)"""
+
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def update(self, x):
+        self.n += 1
+        delta = x - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (x - self.mean)
+
+    @property
+    def variance(self):
+        return self.m2 / (self.n - 1) if self.n > 1 else 0.0
+
+    @property
+    def std(self):
+        return math.sqrt(self.variance)
+
+class StreamingCalibrator:
+    """Per-channel streaming calibration: baseline mean plus measured noise (sigma)"""
+
+    def __init__(self, channels=CHANNELS):
+        self.channels = list(channels)
+        self.stats = {ch: RunningStats() for ch in self.channels}
+
+    def update(self, sample):
+        for ch in self.channels:
+            self.stats[ch].update(sample[ch])
+
+    @property
+    def count(self):
+        return self.stats[self.channels[0]].n
+
+    def baseline(self):
+        """Baseline dict in the calibration file format ({axis: mean, "std": {axis: sigma}, "n": count})"""
+        baseline = {ch: st.mean for ch, st in self.stats.items()}
+        baseline["std"] = {ch: st.std for ch, st in self.stats.items()}
+        baseline["n"] = self.count
+        return baseline
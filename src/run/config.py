@@ -6,12 +6,25 @@ REFERENCE_FILE = os.path.join(BASE_DIR, "calibration", "reference_data.json")
 CALIBRATION_FILE = os.path.join(BASE_DIR, "calibration", "baseline.json")
 GRAPH_DIR = os.path.join(BASE_DIR, "graph")
 REPS_DIR = os.path.join(BASE_DIR, "reps")
+PROFILES_DIR = os.path.join(BASE_DIR, "profiles")  # 사용자별 baseline / reference / 세트 아카이브
+
+# User profiles
+DEFAULT_PROFILE = "default"       # 기존 calibration/, reps/ 경로를 그대로 사용하는 프로필
+PROFILE_CACHE_SIZE = 8            # 메모리에 올려두는 (전처리된) 프로필 수, 초과 시 가장 오래 안 쓴 것부터 해제
 
 # Network
 HOST = "0.0.0.0"
 PORT = 5000
+WEB_PORT = 80                     # 대시보드 HTTP 포트
+WEB_SERVER_MODE = "async"         # "async": asyncio 기반 (SSE 연결당 코루틴), "dev": Flask 개발 서버 (연결당 스레드)
+WEB_WSGI_WORKERS = 8              # async 모드에서 일반 요청(Flask 라우트)을 처리하는 스레드 수
+SSE_TICK = 0.1                    # SSE 브로드캐스트 주기 (초)
+SSE_MAX_BUFFER = 256 * 1024       # 전송 대기 버퍼가 이보다 쌓인 SSE 클라이언트는 끊음 (느린/멈춘 브라우저)
+SSE_HEARTBEAT = 15.0              # 변화가 없어도 이 주기로 주석 프레임을 보내 죽은 연결 정리
+OVERVIEW_INTERVAL = 1.0           # 전체 아령 요약 스트림(/overview/stream) 최대 전송 주기 (초)
 
 # Params
+SAMPLE_RATE_HZ = 10               # 실측 수신 속도 (펌웨어 목표 50Hz, DMP FIFO 대기로 실제 약 10Hz)
 MAX_SAMPLES = 5000
 THRESHOLD = 3000
 STILL_TIME_LIMIT = 0.5
@@ -21,4 +34,89 @@ THRESHOLD_PERCENT = 0.05
 MIN_ABS_DIFF = 300
 MOVEMENT_TOLERANCE_PERCENT = 0.08  # Baseline 대비 8% 이상 변화 시 움직임으로 간주
 STILL_TIME_LIMIT = 0.6            # 0.6초간 범위 내에 머물면 종료
-PEAK_TOLERANCE_PERCENT = 0.2      # 전문가 피크의 80% 도달 시 카운트
+SAMPLE_CLOCK = False              # True: 정지/보정 시간을 받은 샘플 수 / SAMPLE_RATE_HZ로 계산 (가속 재생, dumbbell.py --sample-clock)
+PEAK_TOLERANCE_PERCENT = 0.2      # 전문가 피크의 80% 도달 시 카운트 (RAW: 중력이 포함돼 정지 상태도 피크에 가까움)
+LINEAR_PEAK_TOLERANCE_PERCENT = 0.5  # LINEAR Reference: 정지 시 0 근처이므로 넉넉하게 (선형 가속도 피크는 템포의 제곱에 반비례)
+
+# Noise-adaptive thresholds (캘리브레이션에서 측정한 축별 노이즈 표준편차 기반)
+THRESHOLD_MODE = "NOISE"          # "NOISE": k·sigma 기반, "PERCENT": Baseline 대비 비율 (기존 방식)
+NOISE_SIGMA_K = 6.0               # 정지 노이즈 표준편차의 k배를 넘으면 움직임으로 간주
+MIN_NOISE_TOLERANCE = 150         # 노이즈가 매우 작을 때의 최소 허용 오차 (raw)
+BASELINE_TRACKING = True          # 정지 구간에서 Baseline을 천천히 재추정 (센서 드리프트 보정)
+BASELINE_TRACK_ALPHA = 0.002      # 정지 샘플당 Baseline 갱신 비율 (EMA)
+SPIKE_MIN_RUN = 1                 # 구간 추출 시 이 샘플 수보다 짧게 범위를 벗어난 구간은 튐 잡음으로 무시 (1 = 필터 없음)
+
+# Streaming filter bank (검출 전 원시 샘플에 적용, filters.py)
+FILTER_CHAIN = ["spike"]          # 순서대로 적용: "median3", "median5", "spike", "ema", "biquad" ([]이면 필터 없음)
+FILTER_SPIKE_WINDOW = 5           # spike: 최근 샘플 중앙값 창 크기
+FILTER_SPIKE_ACCEL = 8000         # spike: 중앙값에서 이만큼(raw) 넘게 튄 가속도 샘플은 중앙값으로 대체
+FILTER_SPIKE_GYRO = 16000         # spike: 자이로 채널 기준 (raw)
+FILTER_EMA_ALPHA = 0.5            # ema: 새 샘플 가중치 (1이면 필터 없음)
+FILTER_LOWPASS_HZ = 3.0           # biquad: 차단 주파수 (SAMPLE_RATE_HZ의 절반보다 작아야 함)
+
+# Adaptive streaming (펌웨어와 접속 시 협상)
+ADAPTIVE_STREAMING = True         # 세트가 꺼진 휴식 구간에서는 요약(SUM)만 저속 전송 허용
+IDLE_SUMMARY_MS = 1000            # 휴식 구간 요약 전송 주기
+IDLE_WAKE_RATIO = 0.5             # 서버 움직임 임계치의 이 비율만큼 변하면 펌웨어가 전체 속도로 복귀
+
+# Live waveform (dashboard)
+WAVEFORM_BUCKET = 5               # 버킷당 샘플 수 (버킷마다 min/max 두 값을 시간 순서대로 전송 -> 샘플 5개당 2개)
+WAVEFORM_POINTS = 60              # 서버가 보관하는 최근 버킷 수 (10Hz 기준 30초)
+
+# Channels (MPU6050: 가속도 3축 + 자이로 3축)
+ACCEL_AXES = ["ax", "ay", "az"]
+GYRO_AXES = ["gx", "gy", "gz"]
+CHANNELS = ACCEL_AXES + GYRO_AXES
+
+# Scoring
+SIMILARITY_MODE = "SIX_AXIS"      # "ACCEL": 기존 가속도 3축 평균, "SIX_AXIS": 활성 채널(가속도+자이로) 기반
+GYRO_MIN_ABS_DIFF = 1500          # 자이로 채널을 활성으로 판단하는 최소 변화량 (raw)
+MIN_ACCEL_RANGE = 1000            # 유사도 정규화 시 가속도 채널 최소 범위
+MIN_GYRO_RANGE = 2000             # 유사도 정규화 시 자이로 채널 최소 범위
+SCORING_MODE = "ZSCORE"           # "RANGE": 채널 범위로 정규화한 절대 오차 (기존), "ZSCORE": 전문가 여러 회의 점별 표준편차로 정규화 (편차 정보가 없는 Reference는 RANGE)
+EXPERT_TAKES = 3                  # 전문가 모드에서 평균 궤적/편차 범위를 만들 동작 횟수
+ZSCORE_STD_FLOOR = 0.15           # 점별 표준편차 하한 (채널 범위 대비 비율, 전문가 동작이 우연히 겹친 지점의 과민 채점 방지)
+ZSCORE_TOLERANCE = 1.0            # 전문가 편차 범위 안쪽(σ)은 감점 없음
+ZSCORE_LIMIT = 3.0                # 허용 범위를 넘은 평균 편차(σ)가 이 값이면 0점
+
+# Motion pipeline (중력 보상)
+MOTION_PIPELINE = "LINEAR"        # "LINEAR": 자세 추정 후 중력 제거한 선형 가속도, "RAW": 중력 포함 원시값 비교 (기존)
+ACC_LSB_PER_G = 16384.0           # ±2g 가속도 스케일 (Baseline 크기를 1g로 쓰므로 보정 전 초기값으로만 사용)
+G = 9.80665
+GYRO_LSB_PER_DPS = 131.0          # ±250dps 자이로 스케일
+DEG2RAD = 3.141592653589793 / 180.0
+COMPLEMENTARY_ALPHA = 0.98        # 상보 필터 자이로 가중치 (움직이는 중: 가속도에는 운동 성분이 섞여 있음)
+MOTION_STILL_GYRO_DPS = 5.0       # 바이어스 보정 후 회전 속도가 이보다 작고
+MOTION_STILL_ACC_TOL = 0.05       # 가속도 크기가 1g에서 이 비율 안이면 정지 샘플: 자세를 가속도 기울기로 바로 맞춤
+
+# Connection supervisor (재접속 시 세션 이어받기)
+SESSION_GRACE_PERIOD = 120        # 연결이 끊긴 아령 세션(진행 중 세트 포함)을 보관하는 시간 (초)
+DEVICE_RX_TIMEOUT = 3.0           # 이 시간 동안 아무 데이터도 없으면 죽은 연결로 판단 (idle 요약 주기보다 길게)
+TCP_KEEPALIVE_IDLE = 2            # 유휴 후 첫 keepalive 프로브까지 (초)
+TCP_KEEPALIVE_INTERVAL = 1        # keepalive 프로브 간격 (초)
+TCP_KEEPALIVE_COUNT = 3           # 응답 없는 프로브가 이만큼 쌓이면 연결 종료
+
+# Ingest (장치 소켓은 한 곳에서만 열고 파싱된 이벤트를 구독자들에게 팬아웃)
+INGEST_RX_TIMEOUT = 30.0          # 역할이 정해지기 전 연결의 무수신 타임아웃 (온습도 센서 포함)
+BUS_QUEUE_SIZE = 4096             # 구독자별 기본 큐 크기 (가득 차면 가장 오래된 이벤트부터 버림)
+COUNTING_QUEUE_SIZE = 30000       # 카운팅 엔진 큐 (50Hz 기준 약 10분, 사실상 무손실)
+GRAPH_WEB_PORT = 8080             # 웹 그래퍼 HTTP 포트 (장치 포트 PORT와 분리)
+
+# Set reports
+REPORT_MAX_POINTS = 600           # /report JSON에서 축별 최대 점 수 (버킷별 min/max 유지로 피크 보존)
+SET_REPORT_PNG = False            # True면 세트 종료마다 matplotlib PNG도 graph/에 저장 (내보내기용)
+
+# Set journal (진행 중 세트의 write-ahead log, 비정상 종료 후 다음 시작 시 아카이브로 복구)
+JOURNAL_ENABLED = True
+JOURNAL_DIR = os.path.join(BASE_DIR, "journal")
+JOURNAL_FSYNC_INTERVAL = 1.0      # 이 주기로 모아서 기록 + fsync (비정상 종료 시 최대 이만큼의 샘플만 유실)
+
+# Graph assets (graph/)
+GRAPH_DIR_MAX_BYTES = 200 * 1024 * 1024  # graph/ 용량 상한: 넘으면 가장 오래 안 본 세트 그래프부터 삭제
+THUMB_WIDTHS = [480, 960]         # ?w= 요청을 이 폭 중 하나로 맞춰 썸네일 캐시 (graph/thumbs/)
+
+# External publisher (dumbbell.py --publish)
+PUBLISH_ADDRESS = "127.0.0.1:5001"  # 기본 구독 주소 ("host:port" 또는 "unix:/tmp/dumbbell.sock")
+PUBLISH_QUEUE_SIZE = 8192         # 외부 구독자별 큐 (가득 차면 가장 오래된 이벤트부터 버리고 "dropped" 이벤트로 알림)
+PUBLISH_SEND_TIMEOUT = 5.0        # 전송이 이 시간 이상 막히는 구독자는 연결 종료
+PUBLISH_MAX_BATCH = 512           # 바이너리 샘플 배치 한 프레임의 최대 행 수
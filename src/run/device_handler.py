@@ -1,464 +1,437 @@
+import copy
 import threading
 import time
-import socket
 import json
 import os
 import math
 
 from config import *
 from state import AppState
-from analysis import extract_movement_segment, calculate_similarity, process_rep, save_set_to_json, get_expert_peak, get_active_axes
+from analysis import (extract_movement_channels, compute_rep_features, build_expert_template,
+                      get_expert_peak, get_active_axes, get_scoring_channels, new_channel_buffer,
+                      get_tolerances, track_baseline)
+from motion import detection_setup
+from finalizer import snapshot_set
+from ingest import Event, get_bus
 from visualizer import save_movement_graph, save_calibration_graph
 from ai_coach import AICoach
 
 class DeviceHandler:
-    def __init__(self, conn, addr, is_env_only=False):
-        self.conn = conn
-        self.addr = addr
+    """Counting-engine state machine for one device connection, fed with parsed ingest events"""
+
+    def __init__(self, conn, is_env_only=False):
+        self.conn = conn  # ingest.Connection (sendall/close)
+        self.addr = conn.addr
         self.app_state = AppState.get_instance()
-        self.stats = self.app_state.stats
+        self.stats = self.app_state.stats  # 세션이 붙으면 그 아령의 상태 (DumbbellSession.stats)로 교체
         self.ai_coach = AICoach()
         self.is_env_only = is_env_only
-
-    def run(self):
+        self.session = None
+        # ENV 센서면 30초, 아령이면 idle 요약 주기보다 조금 길게 (죽은 연결을 빨리 정리하고 재접속 허용)
+        conn.rx_timeout = 30.0 if is_env_only else DEVICE_RX_TIMEOUT
         print(f"\n{'='*50}")
         print(f"Connection from {self.addr} | Role: {'ENV_ONLY' if self.is_env_only else 'DUMBBELL'}")
-        
-        # Reset per-session stats only for dumbbell
+
+    @property
+    def closed(self):
+        return self.conn.closed
+
+    def close(self):
+        """Close the connection (also used when a reconnect takes this handler's session over)"""
+        self.conn.close()
+
+    def finish(self):
+        """Connection ended: keep the session for the grace period"""
+        if self.session is not None:
+            self.app_state.sessions.detach(self.session, self)
+        print(f">>> Connection closed: {self.addr}")
+
+    def handle(self, event):
+        """Dispatch one parsed ingest event"""
+        # [SIGNAL LOGGING] 오직 아령(DUMBBELL) 연결일 때만 터미널에 원시 신호 출력
         if not self.is_env_only:
+            print(f"[RAW_SIGNAL] {event.line}")
+        try:
+            self._handle_event(event.kind, event.data)
+        except Exception as e:
+            print(f"[ERROR] Signal handle error: {e}")
+
+    def _handle_event(self, kind, data):
+        # 1. 온습도 센서 (ENV_ONLY) 처리
+        if self.is_env_only:
+            if kind == "env":
+                self._handle_env_only(data)
+            return
+
+        # 2. 아령 (DUMBBELL) 처리
+        # 접속 직후 기기 식별 프레임 HELLO:<device_id>[,<profile>]: 같은 기기면 이전 세션을 이어받음
+        if kind == "hello":
+            device_id, _, profile = data.partition(",")
+            self._attach_session(device_id or self.addr[0], profile)
+            return
+
+        # 아령 모드에서 오는 ENV 정보는 습도만 업데이트 (로깅 없이)
+        if kind == "env":
+            if len(data) >= 2:
+                self.app_state.stats["humidity"] = data[1]
+            return
+
+        # HELLO를 보내지 않는 이전 펌웨어는 IP 주소로 세션을 식별
+        if self.session is None:
+            self._attach_session(self.addr[0])
+
+        # 휴식 구간 요약 (적응형 전송): 파형만 갱신하고 검출은 건너뜀
+        if kind == "summary":
+            self._handle_summary(data)
+            return
+
+        # 3. 아령 데이터 처리 (7열 CSV: ax,ay,az,gx,gy,gz,btn)
+        if kind == "sample" and len(data) >= 7:
+            self._handle_sample(data)
+
+    def _handle_env_only(self, env_data):
+        try:
+            temp_val = float(env_data[0])
+            humi_val = float(env_data[1])
+            self.app_state.stats["humidity"] = humi_val 
+            print(f">>> 온습도 데이터 수신: 온도={temp_val}°C, 습도={humi_val}%")
+            
+            if not self.app_state.ai_advice_triggered:
+                self.app_state.ai_advice_triggered = True
+                print(">>> AI 조언 생성 중...")
+                threading.Thread(target=self.ai_coach.get_advice, args=(temp_val, humi_val), daemon=True).start()
+            
+            # 이후 들어오는 잔여 데이터는 ingest가 연결 종료와 함께 버림
+            print(">>> 온습도 측정 완료. 기기 연결을 안전하게 종료합니다.")
+            self.app_state.env_sensor_connected = True
+            self.close()
+        except Exception as e:
+            print(f">>> ENV Parse Error: {e}")
+
+    def _attach_session(self, device_id, profile=""):
+        """Bind this connection to the device's session (resumed within the grace period)"""
+        if self.session is not None:
+            if self.session.device_id == device_id:
+                if profile:
+                    self._request_profile(profile)
+                return
+            self.app_state.sessions.detach(self.session, self)
+        self.session, resumed = self.app_state.sessions.attach(device_id, self)
+        s = self.session
+        self.stats = s.stats
+        if not resumed:
+            # 새 아령은 대시보드에서 선택된 기본 프로필로 시작 (HELLO에 프로필이 있으면 그쪽)
+            self.stats["profile"] = self.app_state.stats.get("profile") or DEFAULT_PROFILE
+        if profile:
+            self._request_profile(profile)
+
+        if resumed:
+            # 세트/카운트/Baseline을 그대로 유지하고 파일도 다시 읽지 않음
+            print(f">>> [DUMBBELL] Session RESUMED for {device_id} (mode={s.mode}, set active={self.stats.get('is_set_active')}, "
+                  f"{len(s.set_raw_buffer['ax'])} set samples kept)")
+        else:
+            # Reset per-session stats only for a new dumbbell session
             self.stats["count"] = 0
             self.stats["similarity"] = 0
             self.stats["is_moving"] = False
             self.stats["is_set_active"] = False
-            print(f">>> [DUMBBELL] Session stats initialized for {self.addr}")
-        
-        # Determine mode based on required files
-        calibration_data = {"ax": [], "ay": [], "az": []}
-        baseline = None
-        calibration_start_time = None
-        is_calibrated = False
-        
-        expert_peak = 0.0
-        active_axes = ["ax", "ay", "az"] # Default
-        mode = "IDLE" # Default
-        
-        if not self.is_env_only:
-            # 1. 베이스라인 파일 확인
-            has_baseline = os.path.exists(CALIBRATION_FILE)
-            # 2. 전문가 동작 파일 확인 
-            has_reference = os.path.exists(REFERENCE_FILE)
-
-            if not has_baseline:
-                mode = "CALIBRATING"
-                self.stats["mode"] = "CALIBRATING"
-                calibration_start_time = time.time()
-                print(">>> Initial Mode: CALIBRATING (Baseline file missing)")
-            elif not has_reference:
-                mode = "RECORDING_EXPERT"
-                self.stats["mode"] = "WAITING_FOR_EXPERT"
-                print(">>> Initial Mode: RECORDING_EXPERT (Reference file missing)")
-                # 베이스라인은 있으므로 로드
-                try:
-                    with open(CALIBRATION_FILE, "r") as f:
-                        baseline = json.load(f)
-                        is_calibrated = True
-                except Exception as e:
-                    print(f"[ERROR] Failed to load baseline: {e}")
-                    is_calibrated = False
-            else:
-                # 둘 다 있으면 즉시 카운팅 모드로!
-                mode = "COUNTING"
-                self.stats["mode"] = "COUNTING"
-                print(">>> Initial Mode: COUNTING (Data exists, skipping setup)")
-                try:
-                    with open(CALIBRATION_FILE, "r") as f:
-                        baseline = json.load(f)
-                        is_calibrated = True
-                    with open(REFERENCE_FILE, "r") as f:
-                        ref_data = json.load(f)
-                        active_axes = get_active_axes(ref_data, baseline)
-                        expert_peak = get_expert_peak(ref_data, active_axes)
-                        print(f">>> Active Axes: {active_axes}")
-                        print(f">>> Pre-loaded Expert Peak (Active axes only): {expert_peak:.0f}")
-                except Exception as e:
-                    print(f"[ERROR] Failed to skip setup: {e}")
-                    is_calibrated = False
+            print(f">>> [DUMBBELL] Session stats initialized for {device_id} ({self.addr})")
+            s.load(self.stats, self.app_state.profiles.get(self.stats["profile"]))
         
-        # Buffers
-        current_ax, current_ay, current_az = [], [], []
-        session_reps = [] # To store all reps for final analysis
-        
-        # Movement detection
-        is_moving = False
-        still_start_time = None
-        entered_peak_this_burst = False # 피크 구역 진입 여부
-        has_counted_this_burst = False   # 해당 버스트에서 이미 카운트했는지 여부
-        
-        # Expert Recording Buffers
-        expert_buffer = {"ax": [], "ay": [], "az": []}
+        self._send_stream_config(s.mode, s.baseline)
+
+    def _request_profile(self, name):
+        """Ask for a profile switch (applied by the ingest thread once no set is running)"""
+        try:
+            self.app_state.profiles.get(name) # 미리 로드해 두어 전환 시 디스크 접근 없음
+            self.stats["profile"] = name
+        except Exception as e:
+            print(f"[ERROR] Profile '{name}' unavailable: {e}")
+
+    def _switch_profile_if_requested(self):
+        s = self.session
+        wanted = self.stats.get("profile")
+        if not wanted or wanted == s.profile.name or self.stats.get("is_set_active"):
+            return
+        print(f">>> [PROFILE] Switching {s.profile.name} -> {wanted}")
+        s.load(self.stats, self.app_state.profiles.get(wanted))
+        self.stats["count"] = 0
+        self.stats["similarity"] = 0
+        self.stats["is_moving"] = False
+        self._send_stream_config(s.mode, s.baseline)
+
+    def _handle_sample(self, values):
+        s = self.session
+        s.samples_seen += 1
+        self._switch_profile_if_requested()
+        if self.stats.get("stream_mode") != "FULL":
+            self.stats["stream_mode"] = "FULL"
+        ax, ay, az, gx, gy, gz, btn_val = values[:7]
+        sample = {"ax": ax, "ay": ay, "az": az, "gx": gx, "gy": gy, "gz": gz}
+        is_now_active = (btn_val == 1)
+        was_active = self.stats.get("is_set_active", False)
+
+        # [통합 로직] 버튼 상태 변화 감지
+        # 세트 시작 (False -> True)
+        if not was_active and is_now_active:
+            s.session_reps = []
+            s.rep_features = []
+            s.set_raw_buffer = new_channel_buffer() # 초기화
+            s.movement_offsets = [] # 초기화
+            # 필터 상태도 세트와 함께 새로 시작해야 아카이브(원시값)를 오프라인 재생한 결과와 동일
+            if s.filters is not None:
+                s.filters.reset()
+            # 진행 중 세트의 원시 샘플/회차 이벤트를 디스크에 미리 기록 (비정상 종료 시 다음 시작에서 복구)
+            if self.app_state.journals is not None:
+                s.journal = self.app_state.journals.open(
+                    s.device_id, s.profile.name, self.stats["set_count"] + 1, s.profile.reps_dir,
+                    copy.deepcopy(s.motion.baseline) if s.motion is not None else None)
+            self.stats["count"] = 0
+            print(f"[ACTION] Set #{self.stats['set_count'] + 1} STARTED! (Sync via Data Column)")
         
-        raw_buf = b""
-        # ENV 센서면 30초, 아령이면 길게 대기
-        self.conn.settimeout(30.0 if self.is_env_only else 60.0) 
-        last_rx = time.time()
+        # 세트 진행 중 데이터 누적
+        if is_now_active:
+            for ch in CHANNELS:
+                s.set_raw_buffer[ch].append(sample[ch])
+            if s.journal is not None:
+                s.journal.append(values)
+
+        # 세트 종료 (True -> False)
+        if was_active and not is_now_active:
+            # [요청 반영] 세트 종료 시 움직임 중이었다면 해당 동작까지 강제 포함
+            if s.is_moving and len(s.current_rep["ax"]) >= MIN_MOVEMENT_SAMPLES:
+                print(f"[ACTION] Finalizing ongoing movement before set end...")
+                self._process_and_save_rep(s.current_rep, s.baseline, s.session_reps)
+                s.is_moving = False
+                self.stats["is_moving"] = False
+
+            self.stats["set_count"] += 1
+            print(f"[ACTION] Set #{self.stats['set_count']} COMPLETED! (Sync via Data Column)")
+            # [요청 반영] 전체 세트 데이터 및 회차 오프셋을 스냅샷으로 넘기고 보고서는 백그라운드에서 생성
+            self.app_state.finalizer.submit(snapshot_set(self.stats["set_count"], s.session_reps, s.set_raw_buffer,
+                                                         s.movement_offsets, s.baseline, s.motion, s.profile,
+                                                         s.rep_features, s.journal, self.stats))
+            s.journal = None  # 아카이브가 저장되면 SetFinalizer가 삭제 처리
+            self._publish("set_end", {"set": self.stats["set_count"], "reps": len(s.session_reps), "count": self.stats["count"]})
+
+        self.stats["is_set_active"] = is_now_active
+
+        # 튐/노이즈 필터: 이후 보정, 검출, 채점은 필터를 거친 값 기준 (세트 아카이브는 원시값 유지)
+        if s.filters is not None:
+            sample = s.filters.process(sample)
+            ax, ay, az = sample["ax"], sample["ay"], sample["az"]
         
-        try:
-            set_raw_buffer = {"ax": [], "ay": [], "az": []}
-            movement_offsets = [] # 세트 내 각 회차 시작 지점 저장
+        # A. Calibration Mode
+        if s.mode == "CALIBRATING":
+            # 샘플을 저장하지 않고 축별 평균/분산만 누적 (Welford)
+            s.calibrator.update(sample)
             
-            while True:
-                try:
-                    data = self.conn.recv(4096)
-                    if not data:
-                        print(f">>> Connection closed ({'Env' if self.is_env_only else 'Dumbbell'})")
-                        break
-                    last_rx = time.time()
-                    raw_buf += data
-                except socket.timeout:
-                    if time.time() - last_rx > (30 if self.is_env_only else 60):
-                        print(">>> No data timeout")
-                        break
-                    continue
-                except Exception as e:
-                    print(f">>> Recv error: {e}")
-                    break
-
-                while b"\n" in raw_buf:
-                    line_bytes, raw_buf = raw_buf.split(b"\n", 1)
-                    line = line_bytes.decode(errors="ignore").strip()
-                    if not line: continue
-                    
-                    # [SIGNAL LOGGING] 오직 아령(DUMBBELL) 연결일 때만 터미널에 원시 신호 출력
-                    if not self.is_env_only:
-                        print(f"[RAW_SIGNAL] {line}")
-
-                    try:
-                        # 1. 온습도 센서 (ENV_ONLY) 처리
-                        if self.is_env_only and line.startswith("ENV:"):
-                            try:
-                                env_data = line.split(":")[1].split(",")
-                                temp_val = float(env_data[0])
-                                humi_val = float(env_data[1])
-                                self.stats["humidity"] = humi_val 
-                                print(f">>> 온습도 데이터 수신: 온도={temp_val}°C, 습도={humi_val}%")
-                                
-                                if not self.app_state.ai_advice_triggered:
-                                    self.app_state.ai_advice_triggered = True
-                                    print(">>> AI 조언 생성 중...")
-                                    threading.Thread(target=self.ai_coach.get_advice, args=(temp_val, humi_val), daemon=True).start()
-                                
-                                # [요청 반영] 잔여 데이터 정리(Drain) 및 깨끗한 종료
-                                print(">>> 잔여 데이터 정리 중...")
-                                self.conn.setblocking(False)
-                                try:
-                                    time.sleep(0.3)
-                                    while self.conn.recv(1024): pass
-                                except: pass
-                                
-                                print(">>> 온습도 측정 완료. 기기 연결을 안전하게 종료합니다.")
-                                self.app_state.env_sensor_connected = True
-                                try:
-                                    self.conn.shutdown(socket.SHUT_RDWR)
-                                except: pass
-                                self.conn.close()
-                                return
-                            except Exception as e:
-                                print(f">>> ENV Parse Error: {e}")
-                            continue
-
-                        # 2. 아령 (DUMBBELL) 처리
-                        if not self.is_env_only:
-                            # 아령 모드에서 오는 ENV 정보는 습도만 업데이트 (로깅 없이)
-                            if line.startswith("ENV:"):
+            elapsed = s.clock() - s.calibration_start_time
+            if elapsed >= CALIBRATION_TIME:
+                # 자이로 평균은 정지 상태의 바이어스로 함께 저장
+                baseline = s.calibrator.baseline()
+                s.profile.save_baseline(baseline)
+                s.is_calibrated = True
+                save_calibration_graph(baseline, get_tolerances(baseline))
+                print(f">>> Calibration DONE ({s.profile.name}). Baseline: {baseline}")
+                
+                if s.profile.ref_data is None:
+                    s.motion, s.baseline = detection_setup(copy.deepcopy(baseline), MOTION_PIPELINE)
+                    s.mode = "RECORDING_EXPERT"
+                    self.stats["mode"] = "WAITING_FOR_EXPERT"
+                    self.stats["expert_takes"] = 0
+                else:
+                    s.motion, s.baseline = detection_setup(copy.deepcopy(baseline), s.profile.pipeline)
+                    s.active_axes = s.profile.active_axes
+                    s.expert_peak = s.profile.expert_peak
+                    s.mode = "COUNTING"
+                    self.stats["mode"] = "COUNTING"
+                # 보정이 끝났으므로 휴식 구간 저속 전송 허용
+                self._send_stream_config(s.mode, s.baseline)
+            return
+
+        # 중력 보상: 이후 검출/채점은 선형 가속도 기준 (세트 아카이브는 원시값 유지)
+        if s.motion is not None:
+            sample = s.motion.process(sample)
+            ax, ay, az = sample["ax"], sample["ay"], sample["az"]
+
+        # B. Regular Analysis
+        if s.is_calibrated:
+            baseline = s.baseline
+            # THRESHOLD_MODE 기준으로 임계치 계산 (노이즈 k·sigma 또는 Baseline 비율)
+            tols = get_tolerances(baseline)
+
+            diff_x = abs(ax - baseline["ax"])
+            diff_y = abs(ay - baseline["ay"])
+            diff_z = abs(az - baseline["az"])
+
+            # 허용 오차 범위를 벗어나면 움직임으로 간주
+            is_out_of_range = (diff_x > tols["ax"] or diff_y > tols["ay"] or diff_z > tols["az"])
+
+            if is_out_of_range:
+                # [요청 반영] 버튼이 켜져 있거나 '전문가 대기' 상태일 때 움직임 감지 시작
+                can_start_move = self.stats.get("is_set_active") or (s.mode == "RECORDING_EXPERT")
+                
+                if not s.is_moving and can_start_move:
+                    # [요청 반영] 현재 세트 버퍼에서의 시작 인덱스 기록
+                    s.movement_offsets.append(len(s.set_raw_buffer["ax"]) - 1)
+                    if s.journal is not None:
+                        s.journal.event("offset", offset=s.movement_offsets[-1])
+                    print(f"[ACTION] Movement detected at offset {len(s.set_raw_buffer['ax'])-1}!")
+
+                    s.is_moving = True
+                    s.current_rep = new_channel_buffer()
+                    self.stats["is_moving"] = True
+                    print(f"[ACTION] Movement STARTED ({s.mode})")
+                s.still_start_time = None
+            else:
+                # 정지 상태에서는 Baseline을 천천히 따라가 드리프트로 인한 오검출 방지
+                if BASELINE_TRACKING and not s.is_moving:
+                    track_baseline(baseline, sample)
+                
+                # 범위 내로 들어오면 정지 판정 대기
+                if s.is_moving:
+                    if s.still_start_time is None:
+                        s.still_start_time = s.clock()
+                    elif s.clock() - s.still_start_time > STILL_TIME_LIMIT:
+                        s.is_moving = False
+                        self.stats["is_moving"] = False
+                        print(f"[ACTION] Movement ENDED ({len(s.current_rep['ax'])} samples)")
+                        
+                        if s.mode == "RECORDING_EXPERT":
+                            # [요청 반영] 전문가 동작 처리 및 피크치 업데이트 (자이로 포함 저장)
+                            # EXPERT_TAKES회를 모은 뒤 평균 궤적 + 점별 편차 범위로 Reference 생성
+                            take = extract_movement_channels(s.current_rep, baseline)
+                            if take:
+                                s.expert_takes.append(take)
+                                self.stats["expert_takes"] = len(s.expert_takes)
+                                print(f">>> Expert take {len(s.expert_takes)}/{EXPERT_TAKES} recorded ({len(take['ax'])} samples)")
+                            if take and len(s.expert_takes) >= EXPERT_TAKES:
+                                ref_data = build_expert_template(s.expert_takes)
+                                s.expert_takes = []
+                                ref_data["pipeline"] = "LINEAR" if s.motion is not None else "RAW"
+                                r_ax, r_ay, r_az = ref_data["ax"], ref_data["ay"], ref_data["az"]
+                                s.profile.save_reference(ref_data)
+                                s.active_axes = get_active_axes(ref_data, baseline)
+                                s.expert_peak = get_expert_peak(ref_data, s.active_axes)
+                                self.stats["expert_samples"] = len(r_ax)
+                                print(f">>> Expert Reference SAVED ({ref_data['takes']} takes)! Active Axes: {s.active_axes}, "
+                                      f"Peak Intensity: {s.expert_peak:.0f}")
                                 try:
-                                    env_data = line.split(":")[1].split(",")
-                                    self.stats["humidity"] = float(env_data[1])
+                                    fname = save_movement_graph(r_ax, r_ay, r_az, 0)
+                                    self.stats["latest_graph"] = fname
                                 except: pass
-                                continue
-
-                            # 3. 아령 데이터 처리 (7열 CSV: ax,ay,az,gx,gy,gz,btn)
-                            parts = line.split(",")
-                            if len(parts) >= 7: 
-                                ax, ay, az, gx, gy, gz = map(int, parts[:6])
-                                btn_val = int(parts[6])
-                                is_now_active = (btn_val == 1)
-                                was_active = self.stats.get("is_set_active", False)
-
-                                # [통합 로직] 버튼 상태 변화 감지
-                                # 세트 시작 (False -> True)
-                                if not was_active and is_now_active:
-                                    session_reps = []
-                                    set_raw_buffer = {"ax": [], "ay": [], "az": []} # 초기화
-                                    movement_offsets = [] # 초기화
-                                    self.stats["count"] = 0
-                                    print(f"[ACTION] Set #{self.stats['set_count'] + 1} STARTED! (Sync via Data Column)")
-                                
-                                # 세트 진행 중 데이터 누적
-                                if is_now_active:
-                                    set_raw_buffer["ax"].append(ax)
-                                    set_raw_buffer["ay"].append(ay)
-                                    set_raw_buffer["az"].append(az)
-
-                                # 세트 종료 (True -> False)
-                                if was_active and not is_now_active:
-                                    # [요청 반영] 세트 종료 시 움직임 중이었다면 해당 동작까지 강제 포함
-                                    if is_moving and len(current_ax) >= MIN_MOVEMENT_SAMPLES:
-                                        print(f"[ACTION] Finalizing ongoing movement before set end...")
-                                        self._process_and_save_rep(current_ax, current_ay, current_az, baseline, session_reps)
-                                        is_moving = False
-                                        self.stats["is_moving"] = False
-
-                                    self.stats["set_count"] += 1
-                                    print(f"[ACTION] Set #{self.stats['set_count']} COMPLETED! (Sync via Data Column)")
-                                    if os.path.exists(REFERENCE_FILE):
-                                        try:
-                                            with open(REFERENCE_FILE, "r") as f:
-                                                ref_data = json.load(f)
-                                            # [요청 반영] 전체 세트 데이터 및 회차 오프셋 전달 (시각화용)
-                                            self._finalize_session(session_reps, ref_data, self.stats, baseline, set_raw_buffer, movement_offsets)
-                                        except Exception as e:
-                                            print(f"[ERROR] Finalization failed: {e}")
-
-                                self.stats["is_set_active"] = is_now_active
-                                
-                                # A. Calibration Mode
-                                if mode == "CALIBRATING":
-                                    calibration_data["ax"].append(ax)
-                                    calibration_data["ay"].append(ay)
-                                    calibration_data["az"].append(az)
-                                    
-                                    elapsed = time.time() - calibration_start_time
-                                    if elapsed >= CALIBRATION_TIME:
-                                        baseline = {
-                                            "ax": sum(calibration_data["ax"]) / len(calibration_data["ax"]),
-                                            "ay": sum(calibration_data["ay"]) / len(calibration_data["ay"]),
-                                            "az": sum(calibration_data["az"]) / len(calibration_data["az"])
-                                        }
-                                        with open(CALIBRATION_FILE, "w") as f:
-                                            json.dump(baseline, f)
-                                        is_calibrated = True
-                                        save_calibration_graph(calibration_data["ax"], calibration_data["ay"], calibration_data["az"], baseline)
-                                        print(f">>> Calibration DONE. Baseline: {baseline}")
-                                        
-                                        if not os.path.exists(REFERENCE_FILE):
-                                            mode = "RECORDING_EXPERT"
-                                            self.stats["mode"] = "WAITING_FOR_EXPERT"
-                                        else:
-                                            mode = "COUNTING"
-                                            self.stats["mode"] = "COUNTING"
-                                    continue
-
-                                # B. Regular Analysis
-                                if is_calibrated:
-                                    # MOVEMENT_TOLERANCE_PERCENT 기준으로 임계치 계산
-                                    tol_x = max(abs(baseline["ax"]) * MOVEMENT_TOLERANCE_PERCENT, MIN_ABS_DIFF)
-                                    tol_y = max(abs(baseline["ay"]) * MOVEMENT_TOLERANCE_PERCENT, MIN_ABS_DIFF)
-                                    tol_z = max(abs(baseline["az"]) * MOVEMENT_TOLERANCE_PERCENT, MIN_ABS_DIFF)
-
-                                    diff_x = abs(ax - baseline["ax"])
-                                    diff_y = abs(ay - baseline["ay"])
-                                    diff_z = abs(az - baseline["az"])
-
-                                    # 허용 오차 범위를 벗어나면 움직임으로 간주
-                                    is_out_of_range = (diff_x > tol_x or diff_y > tol_y or diff_z > tol_z)
-
-                                    if is_out_of_range:
-                                        # [요청 반영] 버튼이 켜져 있거나 '전문가 대기' 상태일 때 움직임 감지 시작
-                                        can_start_move = self.stats.get("is_set_active") or (mode == "RECORDING_EXPERT")
-                                        
-                                        if not is_moving and can_start_move:
-                                            # [요청 반영] 현재 세트 버퍼에서의 시작 인덱스 기록
-                                            # Note: cur_mag and threshold are only defined in COUNTING mode.
-                                            # Applying this condition universally might lead to NameError or unexpected behavior.
-                                            # Assuming the user wants to add the offset recording here,
-                                            # and the `if cur_mag > threshold:` condition is either a typo or
-                                            # intended for a specific mode that's not universally applied here.
-                                            # For now, I'll add the offset recording directly when movement starts.
-                                            movement_offsets.append(len(set_raw_buffer["ax"]) - 1)
-                                            print(f"[ACTION] Movement detected at offset {len(set_raw_buffer['ax'])-1}!")
-
-                                            is_moving = True
-                                            current_ax, current_ay, current_az = [], [], []
-                                            self.stats["is_moving"] = True
-                                            print(f"[ACTION] Movement STARTED ({mode})")
-                                        still_start_time = None
-                                    else:
-                                        # 범위 내로 들어오면 정지 판정 대기
-                                        if is_moving:
-                                            if still_start_time is None:
-                                                still_start_time = time.time()
-                                            elif time.time() - still_start_time > STILL_TIME_LIMIT:
-                                                is_moving = False
-                                                self.stats["is_moving"] = False
-                                                print(f"[ACTION] Movement ENDED ({len(current_ax)} samples)")
-                                                
-                                                if mode == "RECORDING_EXPERT":
-                                                    # [요청 반영] 전문가 동작 처리 및 피크치 업데이트
-                                                    r_ax, r_ay, r_az = extract_movement_segment(current_ax, current_ay, current_az, baseline)
-                                                    if r_ax:
-                                                        ref_data = {"ax": r_ax, "ay": r_ay, "az": r_az}
-                                                        with open(REFERENCE_FILE, "w") as f:
-                                                            json.dump(ref_data, f)
-                                                        active_axes = get_active_axes(ref_data, baseline)
-                                                        expert_peak = get_expert_peak(ref_data, active_axes)
-                                                        print(f">>> Expert Reference SAVED! Active Axes: {active_axes}, Peak Intensity: {expert_peak:.0f}")
-                                                        try:
-                                                            fname = save_movement_graph(r_ax, r_ay, r_az, 0)
-                                                            self.stats["latest_graph"] = fname
-                                                        except: pass
-                                                        mode = "COUNTING"
-                                                        self.stats["mode"] = "COUNTING"
-                                                else:
-                                                    # [요청 반영] 회차 정산 (JSON 저장 -> 분석 -> 유사도)
-                                                    # 카운트는 이미 피크 지점에서 수행됨
-                                                    if self.stats.get("is_set_active") and len(current_ax) >= MIN_MOVEMENT_SAMPLES:
-                                                        self._process_and_save_rep(current_ax, current_ay, current_az, baseline, session_reps)
-                                                
-                                                current_ax, current_ay, current_az = [], [], []
-                                                still_start_time = None
-                                                entered_peak_this_burst = False
-                                                has_counted_this_burst = False
-                                    
-                                    if is_moving:
-                                        current_ax.append(ax)
-                                        current_ay.append(ay)
-                                        current_az.append(az)
-
-                                        # [요청 반영] 실시간 피크 감지: 진입(Enter) 후 이탈(Exit) 시 카운트 (COUNTING 모드 전용)
-                                        # [요청 반영] 실시간 피크 감지: 활성 축(Active Axes) 기반 진입/이탈 체크
-                                        if mode == "COUNTING" and not has_counted_this_burst and expert_peak > 0:
-                                            # 활성 축들의 데이터만으로 현재 Magnitude 계산
-                                            sum_sq = 0
-                                            for axis_name in active_axes:
-                                                val = {"ax": ax, "ay": ay, "az": az}[axis_name]
-                                                sum_sq += val**2
-                                            cur_mag = math.sqrt(sum_sq)
-                                            
-                                            threshold = expert_peak * (1 - PEAK_TOLERANCE_PERCENT)
-                                            
-                                            if not entered_peak_this_burst:
-                                                if cur_mag >= threshold:
-                                                    entered_peak_this_burst = True
-                                                    print(f"[DEBUG] Peak Zone ENTERED (Active Axes Mag: {cur_mag:.0f})")
-                                            else:
-                                                if cur_mag < threshold:
-                                                    self.stats["count"] += 1
-                                                    has_counted_this_burst = True
-                                                    print(f"[ACTION] Peak Zone EXITED! Rep #{self.stats['count']} counted (Mag: {cur_mag:.0f})")
-
-                                # C. Update Visualization
-                                if self.stats.get("is_set_active") or mode == "RECORDING_EXPERT":
-                                    if len(current_ax) % 5 == 0:
-                                        current_mags = [math.sqrt(a**2+b**2+c**2) for a,b,c in zip(current_ax, current_ay, current_az)]
-                                        self.stats["current_distribution"] = current_mags[-50:]
-                                else:
-                                    if len(parts) % 5 == 0:
-                                        live_mag = math.sqrt(ax**2 + ay**2 + az**2)
-                                        if "current_distribution" not in self.stats: self.stats["current_distribution"] = []
-                                        self.stats["current_distribution"].append(live_mag)
-                                        if len(self.stats["current_distribution"]) > 50: self.stats["current_distribution"].pop(0)
-                    except Exception as e:
-                        print(f"[ERROR] Signal handle error: {e}")
+                                s.mode = "COUNTING"
+                                self.stats["mode"] = "COUNTING"
+                        else:
+                            # [요청 반영] 회차 정산 (JSON 저장 -> 분석 -> 유사도)
+                            # 카운트는 이미 피크 지점에서 수행됨
+                            if self.stats.get("is_set_active") and len(s.current_rep["ax"]) >= MIN_MOVEMENT_SAMPLES:
+                                self._process_and_save_rep(s.current_rep, baseline, s.session_reps)
+                        
+                        s.current_rep = new_channel_buffer()
+                        s.still_start_time = None
+                        s.entered_peak_this_burst = False
+                        s.has_counted_this_burst = False
+            
+            if s.is_moving:
+                for ch in CHANNELS:
+                    s.current_rep[ch].append(sample[ch])
 
-        except Exception as e:
-            print(f"[FATAL] DeviceHandler error: {e}")
-        finally:
-            self.conn.close()
-            print(f">>> Connection closed: {self.addr}")
-
-    def _finalize_session(self, session_reps, ref_data, stats, baseline=None, set_raw_data=None, movement_offsets=None):
-        """세트 종료 후 전체 운동에 대한 유사도 정산 및 전문가 오버레이 그래프 생성"""
-        if not session_reps or not ref_data:
-            print("\n>>> 세트 종료. 분석할 운동 데이터가 없습니다.")
+                # [요청 반영] 실시간 피크 감지: 활성 축(Active Axes) 기반 진입/이탈 체크 (COUNTING 모드 전용)
+                if s.mode == "COUNTING" and not s.has_counted_this_burst and s.expert_peak > 0:
+                    # 활성 축들의 데이터만으로 현재 Magnitude 계산
+                    sum_sq = 0
+                    for axis_name in s.active_axes:
+                        val = sample[axis_name]
+                        sum_sq += val**2
+                    cur_mag = math.sqrt(sum_sq)
+                    
+                    peak_tol = LINEAR_PEAK_TOLERANCE_PERCENT if s.motion is not None else PEAK_TOLERANCE_PERCENT
+                    threshold = s.expert_peak * (1 - peak_tol)
+                    
+                    if not s.entered_peak_this_burst:
+                        if cur_mag >= threshold:
+                            s.entered_peak_this_burst = True
+                            print(f"[DEBUG] Peak Zone ENTERED (Active Axes Mag: {cur_mag:.0f})")
+                    else:
+                        if cur_mag < threshold:
+                            self.stats["count"] += 1
+                            s.has_counted_this_burst = True
+                            print(f"[ACTION] Peak Zone EXITED! Rep #{self.stats['count']} counted (Mag: {cur_mag:.0f})")
+                            self._publish("rep", {"count": self.stats["count"], "set": self.stats["set_count"] + 1,
+                                                  "peak_mag": round(cur_mag, 1)})
+
+        # C. Update Visualization (샘플당 magnitude 1회 계산, 버킷 단위 min/max로 축약)
+        s.waveform.add(ax, ay, az)
+        self.stats["current_samples"] = len(s.current_rep["ax"])
+
+    def _publish(self, kind, data):
+        """Rep/set events for external subscribers (see publisher.py)"""
+        data["device"] = self.session.device_id if self.session else None
+        get_bus().publish(Event(kind, self.conn, data, None))
+
+    def _send_stream_config(self, mode, baseline):
+        """Negotiate adaptive streaming with the firmware: CFG:<threshold>,<window_ms>,<idle_enabled>"""
+        if self.is_env_only:
             return
+        # 보정 중에는 정지 노이즈를 전체 속도로 측정해야 하므로 idle 비활성화
+        idle = ADAPTIVE_STREAMING and mode != "CALIBRATING" and baseline is not None
+        threshold = int(min(get_tolerances(baseline).values()) * IDLE_WAKE_RATIO) if baseline else MIN_ABS_DIFF
+        try:
+            self.conn.sendall(f"CFG:{threshold},{IDLE_SUMMARY_MS},{1 if idle else 0}\n".encode())
+            print(f">>> Stream config sent: threshold={threshold}, window={IDLE_SUMMARY_MS}ms, idle={'ON' if idle else 'OFF'}")
+        except Exception as e:
+            print(f"[ERROR] Failed to send stream config: {e}")
 
-        print("\n" + "="*50)
-        print(f" FINAL SESSION REPORT (Total Reps: {len(session_reps)})")
-        print(f" (Comparison with Expert Reference)")
-        print("="*50)
-        
-        # 실제 베이스라인(0점)이 없으면 전문가 데이터의 첫 샘플을 임시로 사용
-        if baseline is None:
-            baseline = {"ax": ref_data["ax"][0], "ay": ref_data["ay"][0], "az": ref_data["az"][0]}
-            print(">>> [WARNING] 세션 베이스라인(0점)을 찾을 수 없어 Reference의 시작점을 대신 사용합니다.")
-
-        total_sim = 0
-        valid_reps = 0
-        for i, (ax, ay, az) in enumerate(session_reps):
-            # 1. 베이스라인(0점)을 기준으로 실제 움직임 구간만 추출
-            t_ax, t_ay, t_az = extract_movement_segment(ax, ay, az, baseline)
-            
-            # 추출 실패 시 원본 데이터 유지
-            if not t_ax: 
-                t_ax, t_ay, t_az = ax, ay, az
-            
-            # 2. 추출된 데이터를 전문가 Reference와 비교하여 유사도 계산
-            s1 = calculate_similarity(ref_data["ax"], t_ax)
-            s2 = calculate_similarity(ref_data["ay"], t_ay)
-            s3 = calculate_similarity(ref_data["az"], t_az)
-            avg_sim = (s1 + s2 + s3) / 3.0
-            
-            total_sim += avg_sim
-            valid_reps += 1
-            print(f" Rep #{i+1:2d} | Accuracy: {avg_sim:5.1f}%")
-            
-        if valid_reps > 0:
-            final_avg = total_sim / valid_reps
-            stats["similarity"] = final_avg
-            print("-" * 50)
-            print(f" AVERAGE SESSION ACCURACY: {final_avg:.1f}%")
-            print(f">>> (Reference 대비 세트 평균 유사도 업데이트: {final_avg:.1f}%)")
-            
-            # [요청 반영] 세트(스텝) 통합 JSON 저장
-            if set_raw_data:
-                save_set_to_json(set_raw_data, self.stats["set_count"], final_avg)
-            
-            # [요청 반영] 세트(스텝) 종료 보고서용 전체 파형 및 전문가 가이드 오버레이 그래프 저장
-            if set_raw_data:
-                fname = save_movement_graph(set_raw_data["ax"], set_raw_data["ay"], set_raw_data["az"], self.stats["set_count"], final_avg, movement_offsets)
-                self.stats["latest_graph"] = fname
-        else:
-            print(">>> 유효한 운동 회차가 없어 유사도를 정산할 수 없습니다.")
-        
-        print("="*50 + "\n")
+    def _handle_summary(self, vals):
+        """Idle keepalive summary: SUM:n,minx,miny,minz,maxx,maxy,maxz,meanx,meany,meanz,btn"""
+        try:
+            mean_x, mean_y, mean_z = vals[7:10]
+        except Exception as e:
+            print(f"[ERROR] Summary parse error: {e}")
+            return
+        self.stats["stream_mode"] = "IDLE"
+        # 요약 구간 동안 샘플이 비었으므로 전체 속도로 돌아오면 필터 이력부터 다시 채움
+        if self.session.filters is not None:
+            self.session.filters.reset()
+        self.session.waveform.add(mean_x, mean_y, mean_z)
 
-    def _process_and_save_rep(self, current_ax, current_ay, current_az, baseline, session_reps):
+    def _process_and_save_rep(self, current_rep, baseline, session_reps):
         """동작 1회에 대한 JSON 저장, 이미지 생성 및 유사도 분석 수행"""
         try:
-            # 1. 전문가 데이터 로드
-            if not os.path.exists(REFERENCE_FILE):
+            # 1. 전문가 데이터 (프로필에 캐시된 Reference 사용, 회차마다 디스크에서 다시 읽지 않음)
+            ref_data = self.session.profile.ref_data
+            if ref_data is None:
                 print("[WARNING] 전문가 데이터가 없어 정산을 건너뜁니다.")
                 return
-                
-            with open(REFERENCE_FILE, "r") as f:
-                ref_data = json.load(f)
             
-            # 2. 현재 동작 세그먼트 정밀 추출 (TOLERANCE 기반)
-            cur_ax, cur_ay, cur_az = extract_movement_segment(
-                current_ax, current_ay, current_az, baseline
-            )
-            
-            if cur_ax:
-                # 3. 유사도 계산
-                sim_x = calculate_similarity(ref_data["ax"], cur_ax)
-                sim_y = calculate_similarity(ref_data["ay"], cur_ay)
-                sim_z = calculate_similarity(ref_data["az"], cur_az)
-                avg_sim = (sim_x + sim_y + sim_z) / 3.0
+            # 2. 세그먼트 추출 + 유사도(SIMILARITY_MODE 채널) + 템포/피크를 한 번에 계산, 세트 정산에서 그대로 재사용
+            channels = get_scoring_channels(ref_data, baseline)
+            features, _ = compute_rep_features(current_rep, baseline, ref_data, channels, self.session.active_axes)
+
+            if features is not None:
+                avg_sim = features.similarity
                 
                 # [요청 반영] 카운트는 이미 피크 지점에서 올라갔으므로 현재 카운트 사용
                 rep_num = self.stats["count"]
                 
                 # 4. [요청 반영] 개별 JSON 저장 제거 (세트 종료 시 일괄 저장)
-                # save_rep_to_json(current_ax, current_ay, current_az, rep_num, avg_sim)
+                # save_rep_to_json(current_rep, rep_num, avg_sim)
                 
                 # 5. [요청 반영] 그래프 저장 제거 (세트 종료 시 일괄 출력 예정)
-                # save_movement_graph(current_ax, current_ay, current_az, rep_num, avg_sim)
+                # save_movement_graph(current_rep["ax"], current_rep["ay"], current_rep["az"], rep_num, avg_sim)
                 
                 # 6. 통계 업데이트 (유사도 반영)
                 self.stats["similarity"] = avg_sim
-                session_reps.append((list(current_ax), list(current_ay), list(current_az)))
+                self.stats["last_rep"] = {"rep": rep_num, **features._asdict()}
+                session_reps.append({ch: list(vals) for ch, vals in current_rep.items()})
+                self.session.rep_features.append(features)
+                if self.session.journal is not None:
+                    self.session.journal.event("rep", features=features._asdict())
                 
-                print(f"[ACTION] Rep #{rep_num} ANALYZED & ARCHIVED: {avg_sim:.1f}%")
+                print(f"[ACTION] Rep #{rep_num} ANALYZED & ARCHIVED: {avg_sim:.1f}% "
+                      f"({features.duration:.1f}s, up {features.concentric:.1f}s / down {features.eccentric:.1f}s)")
             else:
                 print(f"[ACTION] Burst ended but no valid segment extracted (discarded)")
         except Exception as e:
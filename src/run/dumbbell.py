@@ -1,9 +1,11 @@
+import argparse
+import signal
 import threading
-import socket
-import time
-from config import HOST, PORT
+from config import HOST, PORT, DEVICE_RX_TIMEOUT, COUNTING_QUEUE_SIZE, GRAPH_WEB_PORT, PUBLISH_ADDRESS, JOURNAL_ENABLED
 from web_server import WebServer
 from device_handler import DeviceHandler
+from session import configure_socket
+from ingest import IngestServer, INGEST_KINDS, get_bus
 
 class DumbbellApp:
     def __init__(self):
@@ -11,8 +13,8 @@ class DumbbellApp:
         self.port = PORT
 
     def start_web_server(self):
-        web_server = WebServer()
-        web_thread = threading.Thread(target=web_server.run, daemon=True)
+        self.web_server = WebServer()
+        web_thread = threading.Thread(target=self.web_server.run, daemon=True)
         web_thread.start()
         print("="*60)
         print("Web UI available at http://localhost")
@@ -28,87 +30,165 @@ class DumbbellApp:
         print("="*60)
 
     def run(self):
+        self.start()
+        self.engine_thread.join()
+
+    def stop(self):
+        """Graceful shutdown: stop accepting devices, close dashboard streams, finish queued set reports"""
+        print("\n>>> Shutting down...")
+        self.ingest.stop()
+        self.web_server.shutdown()
+        if self.app_state.stats.get("pending_reports"):
+            print(f">>> Waiting for {self.app_state.stats['pending_reports']} set report(s)...")
+        self.app_state.finalizer.wait()
+        # 아직 켜져 있는 세트는 저널에 남은 샘플까지 기록해 다음 시작 시 복구
+        if self.app_state.journals is not None:
+            self.app_state.journals.close_all()
+
+    def start(self):
+        """Start the web UI, the ingest service and the counting engine (non-blocking)"""
         self.start_web_server()
         self.print_usage()
 
         from state import AppState
-        app_state = AppState.get_instance()
-
-        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-            s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-            s.bind((self.host, self.port))
-            s.listen(5)
-            
-            # Phase 1: Wait for ENV sensor connection
-            print("\n" + "="*60)
-            print("온습도 센서 연결 대기 중...")
-            print("온습도 센서의 전원을 켜주세요")
-            print("="*60)
-            
-            # Reset all flags for new session
-            app_state.ai_advice_triggered = False
-            app_state.ai_advice_completed = False
-            app_state.stats["allow_dumbbell"] = False
-            app_state.stats["connection_phase"] = "WAITING_ENV"
-            
-            conn, addr = s.accept()
-            print(f">>> 온습도 센서 연결됨: {addr[0]}:{addr[1]}")
-            
-            # Handle ENV sensor
-            handler = DeviceHandler(conn, addr, is_env_only=True)
-            env_thread = threading.Thread(target=handler.run, daemon=True)
-            env_thread.start()
-            
-            # Wait for ENV sensor to finish (it will auto-disconnect)
-            env_thread.join()
-            
-            # Phase 2: Prompt user
-            print("\n" + "="*60)
-            print("온습도 센서 연결 완료!")
-            print("="*60)
-            print("\n이제 온습도 센서 전원을 끄고")
-            print("아령 기기의 전원을 켜주세요")
-            print("웹 UI에서 '아령 연결' 버튼을 눌러주세요")
-            print("="*60 + "\n")
-            
-            app_state.stats["connection_phase"] = "ENV_DONE"
-            
-            # Phase 3: Wait for button press
-            print(">>> 웹 UI에서 버튼 클릭을 기다리는 중...")
-            while not app_state.stats["allow_dumbbell"]:
-                time.sleep(0.5)
-            
-            print("\n" + "="*60)
-            print("아령 기기 연결 대기 중...")
-            print("="*60)
-            
-            while True:
-                try:
-                    # Accept dumbbell connection
-                    conn, addr = s.accept()
-                    print(f">>> 아령 기기 연결됨: {addr[0]}:{addr[1]}")
-                    app_state.stats["connection_phase"] = "DUMBBELL_CONNECTED"
-                    
-                    # Handle dumbbell - this will run indefinitely unless disconnected
-                    # 명시적으로 is_env_only=False 설정
-                    handler = DeviceHandler(conn, addr, is_env_only=False)
-                    handler.run()
-                    
-                    print("\n>>> 기기 연결이 종료되었습니다. 다음 연결을 기다립니다...")
-                    app_state.stats["connection_phase"] = "ENV_DONE"
-                    app_state.stats["allow_dumbbell"] = True # Keep allowed for retry
-                    
-                except Exception as e:
-                    import traceback
-                    print(f"\n[ERROR] 아령 처리 중 오류 발생: {e}")
-                    traceback.print_exc()
-                    print(">>> 5초 후 다시 대기합니다...")
-                    time.sleep(5)
+        self.app_state = AppState.get_instance()
+
+        # 지난 실행에서 끝나지 않은 세트(비정상 종료)를 장치 접속 전에 아카이브로 복구
+        if JOURNAL_ENABLED:
+            from journal import recover_journals
+            recovered = recover_journals()
+            if recovered:
+                self.app_state.stats["latest_report"] = recovered[-1]
+
+        # 카운팅 엔진은 버스의 한 구독자: 그래퍼들이 같은 스트림을 동시에 구독해도 카운팅은 그대로 진행
+        self.bus = get_bus()
+        self.events = self.bus.subscribe("counting", maxsize=COUNTING_QUEUE_SIZE, kinds=INGEST_KINDS)
+        self.ingest = IngestServer(self.bus, self.host, self.port, configure=configure_socket)
+        self.ingest.start()
+
+        # Phase 1: Wait for ENV sensor connection
+        print("\n" + "="*60)
+        print("온습도 센서 연결 대기 중...")
+        print("온습도 센서의 전원을 켜주세요")
+        print("="*60)
+        
+        # Reset all flags for new session
+        self.app_state.ai_advice_triggered = False
+        self.app_state.ai_advice_completed = False
+        self.app_state.stats["allow_dumbbell"] = False
+        self.app_state.stats["connection_phase"] = "WAITING_ENV"
+
+        self.engine_thread = threading.Thread(target=self._engine_loop, daemon=True)
+        self.engine_thread.start()
+
+    def _engine_loop(self):
+        stats = self.app_state.stats
+        self.env_done = False
+        self.handlers = {}  # Connection.id -> DeviceHandler
+        self.pending = {}   # 웹 UI 허용 전 접속한 아령: Connection.id -> [Connection, 마지막 HELLO 이벤트]
+
+        while True:
+            event = self.events.get(timeout=0.5)
+            try:
+                # Phase 3: 웹 UI에서 허용되면 대기 중이던 아령 연결을 처리 시작
+                if self.pending and stats["allow_dumbbell"]:
+                    for conn, hello in list(self.pending.values()):
+                        self._start_dumbbell(conn, hello)
+                    self.pending.clear()
+                if event is not None:
+                    self._dispatch(event)
+            except Exception as e:
+                import traceback
+                print(f"\n[ERROR] 아령 처리 중 오류 발생: {e}")
+                traceback.print_exc()
+
+    def _dispatch(self, event):
+        stats = self.app_state.stats
+        conn = event.source
+
+        if event.kind == "connect":
+            if not self.env_done and not any(h.is_env_only for h in self.handlers.values()):
+                print(f">>> 온습도 센서 연결됨: {conn.addr[0]}:{conn.addr[1]}")
+                self.handlers[conn.id] = DeviceHandler(conn, is_env_only=True)
+            elif stats["allow_dumbbell"]:
+                self._start_dumbbell(conn)
+            else:
+                conn.rx_timeout = DEVICE_RX_TIMEOUT
+                self.pending[conn.id] = [conn, None]
+            return
+
+        if event.kind == "disconnect":
+            self.pending.pop(conn.id, None)
+            handler = self.handlers.pop(conn.id, None)
+            if handler is None:
+                return
+            handler.finish()
+            if handler.is_env_only:
+                self.env_done = True
+                # Phase 2: Prompt user
+                print("\n" + "="*60)
+                print("온습도 센서 연결 완료!")
+                print("="*60)
+                print("\n이제 온습도 센서 전원을 끄고")
+                print("아령 기기의 전원을 켜주세요")
+                print("웹 UI에서 '아령 연결' 버튼을 눌러주세요")
+                print("="*60 + "\n")
+                stats["connection_phase"] = "ENV_DONE"
+                print(">>> 웹 UI에서 버튼 클릭을 기다리는 중...")
+            elif not any(not h.is_env_only for h in self.handlers.values()):
+                print("\n>>> 기기 연결이 종료되었습니다. 다음 연결을 기다립니다... (세션은 잠시 보관됨)")
+                stats["connection_phase"] = "ENV_DONE"
+                stats["allow_dumbbell"] = True # Keep allowed for retry
+            return
+
+        handler = self.handlers.get(conn.id)
+        if handler is not None:
+            handler.handle(event)
+        elif conn.id in self.pending and event.kind == "hello":
+            # 허용 전에는 데이터를 버리되 세션 식별용 HELLO는 보관
+            self.pending[conn.id][1] = event
+
+    def _start_dumbbell(self, conn, hello=None):
+        print(f">>> 아령 기기 연결됨: {conn.addr[0]}:{conn.addr[1]}")
+        self.app_state.stats["connection_phase"] = "DUMBBELL_CONNECTED"
+        # 명시적으로 is_env_only=False 설정
+        handler = DeviceHandler(conn, is_env_only=False)
+        self.handlers[conn.id] = handler
+        if hello is not None:
+            handler.handle(hello)
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="SHD server (counting engine + web UI)")
+    parser.add_argument("--web-graph", action="store_true", help=f"Also serve the live web grapher on port {GRAPH_WEB_PORT}")
+    parser.add_argument("--accel-graph", action="store_true", help="Also open the matplotlib grapher (same live stream)")
+    parser.add_argument("--fast", action="store_true", help="Use the fast blitted mode for --accel-graph")
+    parser.add_argument("--publish", nargs="?", const=PUBLISH_ADDRESS, default=None, metavar="ADDR",
+                        help=f"Stream samples and rep/set events to external subscribers (default {PUBLISH_ADDRESS}, or unix:/path)")
+    parser.add_argument("--sample-clock", action="store_true",
+                        help="Time stillness/calibration by received samples instead of the wall clock (accelerated replay, workout_synth.py)")
+    args = parser.parse_args()
+    if args.sample_clock:
+        import config
+        config.SAMPLE_CLOCK = True
+    # SIGTERM (서비스 종료)도 Ctrl+C와 같이 정상 종료 경로로
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
     try:
         app = DumbbellApp()
-        app.run()
+        app.start()
+        if args.publish:
+            from publisher import Publisher
+            Publisher(args.publish, app.bus).start()
+        # 디버깅용 그래퍼는 같은 ingest 버스를 구독 (카운팅을 멈추지 않음)
+        if args.web_graph:
+            import standalone_web_graph
+            standalone_web_graph.start_in_background(app.bus)
+        if args.accel_graph:
+            import standalone_accel_graph
+            standalone_accel_graph.run(app.bus, fast=args.fast) # matplotlib은 메인 스레드에서 실행
+        while app.engine_thread.is_alive():
+            app.engine_thread.join(0.5) # 메인 스레드가 KeyboardInterrupt를 받을 수 있도록 짧게 대기
+    except KeyboardInterrupt:
+        app.stop()
     except Exception as e:
         import traceback
         print(f"\n[FATAL ERROR] 프로그램 실행 중 치명적 오류 발생: {e}")
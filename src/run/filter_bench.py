@@ -0,0 +1,63 @@
+import argparse
+import time
+
+import numpy as np
+
+from config import CHANNELS, ACCEL_AXES, NOISE_SIGMA_K, MIN_NOISE_TOLERANCE
+from filters import FilterBank, filter_batch
+
+DEFAULT_CHAINS = ["spike", "median3", "median5", "ema", "biquad", "spike,biquad", "median3,ema"]
+
+def synthetic_stream(n, spikes, noise, seed):
+    """Still dumbbell (1 g on az) with sensor noise and single-sample I2C glitches"""
+    rng = np.random.default_rng(seed)
+    data = {}
+    for ch in CHANNELS:
+        x = rng.normal(0, noise, n) + (16384 if ch == "az" else 0)
+        idx = rng.choice(n, spikes, replace=False)
+        x[idx] += rng.choice([-1, 1], spikes) * rng.uniform(10000, 32000, spikes)
+        data[ch] = np.clip(x, -32768, 32767).astype(int).tolist()
+    return data
+
+def spurious(data, noise):
+    """Samples that would cross the movement threshold on a still sensor"""
+    tol = max(NOISE_SIGMA_K * noise, MIN_NOISE_TOLERANCE)
+    return sum(int(np.count_nonzero(np.abs(np.asarray(data[ch]) - (16384 if ch == "az" else 0)) > tol))
+               for ch in ACCEL_AXES)
+
+def bench_stream(chain, samples):
+    bank = FilterBank(chain)
+    t0 = time.perf_counter()
+    out = [bank.process(s) for s in samples]
+    return time.perf_counter() - t0, out
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-sample overhead and live/offline equality of the filter bank")
+    parser.add_argument("--samples", type=int, default=50000)
+    parser.add_argument("--spikes", type=int, default=100, help="Injected glitches per channel")
+    parser.add_argument("--noise", type=float, default=60.0, help="Still-sensor noise sigma (raw counts)")
+    parser.add_argument("--chains", nargs="*", default=DEFAULT_CHAINS, help='Comma-separated stage lists, e.g. "spike,biquad"')
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    data = synthetic_stream(args.samples, args.spikes, args.noise, args.seed)
+    samples = [dict(zip(CHANNELS, row)) for row in zip(*(data[ch] for ch in CHANNELS))]
+    base_time, _ = bench_stream([], samples)  # 샘플 dict 생성/순회 자체 비용
+    print(f"\n {args.samples:,} samples x {len(CHANNELS)} channels | {args.spikes} glitches/channel | "
+          f"unfiltered spurious threshold crossings: {spurious(data, args.noise)}")
+    print(f" {'chain':16s} | {'live us/sample':>14s} | {'overhead':>8s} | {'batch us/sample':>15s} | identical | spurious")
+    print("-" * 84)
+    for spec in args.chains:
+        chain = [name for name in spec.split(",") if name]
+        live_time, live = bench_stream(chain, samples)
+        t0 = time.perf_counter()
+        offline = filter_batch(data, chain)
+        batch_time = time.perf_counter() - t0
+        identical = all(np.asarray([s[ch] for s in live], dtype=float).tobytes() == np.asarray(offline[ch]).tobytes()
+                        for ch in CHANNELS)
+        per = 1e6 / args.samples
+        print(f" {spec:16s} | {live_time * per:14.2f} | {(live_time - base_time) * per:8.2f} | "
+              f"{batch_time * per:15.2f} | {'yes' if identical else 'NO':9s} | {spurious(offline, args.noise)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+import math
+from collections import deque
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from config import (ACCEL_AXES, CHANNELS, SAMPLE_RATE_HZ, FILTER_CHAIN, FILTER_SPIKE_WINDOW, FILTER_SPIKE_ACCEL,
+                    FILTER_SPIKE_GYRO, FILTER_EMA_ALPHA, FILTER_LOWPASS_HZ)
+
+class _Median:
+    """Causal running median of the last `size` samples (window primed with the first sample)"""
+    __slots__ = ("size", "window")
+
+    def __init__(self, size):
+        self.size = size
+        self.window = None
+
+    def step(self, x):
+        w = self.window
+        if w is None:
+            w = self.window = deque([x] * self.size, maxlen=self.size)
+        else:
+            w.append(x)
+        return sorted(w)[self.size // 2]
+
+    def batch(self, x):
+        # 스트리밍과 같은 창 (앞쪽을 첫 샘플로 채움): 중앙값은 원소 선택이므로 그대로 일치
+        padded = np.concatenate((np.full(self.size - 1, x[0]), x))
+        return np.sort(sliding_window_view(padded, self.size), axis=1)[:, self.size // 2]
+
+class _Spike(_Median):
+    """Replace a sample by the running median only when it is further than `threshold` from it"""
+    __slots__ = ("threshold",)
+
+    def __init__(self, size, threshold):
+        super().__init__(size)
+        self.threshold = threshold
+
+    def step(self, x):
+        med = _Median.step(self, x)
+        return med if abs(x - med) > self.threshold else x
+
+    def batch(self, x):
+        med = _Median.batch(self, x)
+        return np.where(np.abs(x - med) > self.threshold, med, x)
+
+class _Ema:
+    """First-order low-pass y += alpha * (x - y), starting at the first sample"""
+    __slots__ = ("alpha", "y")
+
+    def __init__(self, alpha):
+        self.alpha = alpha
+        self.y = None
+
+    def step(self, x):
+        if self.y is None:
+            self.y = x
+        else:
+            self.y = self.y + self.alpha * (x - self.y)
+        return self.y
+
+class _Biquad:
+    """Butterworth low-pass biquad (RBJ coefficients, transposed direct form II).
+
+    The state starts at the steady state of the first sample, so a still sensor
+    produces no start-up transient.
+    """
+    __slots__ = ("b0", "b1", "b2", "a1", "a2", "z1", "z2")
+
+    def __init__(self, cutoff_hz, sample_rate=SAMPLE_RATE_HZ):
+        w0 = 2 * math.pi * cutoff_hz / sample_rate
+        alpha = math.sin(w0) / math.sqrt(2)  # Q = 1/sqrt(2)
+        cos_w0 = math.cos(w0)
+        a0 = 1 + alpha
+        self.b0 = self.b2 = (1 - cos_w0) / 2 / a0
+        self.b1 = (1 - cos_w0) / a0
+        self.a1 = -2 * cos_w0 / a0
+        self.a2 = (1 - alpha) / a0
+        self.z1 = None
+        self.z2 = None
+
+    def step(self, x):
+        if self.z1 is None:
+            self.z1 = x - self.b0 * x
+            self.z2 = (self.b2 - self.a2) * x
+        y = self.b0 * x + self.z1
+        self.z1 = self.b1 * x - self.a1 * y + self.z2
+        self.z2 = self.b2 * x - self.a2 * y
+        return y
+
+def _make_stage(name, channel):
+    if name == "median3":
+        return _Median(3)
+    if name == "median5":
+        return _Median(5)
+    if name == "spike":
+        return _Spike(FILTER_SPIKE_WINDOW, FILTER_SPIKE_ACCEL if channel in ACCEL_AXES else FILTER_SPIKE_GYRO)
+    if name == "ema":
+        return _Ema(FILTER_EMA_ALPHA)
+    if name == "biquad":
+        return _Biquad(FILTER_LOWPASS_HZ)
+    raise ValueError(f"Unknown filter stage: {name}")
+
+def _run_batch(stage, x):
+    if hasattr(stage, "batch"):
+        return stage.batch(x)
+    # 재귀(IIR) 단계는 닫힌 형식으로 바꾸면 반올림이 달라지므로 같은 점화식을 그대로 적용
+    return np.fromiter(map(stage.step, x.tolist()), dtype=float, count=len(x))
+
+class FilterBank:
+    """Per-channel streaming filter chain applied to raw samples before detection.
+
+    Every stage is O(1) per sample. filter_batch() evaluates the same chain over a
+    recorded set and returns bit-identical values, so offline replay sees exactly what
+    the live detector saw (the state starts fresh at each set start, like the archive).
+    """
+
+    def __init__(self, chain=FILTER_CHAIN, channels=None):
+        self.chain = list(chain)
+        self.channels = list(channels or CHANNELS)
+        self.reset()
+
+    def reset(self):
+        """Forget the history (set start, or resuming after an idle gap)"""
+        self.stages = {ch: [_make_stage(name, ch).step for name in self.chain] for ch in self.channels}
+
+    def process(self, sample):
+        """Raw sample dict -> filtered sample dict (same channels)"""
+        out = {}
+        for ch, steps in self.stages.items():
+            v = sample[ch]
+            for step in steps:
+                v = step(v)
+            out[ch] = v
+        return out
+
+def filter_batch(set_data, chain=FILTER_CHAIN):
+    """FilterBank over a whole recording: {channel: list}, equal to feeding it sample by sample"""
+    if not chain:
+        return set_data
+    out = {}
+    for ch, vals in set_data.items():
+        x = np.asarray(vals, dtype=float)
+        if len(x):
+            for name in chain:
+                x = _run_batch(_make_stage(name, ch), x)
+        out[ch] = x.tolist()
+    return out
+
+def filter_setup(chain=FILTER_CHAIN):
+    """FilterBank for the configured chain, or None when filtering is disabled"""
+    return FilterBank(chain) if chain else None
@@ -0,0 +1,140 @@
+import copy
+import json
+import os
+import queue
+import threading
+from collections import namedtuple
+
+from config import REFERENCE_FILE, REPS_DIR, DEFAULT_PROFILE, SET_REPORT_PNG
+from analysis import save_set_to_json
+from motion import linear_acceleration_batch
+from filters import filter_batch
+from visualizer import save_movement_graph
+from ingest import Event, get_bus
+
+# 세트 종료 시점의 불변 스냅샷 (다음 세트가 버퍼를 재사용해도 영향 없음)
+SetSnapshot = namedtuple("SetSnapshot", ["set_num", "reps", "set_data", "offsets", "baseline", "motion_baseline",
+                                         "ref_data", "reps_dir", "profile", "features", "journal", "stats"])
+
+def snapshot_set(set_num, session_reps, set_raw_buffer, movement_offsets, baseline, motion=None, profile=None,
+                 rep_features=(), journal=None, stats=None):
+    """Freeze the finished set so the ingest loop can start the next one immediately"""
+    freeze = lambda channels: {ch: tuple(vals) for ch, vals in channels.items()}
+    return SetSnapshot(
+        set_num=set_num,
+        reps=tuple(freeze(rep) for rep in session_reps),
+        set_data=freeze(set_raw_buffer),
+        offsets=tuple(movement_offsets),
+        # Baseline은 정지 구간 추적으로 계속 갱신되므로 복사본을 사용
+        baseline=copy.deepcopy(baseline),
+        motion_baseline=copy.deepcopy(motion.baseline) if motion is not None else None,
+        # 프로필의 Reference는 저장 시 통째로 교체되므로 참조만 보관해도 안전
+        ref_data=profile.ref_data if profile is not None else None,
+        reps_dir=profile.reps_dir if profile is not None else REPS_DIR,
+        profile=profile.name if profile is not None else DEFAULT_PROFILE,
+        # 회차 종료 시 계산된 특징 (불변 namedtuple이므로 그대로 공유)
+        features=tuple(rep_features),
+        # 세트 아카이브가 저장되면 지우는 write-ahead 저널 (journal.SetJournal, 비활성화 시 None)
+        journal=journal,
+        # 결과(유사도, 보고서)를 기록할 아령별 상태 (None이면 SetFinalizer의 공유 상태)
+        stats=stats,
+    )
+
+def finalize_set(snap, ref_data, stats):
+    """세트 종료 후 전체 운동에 대한 유사도 정산 및 전문가 오버레이 그래프 생성"""
+    session_reps = snap.reps
+    if not session_reps or not ref_data:
+        print(f"\n>>> 세트 #{snap.set_num} 종료. 분석할 운동 데이터가 없습니다.")
+        return
+
+    print("\n" + "="*50)
+    print(f" FINAL SESSION REPORT (Set #{snap.set_num}, Total Reps: {len(session_reps)})")
+    print(f" (Comparison with Expert Reference)")
+    print("="*50)
+
+    # 회차 종료 시 계산해 둔 특징(구간, 유사도, 템포)을 그대로 사용하므로 회차 데이터를 다시 훑지 않음
+    total_sim = 0
+    valid_reps = 0
+    for i, feat in enumerate(snap.features):
+        total_sim += feat.similarity
+        valid_reps += 1
+        print(f" Rep #{i+1:2d} | Accuracy: {feat.similarity:5.1f}% | {feat.duration:4.1f}s "
+              f"(up {feat.concentric:.1f}s / down {feat.eccentric:.1f}s) | Peak: {feat.peak_mag:.0f}")
+
+    if valid_reps > 0:
+        final_avg = total_sim / valid_reps
+        stats["similarity"] = final_avg
+        print("-" * 50)
+        print(f" AVERAGE SESSION ACCURACY: {final_avg:.1f}%")
+        print(f">>> (Reference 대비 세트 평균 유사도 업데이트: {final_avg:.1f}%)")
+
+        set_data = snap.set_data
+        report = None
+        if set_data and set_data.get("ax"):
+            # [요청 반영] 세트(스텝) 통합 JSON 저장 (대시보드 보고서는 이 아카이브에서 /report로 제공)
+            archived = save_set_to_json({ch: list(vals) for ch, vals in set_data.items()}, snap.set_num, final_avg,
+                                        snap.reps_dir, snap.offsets, snap.motion_baseline, snap.features)
+            report = stats["latest_report"] = f"{snap.profile}/{archived}"
+
+            if SET_REPORT_PNG:
+                # PNG 내보내기 (선택): 선형 가속도 모드에서는 전문가 가이드와 같은 좌표로 그리기 위해 변환 후 출력
+                plot_data = filter_batch(set_data)
+                if snap.motion_baseline:
+                    plot_data = linear_acceleration_batch(plot_data, snap.motion_baseline)
+                fname = save_movement_graph(list(plot_data["ax"]), list(plot_data["ay"]), list(plot_data["az"]),
+                                            snap.set_num, final_avg, list(snap.offsets), ref_data)
+                stats["latest_graph"] = fname
+        get_bus().publish(Event("set", None, {"set": snap.set_num, "reps": len(session_reps),
+                                             "similarity": round(final_avg, 2), "report": report,
+                                             "device": stats.get("device")}, None))
+    else:
+        print(">>> 유효한 운동 회차가 없어 유사도를 정산할 수 없습니다.")
+
+    print("="*50 + "\n")
+
+class SetFinalizer:
+    """Background stage for set reports: reference load, scoring, archive JSON and graph.
+
+    The ingest loop only snapshots the set (with the profile's reference) and enqueues it; a single worker thread
+    (matplotlib is not thread-safe) builds the reports in order and writes the results
+    into the dumbbell's stats (DumbbellSession.stats) when they are ready.
+    """
+
+    def __init__(self, stats):
+        self.stats = stats
+        self.jobs = queue.Queue()
+        self.worker = threading.Thread(target=self._run, daemon=True)
+        self.worker.start()
+
+    def submit(self, snap):
+        self.jobs.put(snap)
+        self.stats["pending_reports"] = self.jobs.qsize()
+        print(f">>> Set #{snap.set_num} report queued ({self.jobs.qsize()} pending)")
+
+    def wait(self):
+        """Block until every queued report is done (shutdown / offline use)"""
+        self.jobs.join()
+
+    def _run(self):
+        while True:
+            snap = self.jobs.get()
+            done = False
+            try:
+                ref_data = snap.ref_data
+                if ref_data is None:
+                    if not os.path.exists(REFERENCE_FILE):
+                        print(f"[WARNING] 전문가 데이터가 없어 세트 #{snap.set_num} 정산을 건너뜁니다.")
+                        done = True
+                        continue
+                    with open(REFERENCE_FILE, "r") as f:
+                        ref_data = json.load(f)
+                finalize_set(snap, ref_data, snap.stats if snap.stats is not None else self.stats)
+                done = True
+            except Exception as e:
+                print(f"[ERROR] Finalization failed: {e}")
+            finally:
+                # 정산이 끝나면 저널 삭제, 실패하면 남겨 두어 다음 시작 시 복구 (파일 처리는 JournalFlusher 스레드)
+                if snap.journal is not None:
+                    snap.journal.finish(keep=not done)
+                self.jobs.task_done()
+                self.stats["pending_reports"] = self.jobs.qsize()
@@ -0,0 +1,126 @@
+import hashlib
+import os
+import re
+import threading
+import time
+
+from PIL import Image, features
+
+from config import GRAPH_DIR, GRAPH_DIR_MAX_BYTES, THUMB_WIDTHS
+
+THUMB_DIR = os.path.join(GRAPH_DIR, "thumbs")
+# set_<n>_<YYYYmmdd_HHMMSS>.png: 한 번 저장되면 내용이 바뀌지 않는 파일 (expert/calibration 그래프는 덮어씀)
+TIMESTAMPED = re.compile(r"_\d{8}_\d{6}\.png$")
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE = "no-cache"
+
+_lock = threading.Lock()
+_etags = {}  # path -> ((mtime_ns, size), etag)
+
+def is_immutable(filename):
+    return bool(TIMESTAMPED.search(filename))
+
+def cache_control(filename):
+    """Long-lived immutable caching for timestamped reports, ETag revalidation for overwritten graphs"""
+    return IMMUTABLE_CACHE if is_immutable(filename) else REVALIDATE_CACHE
+
+def etag_for(path):
+    """Strong ETag from the file content (cached per mtime/size)"""
+    st = os.stat(path)
+    key = (st.st_mtime_ns, st.st_size)
+    cached = _etags.get(path)
+    if cached and cached[0] == key:
+        return cached[1]
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            h.update(chunk)
+    etag = h.hexdigest()[:20]
+    _etags[path] = (key, etag)
+    return etag
+
+def touch(path):
+    """Record a use for LRU retention (explicit atime, so relatime/noatime mounts don't matter)"""
+    try:
+        st = os.stat(path)
+        os.utime(path, ns=(time.time_ns(), st.st_mtime_ns))
+    except OSError:
+        pass
+
+def snap_width(width):
+    """Nearest configured thumbnail width at or above the request (None = full size)"""
+    for w in THUMB_WIDTHS:
+        if width <= w:
+            return w
+    return None
+
+def thumbnail(filename, width, webp=False):
+    """Path of a cached thumbnail, generated on first request (None if the original is missing)"""
+    src = os.path.join(GRAPH_DIR, filename)
+    if not os.path.isfile(src):
+        return None
+    ext = "webp" if webp and features.check("webp") else "png"
+    stem = os.path.splitext(filename)[0]
+    dst = os.path.join(THUMB_DIR, f"{stem}_w{width}.{ext}")
+    with _lock:
+        # 원본이 덮어써졌으면 (expert/calibration) 썸네일도 다시 생성
+        if not os.path.exists(dst) or os.path.getmtime(dst) < os.path.getmtime(src):
+            os.makedirs(THUMB_DIR, exist_ok=True)
+            with Image.open(src) as img:
+                img.thumbnail((width, width * img.height // img.width), Image.LANCZOS)
+                tmp = dst + ".tmp"
+                if ext == "webp":
+                    img.save(tmp, "WEBP", quality=80, method=4)
+                else:
+                    img.save(tmp, "PNG", optimize=True)
+                os.replace(tmp, dst)
+    enforce_retention()
+    return dst
+
+def _files():
+    for root in (GRAPH_DIR, THUMB_DIR):
+        if not os.path.isdir(root):
+            continue
+        for name in os.listdir(root):
+            path = os.path.join(root, name)
+            if os.path.isfile(path):
+                yield name, path
+
+def enforce_retention(max_bytes=GRAPH_DIR_MAX_BYTES):
+    """Delete least recently used set graphs (and thumbnails) until graph/ fits in max_bytes.
+
+    Overwritten live graphs (expert, calibration) are never evicted; when a set graph
+    goes, its thumbnails go with it.
+    """
+    with _lock:
+        entries = []
+        total = 0
+        for name, path in _files():
+            st = os.stat(path)
+            total += st.st_size
+            if is_immutable(name) or path.startswith(THUMB_DIR):
+                entries.append((st.st_atime, st.st_size, name, path))
+        if total <= max_bytes:
+            return 0
+        removed = set()
+        for _, size, name, path in sorted(entries):
+            if total <= max_bytes:
+                break
+            if path in removed:
+                continue
+            victims = [(path, size)]
+            if not path.startswith(THUMB_DIR):
+                stem = os.path.splitext(name)[0] + "_w"
+                victims += [(p, os.path.getsize(p)) for n, p in _files() if p.startswith(THUMB_DIR) and n.startswith(stem)]
+            for victim, victim_size in victims:
+                if victim in removed:
+                    continue
+                try:
+                    os.remove(victim)
+                except OSError:
+                    continue
+                _etags.pop(victim, None)
+                total -= victim_size
+                removed.add(victim)
+        print(f">>> [GRAPH] Retention: removed {len(removed)} files ({total / 1e6:.1f} MB kept)")
+        return len(removed)
@@ -0,0 +1,196 @@
+import collections
+import itertools
+import socket
+import threading
+import time
+from collections import namedtuple
+
+from config import HOST, PORT, INGEST_RX_TIMEOUT, BUS_QUEUE_SIZE
+
+# kind: "connect" | "disconnect" | "hello" | "env" | "summary" | "sample" | "line"
+#       (+ "rep" | "set_end" | "set" published by the counting engine / finalizer)
+# source: Connection, data: parsed payload, line: raw text line (None for connect/disconnect)
+Event = namedtuple("Event", ["kind", "source", "data", "line"])
+# 장치 연결에서 나오는 이벤트 (카운팅 엔진 등은 이것만 구독; 엔진이 발행하는 rep/set 이벤트와 구분)
+INGEST_KINDS = ("connect", "disconnect", "hello", "env", "summary", "sample", "line")
+
+def parse_line(line):
+    """(kind, data) for one protocol line"""
+    if line.startswith("HELLO:"):
+        return "hello", line[6:].strip()
+    try:
+        if line.startswith("ENV:"):
+            return "env", tuple(float(v) for v in line[4:].split(","))
+        if line.startswith("SUM:"):
+            return "summary", tuple(int(v) for v in line[4:].split(","))
+        parts = line.split(",")
+        # ax,ay,az[,gx,gy,gz[,btn]] (목업/구형 송신기는 열이 적을 수 있음)
+        if len(parts) >= 3:
+            return "sample", tuple(int(v) for v in parts[:7])
+    except ValueError:
+        pass
+    return "line", line
+
+class Subscription:
+    """Bounded event queue for one subscriber; when full the oldest event is dropped"""
+
+    def __init__(self, bus, name, maxsize, kinds=None):
+        self.bus = bus
+        self.name = name
+        self.kinds = frozenset(kinds) if kinds else None
+        self.queue = collections.deque(maxlen=maxsize)
+        self.cond = threading.Condition()
+        self.dropped = 0
+
+    def put(self, event):
+        with self.cond:
+            if len(self.queue) == self.queue.maxlen:
+                self.dropped += 1
+            self.queue.append(event)
+            self.cond.notify()
+
+    def get(self, timeout=None):
+        """Next event, or None on timeout"""
+        with self.cond:
+            if not self.queue and not self.cond.wait_for(lambda: self.queue, timeout):
+                return None
+            return self.queue.popleft()
+
+    def drain(self):
+        """All pending events at once (for consumers that work in frames)"""
+        with self.cond:
+            events = list(self.queue)
+            self.queue.clear()
+        return events
+
+    def close(self):
+        self.bus.unsubscribe(self)
+
+class FanoutBus:
+    """In-process fan-out of ingest events to any number of subscribers.
+
+    Each subscriber has its own bounded queue, so a slow consumer (a plot window, a
+    stalled browser) only loses its own oldest events and never blocks the socket
+    threads or the counting engine.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscribers = ()
+
+    def subscribe(self, name, maxsize=BUS_QUEUE_SIZE, kinds=None):
+        sub = Subscription(self, name, maxsize, kinds)
+        with self.lock:
+            self.subscribers = self.subscribers + (sub,)
+        return sub
+
+    def unsubscribe(self, sub):
+        with self.lock:
+            self.subscribers = tuple(s for s in self.subscribers if s is not sub)
+
+    def publish(self, event):
+        # 구독자 목록은 교체만 되므로 잠금 없이 현재 스냅샷을 순회
+        for sub in self.subscribers:
+            if sub.kinds is None or event.kind in sub.kinds:
+                sub.put(event)
+
+_bus = FanoutBus()
+
+def get_bus():
+    """Process-wide bus shared by the ingest server and all subscribers"""
+    return _bus
+
+class Connection:
+    """One device connection owned by the ingest server (consumers may reply or close it)"""
+
+    _ids = itertools.count(1)
+
+    def __init__(self, sock, addr):
+        self.id = next(self._ids)
+        self.sock = sock
+        self.addr = addr
+        self.rx_timeout = INGEST_RX_TIMEOUT  # 소비자가 기기 역할에 맞게 조정
+        self.closed = False
+        self.send_lock = threading.Lock()
+
+    def sendall(self, data):
+        with self.send_lock:
+            self.sock.sendall(data)
+
+    def close(self):
+        self.closed = True
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except: pass
+        self.sock.close()
+
+class IngestServer:
+    """Owns the device listening socket; reads, splits and parses lines and publishes them on the bus"""
+
+    def __init__(self, bus=None, host=HOST, port=PORT, configure=None):
+        self.bus = bus or get_bus()
+        self.host = host
+        self.port = port
+        self.configure = configure  # accept된 소켓 옵션 설정 (예: session.configure_socket)
+        self.running = False
+
+    def start(self):
+        """Bind and accept in a background thread (raises if the port is taken)"""
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind((self.host, self.port))
+        self.sock.listen(5)
+        self.running = True
+        threading.Thread(target=self._accept_loop, daemon=True).start()
+        print(f">>> Ingest listening on {self.host}:{self.port}")
+
+    def stop(self):
+        self.running = False
+        self.sock.close()
+
+    def _accept_loop(self):
+        while self.running:
+            try:
+                sock, addr = self.sock.accept()
+            except OSError:
+                if self.running:
+                    time.sleep(0.1)
+                continue
+            if self.configure:
+                self.configure(sock)
+            conn = Connection(sock, addr)
+            threading.Thread(target=self._read_loop, args=(conn,), daemon=True).start()
+
+    def _read_loop(self, conn):
+        publish = self.bus.publish
+        publish(Event("connect", conn, None, None))
+        raw_buf = b""
+        conn.sock.settimeout(1.0)
+        last_rx = time.time()
+        try:
+            while not conn.closed:
+                try:
+                    data = conn.sock.recv(4096)
+                    if not data:
+                        break
+                    last_rx = time.time()
+                    raw_buf += data
+                except socket.timeout:
+                    if time.time() - last_rx > conn.rx_timeout:
+                        print(f">>> No data timeout: {conn.addr}")
+                        break
+                    continue
+                except OSError as e:
+                    if not conn.closed:
+                        print(f">>> Recv error: {e}")
+                    break
+
+                while b"\n" in raw_buf:
+                    line_bytes, raw_buf = raw_buf.split(b"\n", 1)
+                    line = line_bytes.decode(errors="ignore").strip()
+                    if not line: continue
+                    kind, parsed = parse_line(line)
+                    publish(Event(kind, conn, parsed, line))
+        finally:
+            conn.close()
+            publish(Event("disconnect", conn, None, None))
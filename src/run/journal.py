@@ -0,0 +1,204 @@
+import array
+import json
+import os
+import re
+import struct
+import threading
+import time
+import zlib
+from datetime import datetime
+
+import numpy as np
+
+from config import CHANNELS, JOURNAL_DIR, JOURNAL_FSYNC_INTERVAL
+from analysis import RepFeatures, save_set_to_json
+
+# 레코드: [종류 1B][길이 4B][CRC32 4B][payload] (끝이 잘린/깨진 레코드부터는 복구에서 버림)
+RECORD = struct.Struct("<cII")
+HEADER, SAMPLES, EVENT = b"H", b"S", b"E"
+SUFFIX = ".wal"
+
+def _record(kind, payload):
+    return RECORD.pack(kind, len(payload), zlib.crc32(payload)) + payload
+
+class SetJournal:
+    """Append-only write-ahead log of one in-progress set (raw samples and rep events).
+
+    The ingest loop only appends the parsed sample tuples to a list (no lock, no
+    copy); JournalFlusher writes everything past the last flushed index as one record
+    per interval and fsyncs, so a crash loses at most the last JOURNAL_FSYNC_INTERVAL
+    seconds of the set. All file work happens on the flusher thread, including removing
+    the file once SetFinalizer has archived the set (finish()).
+    """
+
+    def __init__(self, path, header):
+        self.path = path
+        self.header = header
+        self.rows = []        # (ax, ay, az, gx, gy, gz[, btn]) 튜플, 세트가 끝날 때까지 늘어나기만 함
+        self.events = []
+        self.flushed_rows = 0
+        self.flushed_events = 0
+        self.io_lock = threading.Lock()  # 파일 쓰기 (flusher <-> 종료 처리)
+        self.file = None      # 첫 flush에서 생성 (ingest 스레드에서 파일을 열지 않음)
+        self.closed = False
+        self.finished = False # 세트 정산 완료: 다음 flush 주기에 닫음
+        self.keep = False     # 정산 실패 시 파일을 남겨 다음 시작 시 복구
+
+    def append(self, values):
+        """Parsed sample of the set (the first len(CHANNELS) values are stored)"""
+        self.rows.append(values)
+
+    def event(self, kind, **data):
+        """Set event (movement offset, analyzed rep) to replay on recovery"""
+        self.events.append({"e": kind, **data})
+
+    def flush(self):
+        """Write the samples/events appended since the last flush and fsync (flusher thread / close)"""
+        with self.io_lock:
+            if self.closed:
+                return
+            # 리스트는 append만 되므로 길이를 먼저 읽으면 그 앞부분은 다른 스레드와 무관하게 고정
+            n_rows, n_events = len(self.rows), len(self.events)
+            if self.file is None:
+                self.file = open(self.path, "wb")
+                self.file.write(_record(HEADER, json.dumps(self.header).encode()))
+            if n_rows > self.flushed_rows:
+                rows = np.asarray(self.rows[self.flushed_rows:n_rows], dtype="<i4")[:, :len(CHANNELS)]
+                self.file.write(_record(SAMPLES, rows.tobytes()))
+                self.flushed_rows = n_rows
+            for ev in self.events[self.flushed_events:n_events]:
+                self.file.write(_record(EVENT, json.dumps(ev, default=float).encode()))
+            self.flushed_events = n_events
+            self.file.flush()
+            os.fsync(self.file.fileno())
+
+    def finish(self, keep=False):
+        """Set finalized: the flusher removes the file (or, with keep, closes it for recovery)"""
+        self.keep = keep
+        self.finished = True
+
+    def close(self):
+        """Final flush; the file stays on disk for startup recovery"""
+        self.flush()
+        with self.io_lock:
+            if self.file is not None:
+                self.file.close()
+            self.closed = True
+
+    def discard(self):
+        """The set is archived: the journal is no longer needed (nothing left to write)"""
+        with self.io_lock:
+            if self.file is not None:
+                self.file.close()
+            self.closed = True
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+class JournalFlusher:
+    """Opens per-set journals and flushes all open ones every JOURNAL_FSYNC_INTERVAL on one thread"""
+
+    def __init__(self, journal_dir=JOURNAL_DIR, interval=JOURNAL_FSYNC_INTERVAL):
+        self.journal_dir = journal_dir
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.journals = set()
+        os.makedirs(journal_dir, exist_ok=True)
+        self.worker = threading.Thread(target=self._run, daemon=True)
+        self.worker.start()
+
+    def open(self, device_id, profile, set_num, reps_dir, motion_baseline=None):
+        ts = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+        name = re.sub(r"[^A-Za-z0-9_.-]", "_", f"{device_id}_set{set_num}_{ts}")
+        header = {"device": device_id, "profile": profile, "set_num": set_num, "reps_dir": reps_dir,
+                  "motion_baseline": motion_baseline, "started": ts}
+        journal = SetJournal(os.path.join(self.journal_dir, name + SUFFIX), header)
+        with self.lock:
+            self.journals.add(journal)
+        return journal
+
+    def close_all(self):
+        """Shutdown: flush every unfinished set so the next start can recover it"""
+        with self.lock:
+            journals, self.journals = list(self.journals), set()
+        # 이미 아카이브됐지만 아직 flush 주기가 오지 않아 남아 있는 저널은 복구 대상이 아님 (중복 아카이브 방지)
+        kept = [journal for journal in journals if not journal.finished or journal.keep]
+        for journal in journals:
+            if journal in kept:
+                journal.close()
+            else:
+                journal.discard()
+        if kept:
+            print(f">>> [JOURNAL] {len(kept)} unfinished set(s) kept for recovery")
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            with self.lock:
+                journals = list(self.journals)
+            for journal in journals:
+                try:
+                    if not journal.finished:
+                        journal.flush()
+                    elif journal.keep:
+                        journal.close()
+                    else:
+                        journal.discard()
+                except Exception as e:
+                    print(f"[ERROR] Journal flush failed ({journal.path}): {e}")
+                if journal.closed:
+                    with self.lock:
+                        self.journals.discard(journal)
+
+def read_journal(path):
+    """(header, set_data, events) from a journal, up to the first torn or corrupt record"""
+    with open(path, "rb") as f:
+        buf = f.read()
+    header, rows, events = None, array.array("i"), []
+    pos = 0
+    while pos + RECORD.size <= len(buf):
+        kind, length, crc = RECORD.unpack_from(buf, pos)
+        payload = buf[pos + RECORD.size:pos + RECORD.size + length]
+        if len(payload) < length or zlib.crc32(payload) != crc:
+            break
+        pos += RECORD.size + length
+        if kind == HEADER:
+            header = json.loads(payload)
+        elif kind == SAMPLES:
+            rows.frombytes(payload)
+        elif kind == EVENT:
+            events.append(json.loads(payload))
+    n = len(CHANNELS)
+    set_data = {ch: rows[i::n].tolist() for i, ch in enumerate(CHANNELS)}
+    return header, set_data, events
+
+def recover_journals(journal_dir=JOURNAL_DIR):
+    """Archive the sets that were still open when the server stopped (startup, before ingest)"""
+    if not os.path.isdir(journal_dir):
+        return []
+    archived = []
+    for name in sorted(os.listdir(journal_dir)):
+        if not name.endswith(SUFFIX):
+            continue
+        path = os.path.join(journal_dir, name)
+        try:
+            header, set_data, events = read_journal(path)
+            if header is None:
+                raise ValueError("missing header record")
+            offsets = [ev["offset"] for ev in events if ev["e"] == "offset"]
+            features = [RepFeatures(**ev["features"]) for ev in events if ev["e"] == "rep"]
+            avg = sum(f.similarity for f in features) / len(features) if features else 0
+            fname = None
+            if set_data["ax"]:
+                fname = save_set_to_json(set_data, header["set_num"], avg, header["reps_dir"], offsets,
+                                         header["motion_baseline"], features)
+                archived.append(f"{header['profile']}/{fname}")
+            print(f">>> [JOURNAL] Recovered set #{header['set_num']} of {header['device']} ({header['profile']}): "
+                  f"{len(set_data['ax'])} samples, {len(features)} reps" + ("" if fname else " (empty, dropped)"))
+            os.remove(path)
+        except Exception as e:
+            # 읽을 수 없는 저널은 매 시작마다 다시 시도하지 않도록 옆으로 치워 둠
+            print(f"[ERROR] Journal recovery failed ({name}): {e}")
+            os.replace(path, path + ".bad")
+    return archived
@@ -0,0 +1,120 @@
+import argparse
+import contextlib
+import json
+import os
+import shutil
+import socket
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+import config
+from config import CHANNELS, EXPERT_TAKES, JOURNAL_FSYNC_INTERVAL
+from ingest import Connection, Event, parse_line
+from journal import JournalFlusher, read_journal, recover_journals
+import profiles
+import visualizer
+from state import AppState
+from device_handler import DeviceHandler
+import workout_synth
+
+BENCH_PROFILE = "journal_bench"  # 임시 폴더에 만드는 전용 프로필 (보정 + 전문가 동작부터 기록)
+
+def synthetic_events(args):
+    """Parsed sample events of a synthetic workout (same generator as workout_synth.py)"""
+    synth = argparse.Namespace(rate=config.SAMPLE_RATE_HZ, expert_reps=EXPERT_TAKES, sets=args.sets, reps="8-12",
+                               tempo="1.8-2.4", amplitude="1.3-1.5", rest="0.9-1.6", set_rest=4.0, noise=60.0,
+                               glitch_rate=0.001, form_error_rate=0.1, radius=0.3, profile=BENCH_PROFILE)
+    stream = workout_synth.synthesize_device("bench", np.random.default_rng(args.seed), synth)
+    lines = [",".join(map(str, row)) for row in stream.rows.tolist()]
+    return [(line, parse_line(line)) for line in lines]
+
+def run(app_state, events, journals, stop_at=None):
+    """Feed the events through a fresh DeviceHandler; returns ((wall, ingest thread CPU) seconds, handler)"""
+    app_state.journals = journals
+    app_state.sessions.sessions.clear()
+    sock, peer = socket.socketpair()
+    handler = DeviceHandler(Connection(sock, ("bench", 0)))
+    handler._attach_session("bench")
+    batch = [Event(kind, handler.conn, data, line) for line, (kind, data) in events[:stop_at]]
+    t0, cpu0 = time.perf_counter(), time.thread_time()
+    for ev in batch:
+        handler.handle(ev)
+    # CPU 시간은 GIL 대기(백그라운드 스레드의 파일 처리)를 빼고 엔진 스레드 자체 비용만 측정
+    elapsed = (time.perf_counter() - t0, time.thread_time() - cpu0)
+    peer.close()
+    return elapsed, handler
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingest throughput with and without the set journal, and crash recovery check")
+    parser.add_argument("--sets", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=7, help="Alternating runs per mode (median is reported)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    config.SAMPLE_CLOCK = True  # 데이터 시간 기준 정지 판정 (최대 속도로 재생)
+    events = synthetic_events(args)
+    n = len(events)
+    tmp = tempfile.mkdtemp(prefix="journal_bench_")
+    # 보정/전문가 동작 저장이 실제 프로필과 graph/를 덮어쓰지 않도록 임시 폴더로 돌림
+    profiles.PROFILES_DIR = os.path.join(tmp, "profiles")
+    visualizer.GRAPH_DIR = os.path.join(tmp, "graph")
+    os.makedirs(visualizer.GRAPH_DIR)
+    app_state = AppState.get_instance()
+    app_state.stats["profile"] = BENCH_PROFILE
+    journal_dir = os.path.join(tmp, "journal")
+    flusher = JournalFlusher(journal_dir)
+
+    times = {"off": [], "on": []}
+    real_stdout = sys.stdout
+    try:
+        # 엔진의 [RAW_SIGNAL] 출력은 양쪽 모두 같은 비용으로 버림
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            # 첫 재생은 측정하지 않음: 보정 후 전문가 동작(EXPERT_TAKES회)으로 Reference를 기록해 이후 회차가 카운트되게 함
+            run(app_state, events, None)
+            app_state.finalizer.wait()
+            for _ in range(args.repeat):
+                for mode, journals in (("off", None), ("on", flusher)):
+                    times[mode].append(run(app_state, events, journals)[0])
+                    app_state.finalizer.wait()
+
+            # 마지막 세트 도중 "비정상 종료": 저널에 남은 샘플이 메모리의 세트 버퍼와 같은지 확인
+            _, handler = run(app_state, events, flusher, stop_at=n - int(8 * config.SAMPLE_RATE_HZ))
+            app_state.finalizer.wait()
+            session = handler.session
+            flusher.close_all()
+            header, set_data, journal_events = read_journal(session.journal.path)
+            # 시작 시 복구 경로 그대로: 저널의 샘플/구간/회차 특징으로 세트 아카이브 생성
+            recovered = recover_journals(journal_dir)
+            with open(os.path.join(session.profile.reps_dir, recovered[-1].split("/", 1)[1])) as f:
+                archive = json.load(f)
+    finally:
+        sys.stdout = real_stdout
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    # 실행마다 편차가 커서(백그라운드 flush/fsync, 캐시) 최선값 대신 중앙값과 번갈아 잰 쌍별 오버헤드 범위를 보고
+    med = {mode: (np.median([t[0] for t in runs]), np.median([t[1] for t in runs])) for mode, runs in times.items()}
+    pair = {k: [(on[k] - off[k]) / off[k] * 100 for off, on in zip(times["off"], times["on"])] for k in (0, 1)}
+    print(f"\n {n:,} samples, {args.sets} sets | fsync every {JOURNAL_FSYNC_INTERVAL}s | median of {args.repeat}")
+    print(f" {'journal':8s} | {'samples/s':>10s} | {'wall us/sample':>14s} | {'cpu us/sample':>13s}")
+    print("-" * 56)
+    for mode, (wall, cpu) in med.items():
+        print(f" {mode:8s} | {n / wall:10,.0f} | {wall * 1e6 / n:14.2f} | {cpu * 1e6 / n:13.2f}")
+    print(" overhead (median, min..max over runs): " + ", ".join(
+        f"{name} {np.median(pair[k]):+.1f}% ({min(pair[k]):+.1f}..{max(pair[k]):+.1f}%)"
+        for k, name in ((0, "wall"), (1, "cpu"))))
+    same = all(list(map(int, session.set_raw_buffer[ch])) == set_data[ch] for ch in CHANNELS)
+    offsets = [ev["offset"] for ev in journal_events if ev["e"] == "offset"]
+    reps = sum(ev["e"] == "rep" for ev in journal_events)
+    print(f" journal: set #{header['set_num']} {len(set_data['ax'])} samples ({'identical' if same else 'MISMATCH'}), "
+          f"offsets {'match' if offsets == session.movement_offsets else 'MISMATCH'}, "
+          f"{reps}/{len(session.rep_features)} reps")
+    restored = [f._asdict() for f in session.rep_features]
+    print(f" recovery: {len(recovered)} set(s) archived, {len(archive['data']['ax'])} samples, {len(archive['rep_features'])} reps "
+          f"({'identical' if json.loads(json.dumps(restored, default=float)) == archive['rep_features'] else 'MISMATCH'} "
+          f"features)")
+
+if __name__ == "__main__":
+    main()
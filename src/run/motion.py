@@ -0,0 +1,156 @@
+import math
+import numpy as np
+from config import (ACC_LSB_PER_G, GYRO_LSB_PER_DPS, DEG2RAD, COMPLEMENTARY_ALPHA, MOTION_STILL_GYRO_DPS,
+                    MOTION_STILL_ACC_TOL, SAMPLE_RATE_HZ, ACCEL_AXES, GYRO_AXES, MOTION_PIPELINE)
+
+BATCH_BLOCK = 256  # Block length for the closed-form complementary filter in linear_acceleration_batch
+
+def detection_setup(baseline, pipeline=MOTION_PIPELINE):
+    """(MotionPipeline or None, baseline used for detection) for the given pipeline name"""
+    if pipeline == "LINEAR":
+        motion = MotionPipeline(baseline)
+        return motion, motion.detection_baseline()
+    return None, baseline
+
+def _wrap(angle):
+    return (angle + math.pi) % (2 * math.pi) - math.pi
+
+class MotionPipeline:
+    """Gravity-compensated motion stage (ported from the legacy backup server).
+
+    Gyro bias and the initial roll/pitch come from the calibration baseline. Each sample
+    updates orientation with a complementary filter (gyro integration corrected by the
+    accel tilt), the gravity vector for that orientation is subtracted, and the linear
+    acceleration is returned in raw accel counts so the existing thresholds still apply.
+    During a rep the accel tilt also carries the motion itself, so the filter drifts toward
+    it; on a still sample (no rotation, |a| = 1g) the accel is pure gravity and the
+    orientation snaps to its tilt, so the rest after a rep reads as zero right away.
+    """
+
+    def __init__(self, baseline, alpha=COMPLEMENTARY_ALPHA, dt=1.0 / SAMPLE_RATE_HZ):
+        self.baseline = baseline
+        self.alpha = alpha
+        self.dt = dt
+        self.bias = {axis: baseline.get(axis, 0.0) for axis in GYRO_AXES}
+        bx, by, bz = baseline["ax"], baseline["ay"], baseline["az"]
+        # 정지 상태 가속도 크기를 1g로 사용 (DMP 가속도 스케일과 무관하게 동작)
+        self.g_counts = math.sqrt(bx * bx + by * by + bz * bz) or ACC_LSB_PER_G
+        self.roll = math.atan2(by, bz)
+        self.pitch = math.atan2(-bx, math.sqrt(by * by + bz * bz))
+        self.rad_per_count = DEG2RAD / GYRO_LSB_PER_DPS
+        # 정지 판정 임계치 (제곱끼리 비교해 샘플마다 sqrt를 피함)
+        self.still_gyro_sq = (MOTION_STILL_GYRO_DPS * GYRO_LSB_PER_DPS) ** 2
+        self.still_acc_sq = ((self.g_counts * (1 - MOTION_STILL_ACC_TOL)) ** 2,
+                             (self.g_counts * (1 + MOTION_STILL_ACC_TOL)) ** 2)
+        self.still_step_sq = (self.g_counts * MOTION_STILL_ACC_TOL) ** 2
+        self.prev_acc = (bx, by, bz)
+        self.was_still = True
+
+    def detection_baseline(self):
+        """Baseline for linear acceleration: zero mean, same measured noise"""
+        baseline = {axis: 0.0 for axis in ACCEL_AXES + GYRO_AXES}
+        if "std" in self.baseline:
+            baseline["std"] = dict(self.baseline["std"])
+        return baseline
+
+    def process(self, sample):
+        """Raw sample dict -> linear accel (counts) and bias-corrected gyro (counts)"""
+        ax, ay, az = sample["ax"], sample["ay"], sample["az"]
+        gx = sample["gx"] - self.bias["gx"]
+        gy = sample["gy"] - self.bias["gy"]
+        gz = sample["gz"] - self.bias["gz"]
+
+        roll_acc = math.atan2(ay, az)
+        pitch_acc = math.atan2(-ax, math.sqrt(ay * ay + az * az))
+        acc_sq = ax * ax + ay * ay + az * az
+        px, py, pz = self.prev_acc
+        step_sq = (ax - px) ** 2 + (ay - py) ** 2 + (az - pz) ** 2
+        self.prev_acc = (ax, ay, az)
+        # 정지 판정: 회전 없음 + |a| = 1g. 정지 중 가속도만 튀면 움직임 시작(접선 가속도)이라 정지로 보지 않음
+        still = (gx * gx + gy * gy + gz * gz < self.still_gyro_sq
+                 and self.still_acc_sq[0] < acc_sq < self.still_acc_sq[1]
+                 and (step_sq < self.still_step_sq or not self.was_still))
+        self.was_still = still
+        if still:
+            # 정지 샘플: 가속도 = 중력이므로 회차 중 쌓인 자세 오차를 버리고 기울기에 바로 맞춤
+            roll, pitch = roll_acc, pitch_acc
+        else:
+            # 상보 필터: 자이로 적분 + 가속도 기울기로 보정 (각도 경계 ±π 처리)
+            k = 1.0 - self.alpha
+            roll = self.roll + gx * self.rad_per_count * self.dt
+            pitch = self.pitch + gy * self.rad_per_count * self.dt
+            roll += k * _wrap(roll_acc - roll)
+            pitch += k * _wrap(pitch_acc - pitch)
+        self.roll, self.pitch = roll, pitch
+
+        # 센서 좌표계에서의 중력 벡터 제거
+        sr, cr = math.sin(roll), math.cos(roll)
+        sp, cp = math.sin(pitch), math.cos(pitch)
+        g = self.g_counts
+        return {
+            "ax": ax + g * sp,
+            "ay": ay - g * sr * cp,
+            "az": az - g * cr * cp,
+            "gx": gx, "gy": gy, "gz": gz,
+        }
+
+def _complementary_batch(gyro_step, acc_angle, alpha, initial, still):
+    """Complementary filter over a recording: still samples take acc_angle, runs in between are a linear recursion"""
+    out = acc_angle.copy()
+    # 움직이는 구간(연속된 비정지 샘플)마다 직전 값(정지 샘플의 기울기 또는 초기 자세)에서 다시 시작
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], ~still, [0])).astype(np.int8)))
+    for start, end in zip(edges[::2], edges[1::2]):
+        prev = out[start - 1] if start > 0 else initial
+        out[start:end] = _complementary_run(gyro_step[start:end], acc_angle[start:end], alpha, prev)
+    return out
+
+def _complementary_run(gyro_step, acc_angle, alpha, initial):
+    """y[i] = alpha * (y[i-1] + gyro_step[i]) + (1 - alpha) * acc_angle[i], evaluated block-wise"""
+    u = alpha * gyro_step + (1 - alpha) * acc_angle
+    out = np.empty_like(u)
+    prev = initial
+    for s in range(0, len(u), BATCH_BLOCK):
+        block = u[s:s + BATCH_BLOCK]
+        n = len(block)
+        powers = alpha ** np.arange(1, n + 1)
+        # y_i = alpha^(i+1) * prev + sum_j alpha^(i-j) * u_j
+        out[s:s + n] = powers * prev + np.cumsum(block / powers * alpha) * powers / alpha
+        prev = out[s + n - 1]
+    return out
+
+def linear_acceleration_batch(set_data, baseline, alpha=COMPLEMENTARY_ALPHA, dt=1.0 / SAMPLE_RATE_HZ):
+    """Vectorized MotionPipeline over a whole recording (offline rescoring / plotting).
+
+    Accel tilt angles are unwrapped first so the filter becomes a linear recursion and
+    can be evaluated with cumulative sums instead of a per-sample loop. Matches the live
+    stage as long as the accel tilt stays within ±π of the filtered angle.
+    """
+    pipe = MotionPipeline(baseline, alpha, dt)
+    ax, ay, az = (np.asarray(set_data[axis], dtype=float) for axis in ACCEL_AXES)
+    gyro = {axis: np.asarray(set_data.get(axis) or np.zeros(len(ax)), dtype=float) - pipe.bias[axis]
+            for axis in GYRO_AXES}
+    if len(ax) == 0:
+        return {axis: [] for axis in ACCEL_AXES + GYRO_AXES}
+
+    roll_acc = np.unwrap(np.concatenate(([pipe.roll], np.arctan2(ay, az))))[1:]
+    pitch_acc = np.unwrap(np.concatenate(([pipe.pitch], np.arctan2(-ax, np.sqrt(ay * ay + az * az)))))[1:]
+    acc_sq = ax * ax + ay * ay + az * az
+    step_sq = sum(np.diff(v, prepend=p) ** 2 for v, p in zip((ax, ay, az), pipe.prev_acc))
+    quiet = ((gyro["gx"] ** 2 + gyro["gy"] ** 2 + gyro["gz"] ** 2 < pipe.still_gyro_sq)
+             & (acc_sq > pipe.still_acc_sq[0]) & (acc_sq < pipe.still_acc_sq[1]))
+    steady = step_sq < pipe.still_step_sq
+    still = quiet & steady
+    # 가속도가 튄 샘플은 직전 샘플이 정지였으면 움직임 시작, 움직이던 중이었으면 회차 끝의 첫 정지 샘플
+    for i in np.flatnonzero(quiet & ~steady):
+        still[i] = not (still[i - 1] if i > 0 else pipe.was_still)
+    roll = _complementary_batch(gyro["gx"] * pipe.rad_per_count * dt, roll_acc, alpha, pipe.roll, still)
+    pitch = _complementary_batch(gyro["gy"] * pipe.rad_per_count * dt, pitch_acc, alpha, pipe.pitch, still)
+
+    g = pipe.g_counts
+    out = {
+        "ax": (ax + g * np.sin(pitch)).tolist(),
+        "ay": (ay - g * np.sin(roll) * np.cos(pitch)).tolist(),
+        "az": (az - g * np.cos(roll) * np.cos(pitch)).tolist(),
+    }
+    out.update({axis: gyro[axis].tolist() for axis in GYRO_AXES})
+    return out
@@ -0,0 +1,105 @@
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+
+from config import (CALIBRATION_FILE, REFERENCE_FILE, REPS_DIR, PROFILES_DIR, DEFAULT_PROFILE,
+                    PROFILE_CACHE_SIZE)
+from analysis import get_active_axes, get_expert_peak
+from motion import detection_setup
+
+PROFILE_NAME = re.compile(r"^[A-Za-z0-9_-]{1,32}$")
+
+def profile_paths(name):
+    """(calibration file, reference file, archive dir) for a profile"""
+    if name == DEFAULT_PROFILE:
+        # 기본 프로필은 기존 단일 사용자 경로 (기존 설치와 호환)
+        return CALIBRATION_FILE, REFERENCE_FILE, REPS_DIR
+    base = os.path.join(PROFILES_DIR, name)
+    return os.path.join(base, "baseline.json"), os.path.join(base, "reference_data.json"), os.path.join(base, "reps")
+
+def list_profiles():
+    names = {DEFAULT_PROFILE}
+    if os.path.isdir(PROFILES_DIR):
+        names.update(n for n in os.listdir(PROFILES_DIR)
+                     if PROFILE_NAME.match(n) and os.path.isdir(os.path.join(PROFILES_DIR, n)))
+    return sorted(names)
+
+class Profile:
+    """One user's baseline and expert reference, loaded and preprocessed once.
+
+    Holds the raw calibration baseline, the reference motion, and what the live
+    detector derives from them (active axes, expert peak), so switching to a cached
+    profile needs no disk reads or recomputation. Loaded data is treated as read-only;
+    sessions copy the baseline before tracking drift on it.
+    """
+
+    def __init__(self, name):
+        if not PROFILE_NAME.match(name):
+            raise ValueError(f"Invalid profile name: {name!r}")
+        self.name = name
+        self.calibration_file, self.reference_file, self.reps_dir = profile_paths(name)
+        os.makedirs(os.path.dirname(self.calibration_file), exist_ok=True)
+        self.baseline = None
+        self.ref_data = None
+        self.active_axes = ["ax", "ay", "az"]
+        self.expert_peak = 0.0
+        self.load()
+
+    @property
+    def pipeline(self):
+        # Reference가 기록된 파이프라인 (이전 Reference는 RAW)
+        return self.ref_data.get("pipeline", "RAW") if self.ref_data else None
+
+    def load(self):
+        if os.path.exists(self.calibration_file):
+            with open(self.calibration_file, "r") as f:
+                self.baseline = json.load(f)
+        if os.path.exists(self.reference_file):
+            with open(self.reference_file, "r") as f:
+                self.ref_data = json.load(f)
+        self._prepare()
+
+    def _prepare(self):
+        if self.baseline is None or self.ref_data is None:
+            return
+        _, det_baseline = detection_setup(self.baseline, self.pipeline)
+        self.active_axes = get_active_axes(self.ref_data, det_baseline)
+        self.expert_peak = get_expert_peak(self.ref_data, self.active_axes)
+
+    def save_baseline(self, baseline):
+        with open(self.calibration_file, "w") as f:
+            json.dump(baseline, f)
+        self.baseline = baseline
+        self._prepare()
+
+    def save_reference(self, ref_data):
+        with open(self.reference_file, "w") as f:
+            json.dump(ref_data, f)
+        self.ref_data = ref_data
+        self._prepare()
+
+class ProfileCache:
+    """LRU cache of loaded profiles (bounded by PROFILE_CACHE_SIZE)"""
+
+    def __init__(self, capacity=PROFILE_CACHE_SIZE):
+        self.capacity = capacity
+        self.lock = threading.Lock()
+        self.profiles = OrderedDict()
+
+    def get(self, name):
+        with self.lock:
+            profile = self.profiles.get(name)
+            if profile is not None:
+                self.profiles.move_to_end(name)
+                return profile
+        # 디스크 로드는 잠금 밖에서 (다른 프로필 조회를 막지 않도록)
+        profile = Profile(name)
+        with self.lock:
+            profile = self.profiles.setdefault(name, profile)
+            self.profiles.move_to_end(name)
+            while len(self.profiles) > self.capacity:
+                evicted, _ = self.profiles.popitem(last=False)
+                print(f">>> [PROFILE] '{evicted}' evicted from cache")
+        return profile
@@ -0,0 +1,138 @@
+import json
+import os
+import socket
+import threading
+
+import numpy as np
+
+from config import PUBLISH_QUEUE_SIZE, PUBLISH_SEND_TIMEOUT, PUBLISH_MAX_BATCH
+from ingest import get_bus
+from pubsub_client import (FRAME_HEADER, SAMPLE_HEADER, SAMPLE_COLUMNS, SAMPLE_DTYPE,
+                           TYPE_SAMPLES, TYPE_JSON, parse_address)
+
+# 외부 구독자에게 전달하는 이벤트 (raw "line"은 제외)
+PUBLISHED_KINDS = ("sample", "connect", "disconnect", "hello", "env", "summary", "rep", "set_end", "set")
+
+def encode_samples(conn_id, rows):
+    """One binary frame for a run of samples from the same connection"""
+    if all(len(row) == SAMPLE_COLUMNS for row in rows):
+        batch = np.array(rows, dtype=SAMPLE_DTYPE)
+    else:
+        # 열이 부족한 (목업/구형) 샘플은 0으로 채움
+        batch = np.zeros((len(rows), SAMPLE_COLUMNS), dtype=SAMPLE_DTYPE)
+        for i, row in enumerate(rows):
+            batch[i, :len(row)] = row
+    payload = SAMPLE_HEADER.pack(conn_id) + batch.tobytes()
+    return FRAME_HEADER.pack(len(payload) + 1, TYPE_SAMPLES) + payload
+
+def encode_json(obj):
+    payload = json.dumps(obj, separators=(",", ":")).encode("utf-8")
+    return FRAME_HEADER.pack(len(payload) + 1, TYPE_JSON) + payload
+
+def event_to_json(event):
+    """JSON body for a non-sample bus event"""
+    msg = {"event": event.kind}
+    if event.source is not None:
+        msg["conn"] = event.source.id
+    if event.kind == "connect":
+        msg["addr"] = event.source.addr[0] if event.source.addr else None
+    elif event.kind == "hello":
+        msg["device"] = event.data
+    elif event.kind in ("env", "summary"):
+        msg["values"] = list(event.data)
+    elif event.data is not None:
+        msg.update(event.data)
+    return msg
+
+class _Client:
+    """One external subscriber: its own bus queue and writer thread"""
+
+    def __init__(self, sock, name, bus):
+        self.sock = sock
+        self.name = name
+        self.sub = bus.subscribe(name, maxsize=PUBLISH_QUEUE_SIZE, kinds=PUBLISHED_KINDS)
+        self.reported_drops = 0
+        sock.settimeout(PUBLISH_SEND_TIMEOUT)
+
+    def run(self):
+        try:
+            while True:
+                first = self.sub.get(timeout=1.0)
+                if first is None:
+                    continue
+                self.sock.sendall(self._encode([first] + self.sub.drain()))
+        except OSError as e:
+            # 전송이 PUBLISH_SEND_TIMEOUT 이상 막히면 (소비자 정지) 구독자를 끊음
+            print(f">>> [PUBLISH] {self.name} disconnected ({e.__class__.__name__})")
+        finally:
+            self.sub.close()
+            self.sock.close()
+
+    def _encode(self, events):
+        frames = []
+        if self.sub.dropped > self.reported_drops:
+            self.reported_drops = self.sub.dropped
+            frames.append(encode_json({"event": "dropped", "count": self.sub.dropped}))
+        # 같은 연결에서 연속으로 들어온 샘플은 하나의 바이너리 배치로 묶음
+        run_conn, run = None, []
+        for ev in events:
+            if ev.kind == "sample" and ev.source.id == run_conn and len(run) < PUBLISH_MAX_BATCH:
+                run.append(ev.data)
+                continue
+            if run:
+                frames.append(encode_samples(run_conn, run))
+                run_conn, run = None, []
+            if ev.kind == "sample":
+                run_conn, run = ev.source.id, [ev.data]
+            else:
+                frames.append(encode_json(event_to_json(ev)))
+        if run:
+            frames.append(encode_samples(run_conn, run))
+        return b"".join(frames)
+
+class Publisher:
+    """Optional local pub/sub endpoint that re-publishes ingest samples and rep/set events.
+
+    Listens on "host:port" or "unix:/path". Every subscriber gets an independent bounded
+    bus queue (drop-oldest, reported with a "dropped" event) and its own writer thread, so
+    a slow or stalled consumer can only lose its own data and never blocks ingestion.
+    """
+
+    def __init__(self, address, bus=None):
+        self.address = address
+        self.bus = bus or get_bus()
+        self.running = False
+
+    def start(self):
+        family, target = parse_address(self.address)
+        if family == "unix":
+            if os.path.exists(target):
+                os.unlink(target)
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        else:
+            self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind(target)
+        if family == "tcp":
+            self.address = f"{target[0]}:{self.sock.getsockname()[1]}"  # 포트 0이면 실제 할당된 포트
+        self.sock.listen(8)
+        self.running = True
+        threading.Thread(target=self._accept_loop, daemon=True).start()
+        print(f">>> Publisher listening on {self.address}")
+
+    def stop(self):
+        self.running = False
+        self.sock.close()
+
+    def _accept_loop(self):
+        while self.running:
+            try:
+                sock, addr = self.sock.accept()
+            except OSError:
+                break
+            if sock.family == socket.AF_INET:
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            name = f"publish-{addr[0]}:{addr[1]}" if isinstance(addr, tuple) else "publish-unix"
+            print(f">>> [PUBLISH] Subscriber connected: {name}")
+            client = _Client(sock, name, self.bus)
+            threading.Thread(target=client.run, daemon=True).start()
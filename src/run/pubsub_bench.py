@@ -0,0 +1,86 @@
+import argparse
+import socket
+import threading
+import time
+from collections import namedtuple
+
+from ingest import Event, FanoutBus
+from publisher import Publisher
+from pubsub_client import Subscriber, connect
+
+# 벤치마크용 가짜 장치 연결 (Publisher는 id/addr만 사용)
+FakeConn = namedtuple("FakeConn", ["id", "addr"])
+
+def consume(address, result, ready):
+    """Fast subscriber: count samples/events until the end marker"""
+    samples = events = dropped = 0
+    with Subscriber(address) as sub:
+        ready.set()
+        t0 = None
+        for kind, msg in sub:
+            if t0 is None:
+                t0 = time.perf_counter()
+            if kind == "samples":
+                samples += len(msg[1])
+            else:
+                events += 1
+                if msg["event"] == "dropped":
+                    dropped = msg["count"]
+                elif msg["event"] == "set_end":
+                    break
+        result.update(samples=samples, events=events, dropped=dropped, elapsed=time.perf_counter() - (t0 or 0))
+
+def main():
+    parser = argparse.ArgumentParser(description="Publisher throughput test (in-process bus -> socket subscribers)")
+    parser.add_argument("--samples", type=int, default=500000)
+    parser.add_argument("--subscribers", type=int, default=2)
+    parser.add_argument("--stalled", type=int, default=1, help="Subscribers that connect but never read")
+    parser.add_argument("--devices", type=int, default=1, help="Interleaved source connections")
+    parser.add_argument("--address", default="127.0.0.1:0", help='"host:port" or "unix:/path"')
+    args = parser.parse_args()
+
+    bus = FanoutBus()
+    pub = Publisher(args.address, bus)
+    pub.start()
+
+    results = [{} for _ in range(args.subscribers)]
+    threads = []
+    for r in results:
+        ready = threading.Event()
+        t = threading.Thread(target=consume, args=(pub.address, r, ready), daemon=True)
+        t.start()
+        ready.wait()
+        threads.append(t)
+    stalled = [connect(pub.address) for _ in range(args.stalled)]
+    for s in stalled:
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+    time.sleep(0.2)  # 구독 등록 대기
+
+    conns = [FakeConn(i + 1, ("bench", i)) for i in range(args.devices)]
+    row = (120, -340, 16384, 12, -7, 3, 1)
+    t0 = time.perf_counter()
+    for i in range(args.samples):
+        bus.publish(Event("sample", conns[i % len(conns)], row, None))
+        if i % 1000 == 999:
+            bus.publish(Event("rep", conns[0], {"count": i // 1000 + 1}, None))
+    bus.publish(Event("set_end", conns[0], {"set": 1}, None))
+    publish_elapsed = time.perf_counter() - t0
+
+    for t in threads:
+        t.join(timeout=60)
+    print(f"\n Published {args.samples} samples in {publish_elapsed:.2f}s "
+          f"({args.samples / publish_elapsed:,.0f} samples/s on the ingest side)")
+    print(f" Subscribers: {args.subscribers} reading, {args.stalled} stalled, {args.devices} device(s)")
+    print("-" * 60)
+    for i, r in enumerate(results):
+        if not r:
+            print(f" Sub #{i + 1}: did not finish")
+            continue
+        rate = r["samples"] / r["elapsed"] if r["elapsed"] else 0
+        print(f" Sub #{i + 1}: {r['samples']:,} samples ({rate:,.0f}/s) | events {r['events']} | dropped {r['dropped']:,}")
+    for s in stalled:
+        s.close()
+    pub.stop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""Client for the dumbbell server's live publisher (publisher.py).
+
+Wire format, one frame per message:
+    uint32 big-endian length | 1 byte type | payload (length - 1 bytes)
+    type b"S": sample batch  -> uint32 LE connection id, then rows of 7 int32 LE (ax,ay,az,gx,gy,gz,btn)
+    type b"J": JSON event    -> UTF-8 object with an "event" key (connect, hello, rep, set_end, set, dropped, ...)
+
+This module only needs the standard library and NumPy so it can be copied into other projects.
+
+    for kind, msg in Subscriber("127.0.0.1:5001"):
+        if kind == "samples":
+            conn_id, rows = msg      # rows: (n, 7) int32 array
+        else:
+            print(msg["event"], msg)
+"""
+import json
+import socket
+import struct
+
+import numpy as np
+
+FRAME_HEADER = struct.Struct(">IB")
+SAMPLE_HEADER = struct.Struct("<I")
+SAMPLE_COLUMNS = 7
+SAMPLE_DTYPE = np.dtype("<i4")
+TYPE_SAMPLES = ord("S")
+TYPE_JSON = ord("J")
+
+def parse_address(address):
+    """("unix", path) for "unix:/path", ("tcp", (host, port)) for "host:port" or a bare port"""
+    address = str(address)
+    if address.startswith("unix:"):
+        return "unix", address[5:]
+    host, _, port = address.rpartition(":")
+    return "tcp", (host or "127.0.0.1", int(port))
+
+def connect(address, timeout=5.0):
+    family, target = parse_address(address)
+    if family == "unix":
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    else:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    sock.settimeout(timeout)
+    sock.connect(target)
+    sock.settimeout(None)
+    return sock
+
+def decode_frame(ftype, payload):
+    """("samples", (conn_id, rows)) or ("event", dict)"""
+    if ftype == TYPE_SAMPLES:
+        (conn_id,) = SAMPLE_HEADER.unpack_from(payload)
+        rows = np.frombuffer(payload, dtype=SAMPLE_DTYPE, offset=SAMPLE_HEADER.size).reshape(-1, SAMPLE_COLUMNS)
+        return "samples", (conn_id, rows)
+    if ftype == TYPE_JSON:
+        return "event", json.loads(payload.decode("utf-8"))
+    raise ValueError(f"Unknown frame type: {ftype!r}")
+
+class Subscriber:
+    """Iterates over (kind, message) from a running publisher until it closes the connection"""
+
+    def __init__(self, address, timeout=5.0):
+        self.sock = connect(address, timeout)
+        self.file = self.sock.makefile("rb", buffering=1 << 16)
+
+    def _read_exact(self, n):
+        data = self.file.read(n)
+        if len(data) < n:
+            raise EOFError
+        return data
+
+    def recv(self):
+        """Next (kind, message), or None once the publisher is gone"""
+        try:
+            length, ftype = FRAME_HEADER.unpack(self._read_exact(FRAME_HEADER.size))
+            return decode_frame(ftype, self._read_exact(length - 1))
+        except (EOFError, OSError):
+            return None
+
+    def __iter__(self):
+        while True:
+            msg = self.recv()
+            if msg is None:
+                return
+            yield msg
+
+    def close(self):
+        try:
+            self.file.close()
+        finally:
+            self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
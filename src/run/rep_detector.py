@@ -0,0 +1,68 @@
+import numpy as np
+from config import ACCEL_AXES, SAMPLE_RATE_HZ, NOISE_SIGMA_K, MIN_NOISE_TOLERANCE
+from analysis import get_tolerances, movement_bursts
+
+class ReplaySession:
+    """Recorded raw stream prepared once for fast repeated replay through count_reps"""
+
+    def __init__(self, set_data, baseline, ref_data=None, label=None, name=""):
+        self.name = name
+        self.label = label
+        self.n = len(set_data["ax"])
+        self.baseline = baseline  # 검출 허용 오차 (get_tolerances: NOISE 모드면 "std" 사용)
+        self.raw = np.asarray([set_data[axis] for axis in ACCEL_AXES], dtype=float)
+        self.base = np.asarray([baseline[axis] for axis in ACCEL_AXES], dtype=float)
+        self.base_abs = np.abs(self.base)
+        self.dev = np.abs(self.raw - self.base[:, None])
+        self.ref = None if ref_data is None else np.asarray([ref_data[axis] for axis in ACCEL_AXES], dtype=float)
+        self.pipeline = (ref_data or {}).get("pipeline", "RAW")  # 피크 허용 오차 선택 (PEAK_/LINEAR_PEAK_TOLERANCE_PERCENT)
+        self._mag_cache = {}
+
+    def active_mask(self, movement_tol_pct, min_abs_diff):
+        """Active axes of the expert reference under the given tolerance (same rule as get_active_axes)"""
+        if self.ref is None:
+            return (True, True, True)
+        tol = np.maximum(self.base_abs * movement_tol_pct, min_abs_diff)
+        dev = np.maximum(np.abs(self.ref.max(axis=1) - self.base), np.abs(self.ref.min(axis=1) - self.base))
+        active = tuple(bool(a) for a in dev > tol)
+        return active if any(active) else (True, True, True)
+
+    def magnitude(self, active):
+        """(user magnitude per sample, expert peak) over the active axes, cached per axis subset"""
+        if active not in self._mag_cache:
+            sel = np.asarray(active)
+            mag = np.sqrt((self.raw[sel] ** 2).sum(axis=0))
+            peak = float(np.sqrt((self.ref[sel] ** 2).sum(axis=0)).max()) if self.ref is not None else 0.0
+            self._mag_cache[active] = (mag, peak)
+        return self._mag_cache[active]
+
+def count_reps(session, movement_tol_pct, min_abs_diff, still_time, peak_tol_pct, sample_rate=SAMPLE_RATE_HZ,
+               noise_sigma_k=NOISE_SIGMA_K, min_noise_tol=MIN_NOISE_TOLERANCE):
+    """Replay a session through the peak enter/exit counter and return the rep count"""
+    # 실시간 검출과 같은 규칙 (THRESHOLD_MODE: 노이즈 k·sigma 또는 Baseline 비율)
+    tols = get_tolerances(session.baseline, movement_tol_pct, min_abs_diff, noise_sigma_k, min_noise_tol)
+    tol = np.asarray([tols[axis] for axis in ACCEL_AXES])
+    out_mask = (session.dev > tol[:, None]).any(axis=0)
+    starts, ends = movement_bursts(out_mask, int(still_time * sample_rate))
+    if len(starts) == 0:
+        return 0
+
+    mag, peak = session.magnitude(session.active_mask(movement_tol_pct, min_abs_diff))
+    if peak <= 0:
+        return 0
+    above = mag >= peak * (1 - peak_tol_pct)
+
+    # 버스트마다 피크 구역 첫 진입 지점과, 그 이후 첫 이탈 지점이 버스트 안에 있으면 1회
+    above_idx = np.flatnonzero(above)
+    below_idx = np.flatnonzero(~above)
+    if len(above_idx) == 0 or len(below_idx) == 0:
+        return 0
+    pos = np.searchsorted(above_idx, starts)
+    has_enter = pos < len(above_idx)
+    enter = above_idx[np.minimum(pos, len(above_idx) - 1)]
+    has_enter &= enter < ends
+    pos = np.searchsorted(below_idx, enter)
+    has_exit = pos < len(below_idx)
+    exit_ = below_idx[np.minimum(pos, len(below_idx) - 1)]
+    has_exit &= exit_ < ends
+    return int(np.count_nonzero(has_enter & has_exit))
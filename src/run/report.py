@@ -0,0 +1,68 @@
+import json
+import os
+
+import numpy as np
+
+from config import ACCEL_AXES, REPORT_MAX_POINTS
+from motion import linear_acceleration_batch
+from filters import filter_batch
+from profiles import PROFILE_NAME, profile_paths
+
+def decimate_minmax(values, max_points=REPORT_MAX_POINTS):
+    """(x, y) keeping each bucket's min and max in time order, so rep peaks survive decimation"""
+    y = np.asarray(values, dtype=float)
+    n = len(y)
+    if n <= max_points:
+        return np.arange(n), y
+    bucket = -(-n // (max_points // 2))  # 버킷당 min/max 두 점
+    n_buckets = -(-n // bucket)
+    padded = np.pad(y, (0, n_buckets * bucket - n), mode="edge").reshape(n_buckets, bucket)
+    starts = np.arange(n_buckets) * bucket
+    lo = starts + padded.argmin(axis=1)
+    hi = starts + padded.argmax(axis=1)
+    x = np.sort(np.stack([lo, hi], axis=1), axis=1).ravel()
+    x = np.minimum(x, n - 1)
+    # min과 max가 같은 샘플이면 한 점만 유지
+    x = x[np.concatenate(([True], np.diff(x) > 0))]
+    return x, y[x]
+
+def _series(channels, max_points):
+    out = {}
+    for axis in ACCEL_AXES:
+        x, y = decimate_minmax(channels[axis], max_points)
+        out[axis] = {"x": x.tolist(), "y": np.round(y, 1).tolist()}
+    return out
+
+def archive_path(profile, filename):
+    """Archived set file for a profile, or None if the name is not a plain set archive in it"""
+    if not PROFILE_NAME.match(profile or "") or os.path.basename(filename) != filename or not filename.endswith(".json"):
+        return None
+    path = os.path.join(profile_paths(profile)[2], filename)
+    return path if os.path.isfile(path) else None
+
+def build_set_report(path, ref_data=None, max_points=REPORT_MAX_POINTS):
+    """Chart-ready JSON for one archived set: decimated accel series, rep offsets and expert overlay"""
+    with open(path, "r") as f:
+        archive = json.load(f)
+    # 실시간 검출과 같은 필터를 거친 값으로 표시 (필터 기록이 없는 예전 아카이브는 원시값)
+    set_data = filter_batch(archive["data"], archive.get("filters", []))
+    # 선형 가속도 모드로 기록된 세트는 전문가 가이드와 같은 좌표로 변환 (PNG 보고서와 동일)
+    if archive.get("motion_baseline"):
+        set_data = linear_acceleration_batch(set_data, archive["motion_baseline"])
+
+    report = {
+        "file": os.path.basename(path),
+        "set_num": archive.get("set_num"),
+        "timestamp": archive.get("timestamp"),
+        "avg_similarity": archive.get("avg_similarity"),
+        "samples": len(set_data["ax"]),
+        "offsets": archive.get("offsets", []),
+        # 회차별 템포/피크/유사도 (회차 종료 시 한 번에 계산된 값)
+        "reps": archive.get("rep_features", []),
+        "series": _series(set_data, max_points),
+        "expert": None,
+    }
+    if ref_data and report["offsets"]:
+        # 전문가 동작은 회차마다 같은 모양이므로 한 번만 보내고 클라이언트가 각 오프셋에 배치
+        report["expert"] = {"samples": len(ref_data["ax"]), "series": _series(ref_data, max_points)}
+    return report
@@ -0,0 +1,170 @@
+import argparse
+import csv
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import config
+from config import CALIBRATION_FILE, REFERENCE_FILE, REPS_DIR
+from analysis import split_movement_bursts, extract_movement_channels_batch, calculate_similarity_multi, get_scoring_channels
+from motion import detection_setup, linear_acceleration_batch
+from filters import filter_batch
+from profiles import profile_paths
+
+# 결과 CSV / 히스토리 인덱스 컬럼
+FIELDS = ["file", "set_num", "timestamp", "reps", "avg_similarity", "rep_scores", "config_hash"]
+HISTORY_INDEX = "history_index.jsonl"  # 아카이브 디렉터리 안에 생성 (프로필별로 분리)
+
+# 스코어링 결과에 영향을 주는 설정값 (변경 시 config hash가 바뀜)
+# (FILTER_CHAIN은 세트마다 아카이브에 기록된 체인을 쓰므로 제외, 각 필터의 파라미터는 포함)
+HASHED_PARAMS = ["MOVEMENT_TOLERANCE_PERCENT", "MIN_ABS_DIFF", "STILL_TIME_LIMIT", "MIN_MOVEMENT_SAMPLES",
+                 "SPIKE_MIN_RUN", "SAMPLE_RATE_HZ", "SIMILARITY_MODE", "GYRO_MIN_ABS_DIFF", "MIN_ACCEL_RANGE",
+                 "MIN_GYRO_RANGE", "SCORING_MODE", "ZSCORE_STD_FLOOR", "ZSCORE_TOLERANCE", "ZSCORE_LIMIT",
+                 "THRESHOLD_MODE", "NOISE_SIGMA_K", "MIN_NOISE_TOLERANCE", "COMPLEMENTARY_ALPHA",
+                 "MOTION_STILL_GYRO_DPS", "MOTION_STILL_ACC_TOL",
+                 "FILTER_SPIKE_WINDOW", "FILTER_SPIKE_ACCEL", "FILTER_SPIKE_GYRO", "FILTER_EMA_ALPHA",
+                 "FILTER_LOWPASS_HZ"]
+
+# Worker process state (set once per process by _init_worker)
+_ref_data = None
+_baseline = None
+_raw_baseline = None
+_config_hash = None
+
+def config_hash(ref_path, baseline_path):
+    """Hash of the scoring parameters plus the reference and baseline file contents"""
+    h = hashlib.sha1()
+    h.update(json.dumps({k: getattr(config, k) for k in HASHED_PARAMS}, sort_keys=True).encode())
+    for path in (ref_path, baseline_path):
+        with open(path, "rb") as f:
+            h.update(f.read())
+    return h.hexdigest()[:12]
+
+def _init_worker(ref_data, baseline, cfg_hash):
+    global _ref_data, _baseline, _raw_baseline, _config_hash
+    _ref_data, _raw_baseline, _config_hash = ref_data, baseline, cfg_hash
+    # 아카이브는 원시값이므로 Reference가 선형 가속도로 기록됐다면 같은 변환을 거쳐 채점
+    _, _baseline = detection_setup(baseline, ref_data.get("pipeline", "RAW"))
+
+def score_set_file(path):
+    """Re-segment and re-score one archived set file"""
+    with open(path, "r") as f:
+        archived = json.load(f)
+    # 실시간 검출과 같은 순서: 튐/노이즈 필터 -> 중력 보상
+    # 필터는 녹화 당시 검출에 쓰인 체인을 재현 ("filters"가 없는 아카이브는 필터 도입 전 녹화 = 필터 없음)
+    set_data = filter_batch(archived["data"], archived.get("filters", []))
+    if _ref_data.get("pipeline") == "LINEAR":
+        set_data = linear_acceleration_batch(set_data, _raw_baseline)
+
+    channels = get_scoring_channels(_ref_data, _baseline)
+    scores = []
+    for trimmed in extract_movement_channels_batch(split_movement_bursts(set_data, _baseline), _baseline):
+        if trimmed and trimmed["ax"]:
+            sim, _ = calculate_similarity_multi(_ref_data, trimmed, channels)
+            scores.append(sim)
+
+    return {
+        "file": os.path.basename(path),
+        "set_num": archived.get("set_num"),
+        "timestamp": archived.get("timestamp"),
+        "reps": len(scores),
+        "avg_similarity": round(sum(scores) / len(scores), 2) if scores else 0.0,
+        "rep_scores": ";".join(f"{s:.1f}" for s in scores),
+        "config_hash": _config_hash,
+    }
+
+def score_batch(paths):
+    """Score a chunk of files in one worker call (amortizes process round-trips)"""
+    rows = []
+    for path in paths:
+        try:
+            rows.append(score_set_file(path))
+        except Exception as e:
+            print(f"[ERROR] Rescore failed for {path}: {e}")
+    return rows
+
+def load_scored(out_path, history):
+    """(file, config_hash) pairs already present in the output"""
+    done = set()
+    if not os.path.exists(out_path):
+        return done
+    with open(out_path, "r", newline="") as f:
+        if history:
+            rows = (json.loads(line) for line in f if line.strip())
+        else:
+            rows = csv.DictReader(f)
+        for row in rows:
+            done.add((row["file"], row["config_hash"]))
+    return done
+
+def rescore_archive(archive_dir=REPS_DIR, ref_path=REFERENCE_FILE, baseline_path=CALIBRATION_FILE,
+                    out_path=None, history=False, workers=None, chunk_size=8, incremental=True):
+    """Re-score every archived set in archive_dir and stream rows to CSV or the history index"""
+    if out_path is None:
+        out_path = os.path.join(archive_dir, HISTORY_INDEX if history else "rescore.csv")
+    with open(ref_path, "r") as f:
+        ref_data = json.load(f)
+    with open(baseline_path, "r") as f:
+        baseline = json.load(f)
+    cfg_hash = config_hash(ref_path, baseline_path)
+
+    files = sorted(
+        os.path.join(archive_dir, name) for name in os.listdir(archive_dir)
+        if name.startswith("set_") and name.endswith(".json")
+    )
+    done = load_scored(out_path, history) if incremental else set()
+    todo = [p for p in files if (os.path.basename(p), cfg_hash) not in done]
+    print(f">>> Rescore: {len(files)} sets, {len(files) - len(todo)} already scored (config {cfg_hash})")
+    if not todo:
+        return 0
+
+    chunks = [todo[i:i + chunk_size] for i in range(0, len(todo), chunk_size)]
+    write_header = not os.path.exists(out_path) or os.path.getsize(out_path) == 0 or not incremental
+    written = 0
+    with open(out_path, "a" if incremental else "w", newline="") as out, \
+            ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                initargs=(ref_data, baseline, cfg_hash)) as pool:
+        writer = None if history else csv.DictWriter(out, fieldnames=FIELDS)
+        if writer and write_header:
+            writer.writeheader()
+
+        futures = [pool.submit(score_batch, chunk) for chunk in chunks]
+        for fut in as_completed(futures):
+            for row in fut.result():
+                if history:
+                    out.write(json.dumps(row) + "\n")
+                else:
+                    writer.writerow(row)
+                written += 1
+                print(f" {row['file']:32s} | Reps: {row['reps']:2d} | Accuracy: {row['avg_similarity']:5.1f}%")
+            out.flush()
+
+    print(f">>> Rescore DONE: {written} sets written to {out_path}")
+    return written
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-score archived sets against a reference")
+    parser.add_argument("--profile", default=None, help="User profile (sets the archive/reference/baseline defaults)")
+    parser.add_argument("--archive", default=None, help="Directory with set_*.json archives")
+    parser.add_argument("--reference", default=None, help="Expert reference JSON")
+    parser.add_argument("--baseline", default=None, help="Calibration baseline JSON")
+    parser.add_argument("--out", default=None, help="Output path (default: <archive>/rescore.csv)")
+    parser.add_argument("--history", action="store_true", help="Append JSON lines to <archive>/history_index.jsonl instead of CSV")
+    parser.add_argument("--workers", type=int, default=None, help="Process pool size (default: CPU count)")
+    parser.add_argument("--chunk-size", type=int, default=8, help="Files per worker batch")
+    parser.add_argument("--full", action="store_true", help="Re-score everything and overwrite the output")
+    args = parser.parse_args()
+    if args.profile:
+        baseline_path, ref_path, archive_dir = profile_paths(args.profile)
+    else:
+        baseline_path, ref_path, archive_dir = CALIBRATION_FILE, REFERENCE_FILE, REPS_DIR
+    args.archive = args.archive or archive_dir
+    args.reference = args.reference or ref_path
+    args.baseline = args.baseline or baseline_path
+
+    rescore_archive(args.archive, args.reference, args.baseline, args.out, args.history,
+                    args.workers, args.chunk_size, incremental=not args.full)
+
+if __name__ == "__main__":
+    main()
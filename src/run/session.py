@@ -0,0 +1,196 @@
+import copy
+import socket
+import threading
+import time
+
+import config
+from config import *
+from analysis import new_channel_buffer
+from calibrator import StreamingCalibrator
+from motion import detection_setup
+from filters import filter_setup
+from waveform import LiveWaveform
+
+def new_station_stats(device_id, profile=DEFAULT_PROFILE):
+    """Per-dumbbell dashboard state (merged over the global AppState.stats for /stream)"""
+    return {
+        "device": device_id,
+        "count": 0,
+        "similarity": 0,
+        "is_moving": False,
+        "mode": "IDLE",
+        "current_samples": 0,
+        "expert_samples": 0,
+        "expert_takes": 0,    # 전문가 모드에서 지금까지 기록한 동작 수 (EXPERT_TAKES회가 모이면 Reference 저장)
+        "expert_takes_total": EXPERT_TAKES,
+        "is_set_active": False,
+        "set_count": 0,
+        "latest_graph": "",
+        "latest_report": "",  # "<profile>/<set archive>" (/report/...)
+        "last_rep": None,     # 직전 회차 특징 (템포, 피크, 유사도)
+        "stream_mode": "FULL",
+        "profile": profile,
+    }
+
+class DumbbellSession:
+    """Dumbbell state that outlives a single TCP connection (profile, mode, baseline, in-progress set)"""
+
+    def __init__(self, device_id):
+        self.device_id = device_id
+        self.owner = None          # 현재 이 세션을 처리 중인 DeviceHandler
+        self.detached_at = None    # 연결이 끊긴 시각 (grace period 계산용)
+        self.profile = None
+        self.samples_seen = 0      # 받은 전체 샘플 수 (SAMPLE_CLOCK 시계, 세션 재설정과 무관하게 증가)
+        self.journal = None        # 진행 중 세트의 journal.SetJournal (세트가 켜져 있을 때만)
+        self.stats = new_station_stats(device_id)  # 이 아령의 대시보드 상태 (/stream/<device>)
+        self.waveform = LiveWaveform()
+        self._reset()
+
+    def clock(self):
+        """Seconds for still/calibration timing: wall clock, or samples / SAMPLE_RATE_HZ with SAMPLE_CLOCK"""
+        # 합성 데이터를 실제보다 빠르게 재생해도 정지 판정이 데이터 시간 기준으로 동작
+        return self.samples_seen / SAMPLE_RATE_HZ if config.SAMPLE_CLOCK else time.time()
+
+    def _reset(self):
+        self.calibrator = StreamingCalibrator()
+        self.baseline = None
+        self.motion = None # MOTION_PIPELINE == "LINEAR"일 때 중력 보상 단계
+        self.filters = filter_setup(FILTER_CHAIN) # 검출 전 튐/노이즈 억제 (FILTER_CHAIN이 비면 None)
+        self.calibration_start_time = None
+        self.is_calibrated = False
+
+        self.expert_peak = 0.0
+        self.expert_takes = [] # Reference로 합치기 전까지 모은 전문가 동작 (extract_movement_channels 결과)
+        self.active_axes = ["ax", "ay", "az"] # Default
+        self.mode = "IDLE" # Default
+
+        # Buffers
+        self.current_rep = new_channel_buffer()
+        self.session_reps = [] # To store all reps for final analysis
+        self.rep_features = [] # session_reps와 같은 순서의 회차 특징 (RepFeatures)
+        self.set_raw_buffer = new_channel_buffer()
+        self.movement_offsets = [] # 세트 내 각 회차 시작 지점 저장
+
+        # Movement detection
+        self.is_moving = False
+        self.still_start_time = None
+        self.entered_peak_this_burst = False # 피크 구역 진입 여부
+        self.has_counted_this_burst = False   # 해당 버스트에서 이미 카운트했는지 여부
+
+    def load(self, stats, profile):
+        """Bind a (cached) user profile and determine the starting mode from its data"""
+        self._reset()
+        self.profile = profile
+        stats["profile"] = profile.name
+        print(f">>> Profile: {profile.name}")
+
+        if profile.baseline is None:
+            # 1. 베이스라인 없음
+            self.mode = "CALIBRATING"
+            stats["mode"] = "CALIBRATING"
+            self.calibration_start_time = self.clock()
+            print(">>> Initial Mode: CALIBRATING (Baseline file missing)")
+        elif profile.ref_data is None:
+            # 2. 전문가 동작 없음 (베이스라인은 있으므로 사용)
+            self.mode = "RECORDING_EXPERT"
+            stats["mode"] = "WAITING_FOR_EXPERT"
+            stats["expert_takes"] = 0
+            print(">>> Initial Mode: RECORDING_EXPERT (Reference file missing)")
+            # 정지 구간 추적이 Baseline을 갱신하므로 캐시된 원본 대신 복사본 사용
+            self.motion, self.baseline = detection_setup(copy.deepcopy(profile.baseline), MOTION_PIPELINE)
+            self.is_calibrated = True
+        else:
+            # 둘 다 있으면 즉시 카운팅 모드로!
+            self.mode = "COUNTING"
+            stats["mode"] = "COUNTING"
+            print(">>> Initial Mode: COUNTING (Data exists, skipping setup)")
+            pipeline = profile.pipeline
+            self.motion, self.baseline = detection_setup(copy.deepcopy(profile.baseline), pipeline)
+            if pipeline != MOTION_PIPELINE:
+                print(f"[WARNING] Reference was recorded with the {pipeline} pipeline; re-record it to use {MOTION_PIPELINE}.")
+            self.is_calibrated = True
+            self.active_axes = profile.active_axes
+            self.expert_peak = profile.expert_peak
+            stats["expert_samples"] = len(profile.ref_data["ax"])
+            print(f">>> Active Axes: {self.active_axes}")
+            print(f">>> Pre-loaded Expert Peak (Active axes only): {self.expert_peak:.0f}")
+
+class SessionRegistry:
+    """Dumbbell sessions keyed by device ID, kept for a grace period after a disconnect.
+
+    A reconnecting device (HELLO frame, or the same IP for older firmware) gets its
+    previous session back with the in-progress set, counts and loaded baseline intact.
+    A new connection for a device that still has a live handler takes the session over
+    and closes the stale socket (half-open connections after a WiFi drop).
+    """
+
+    def __init__(self, grace_period=SESSION_GRACE_PERIOD):
+        self.grace_period = grace_period
+        self.lock = threading.Lock()
+        self.sessions = {}
+        self.primary = None  # 가장 최근에 접속한 기기 (기기를 지정하지 않은 /stream이 보여주는 아령)
+
+    def attach(self, device_id, handler):
+        """(session, resumed) for device_id, now owned by handler"""
+        with self.lock:
+            self._expire()
+            session = self.sessions.get(device_id)
+            resumed = session is not None
+            if session is None:
+                session = DumbbellSession(device_id)
+                self.sessions[device_id] = session
+            stale = session.owner
+            session.owner = handler
+            session.detached_at = None
+            self.primary = device_id
+        if stale is not None and stale is not handler:
+            print(f">>> [SESSION] {device_id}: new connection takes over from {stale.addr}")
+            stale.close()
+        return session, resumed
+
+    def detach(self, session, handler):
+        """Start the grace period, unless another connection already took the session over"""
+        with self.lock:
+            if session.owner is handler:
+                session.owner = None
+                session.detached_at = time.time()
+
+    def get(self, device_id=None):
+        """Session of device_id (None: the primary one), or None"""
+        with self.lock:
+            return self.sessions.get(self.primary if device_id is None else device_id)
+
+    def stations(self):
+        """(device_id, session) pairs, in connection order"""
+        with self.lock:
+            self._expire()
+            return list(self.sessions.items())
+
+    def _expire(self):
+        now = time.time()
+        for device_id, session in list(self.sessions.items()):
+            if session.owner is None and now - session.detached_at > self.grace_period:
+                lost = len(session.set_raw_buffer["ax"])
+                print(f">>> [SESSION] {device_id}: expired after {self.grace_period}s"
+                      + (f" (discarding {lost} unfinished set samples)" if lost and session.journal is None else ""))
+                if session.journal is not None:
+                    # 끝나지 않은 세트는 저널로 남겨 다음 시작 시 아카이브로 복구
+                    session.journal.close()
+                    print(f">>> [SESSION] {device_id}: unfinished set ({lost} samples) kept in {session.journal.path}")
+                del self.sessions[device_id]
+                if self.primary == device_id:
+                    self.primary = None
+
+def configure_socket(conn):
+    """Low-latency, fast-failing TCP settings for device connections"""
+    conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    conn.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+    # 플랫폼별 keepalive 세부 설정 (Linux/macOS/Windows에서 지원되는 것만)
+    for name, value in (("TCP_KEEPIDLE", TCP_KEEPALIVE_IDLE), ("TCP_KEEPALIVE", TCP_KEEPALIVE_IDLE),
+                        ("TCP_KEEPINTVL", TCP_KEEPALIVE_INTERVAL), ("TCP_KEEPCNT", TCP_KEEPALIVE_COUNT)):
+        opt = getattr(socket, name, None)
+        if opt is not None:
+            try:
+                conn.setsockopt(socket.IPPROTO_TCP, opt, value)
+            except OSError:
+                pass
@@ -0,0 +1,140 @@
+import argparse
+import asyncio
+import os
+import re
+import resource
+import subprocess
+import sys
+import threading
+import time
+
+TS_FIELD = re.compile(rb'"loadtest_ts": ([0-9.]+)')
+
+def _rss_kb(pid):
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    return 0
+
+def serve(port, mode):
+    """Child process: the real WebServer plus a synthetic 10 Hz sample/rep feed"""
+    from state import AppState
+    from web_server import WebServer
+    state = AppState.get_instance()
+    stats = state.stats
+    server = WebServer()
+    threading.Thread(target=server.run, kwargs={"host": "127.0.0.1", "port": port, "mode": mode}, daemon=True).start()
+
+    def feed():
+        n = 0
+        while True:
+            time.sleep(0.1)
+            n += 1
+            state.waveform.add(100 * (n % 20), 200, 16384)
+            state.waveform.add(100 * (n % 20), 250, 16384)
+            # 회차 이벤트: 클라이언트가 받은 시각과 비교해 지연 측정
+            stats["loadtest_ts"] = time.time()
+            stats["count"] = n
+    threading.Thread(target=feed, daemon=True).start()
+    print("READY", flush=True)
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+async def stream_client(port, latencies, connected, stop):
+    try:
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    except OSError:
+        return False
+    writer.write(b"GET /stream HTTP/1.1\r\nHost: localhost\r\nAccept: text/event-stream\r\n\r\n")
+    await writer.drain()
+    await reader.readuntil(b"\r\n\r\n")
+    connected.append(1)
+    tail = b""
+    try:
+        while not stop.is_set():
+            chunk = await reader.read(65536)
+            if not chunk:
+                break
+            now = time.time()
+            # 수천 개 스트림을 한 프로세스에서 읽으므로 JSON 전체 파싱 대신 타임스탬프만 추출
+            buf = tail + chunk
+            cut = buf.rfind(b"\n") + 1
+            buf, tail = buf[:cut], buf[cut:]
+            if stop.measuring:
+                latencies.extend(now - float(ts) for ts in TS_FIELD.findall(buf))
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+    return True
+
+class _Stop(asyncio.Event):
+    measuring = False
+
+async def run_clients(port, clients, duration, pid, ramp):
+    latencies, connected = [], []
+    stop = _Stop()
+    rss_before = _rss_kb(pid)
+    tasks = []
+    t0 = time.perf_counter()
+    for i in range(clients):
+        tasks.append(asyncio.create_task(stream_client(port, latencies, connected, stop)))
+        if i % ramp == ramp - 1:
+            await asyncio.sleep(0.05)
+    while len(connected) < clients and time.perf_counter() - t0 < 60:
+        await asyncio.sleep(0.1)
+    connect_time = time.perf_counter() - t0
+    await asyncio.sleep(1.0)  # 안정화 후 측정
+    stop.measuring = True
+    await asyncio.sleep(duration)
+    rss_after = _rss_kb(pid)
+    stop.set()
+    for t in tasks:
+        t.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    return len(connected), connect_time, rss_before, rss_after, latencies
+
+def main():
+    parser = argparse.ArgumentParser(description="Open many concurrent /stream (SSE) dashboard clients against a local server")
+    parser.add_argument("--clients", type=int, default=1000)
+    parser.add_argument("--duration", type=float, default=10.0, help="Measurement window (s)")
+    parser.add_argument("--mode", choices=["async", "dev"], default="async")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--ramp", type=int, default=100, help="Connections opened per 50 ms")
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.serve:
+        serve(args.port, args.mode)
+        return
+
+    # 클라이언트 수만큼 소켓이 필요하므로 파일 디스크립터 한도를 올림 (서버 프로세스도 상속)
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (min(hard, max(soft, args.clients * 2 + 256)), hard))
+
+    child = subprocess.Popen([sys.executable, os.path.abspath(__file__), "--serve", "--port", str(args.port), "--mode", args.mode],
+                             stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    try:
+        while "READY" not in child.stdout.readline():
+            pass
+        time.sleep(1.0)
+        n, connect_time, before, after, lat = asyncio.run(run_clients(args.port, args.clients, args.duration, child.pid, args.ramp))
+    finally:
+        child.terminate()
+        child.wait(10)
+
+    print(f"\n Mode: {args.mode} | clients connected: {n}/{args.clients} in {connect_time:.1f}s")
+    print(f" Server RSS: {before / 1024:.1f} MB -> {after / 1024:.1f} MB "
+          f"({(after - before) / max(n, 1):.1f} KB per client)")
+    if lat:
+        lat.sort()
+        pick = lambda q: lat[min(len(lat) - 1, int(q * len(lat)))] * 1000
+        print(f" Update events: {len(lat):,} | latency p50 {pick(0.5):.1f} ms | p99 {pick(0.99):.1f} ms | max {lat[-1] * 1000:.1f} ms")
+    else:
+        print(" No update events received")
+
+if __name__ == "__main__":
+    main()
@@ -1,114 +1,96 @@
-import socket
+import argparse
 import threading
 import time
 import collections
+import numpy as np
 import matplotlib.pyplot as plt
 import matplotlib.animation as animation
 from config import HOST, PORT
+from ingest import IngestServer, get_bus
 
 # Configuration
 WINDOW_SIZE = 200  # Number of samples to show on graph
 UPDATE_INTERVAL = 50  # Plot update interval in ms
 
+# Fast mode configuration
+FAST_WINDOW_SIZE = 2000  # Samples shown in fast mode
+FAST_UPDATE_INTERVAL = 16  # ~60 fps
+Y_MARGIN = 0.15  # Extra headroom above/below the data when auto-scaling
+Y_SHRINK_RATIO = 0.4  # Shrink only when data uses less than this fraction of the range...
+Y_SHRINK_FRAMES = 30  # ...for this many consecutive frames (hysteresis)
+
 # Global Data Buffer
 data_lock = threading.Lock()
 ax_buf = collections.deque(maxlen=WINDOW_SIZE)
 ay_buf = collections.deque(maxlen=WINDOW_SIZE)
 az_buf = collections.deque(maxlen=WINDOW_SIZE)
+ring = None  # RingBuffer used instead of the deques in fast mode
 
 # Global State
 is_running = True
 
-def socket_server_thread():
-    """
-    Runs a socket server that mimics the logic in device_handler.py/dumbell.py
-    to receive data from the ESP32/Dumbbell.
-    """
-    global is_running
-    
-    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-        s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        try:
-            s.bind((HOST, PORT))
-        except OSError as e:
-            print(f"Error binding to {HOST}:{PORT}: {e}")
-            is_running = False
-            return
+class RingBuffer:
+    """Preallocated (3, capacity) sample ring shared between the socket thread and the plot"""
 
-        s.listen(1)
-        print(f"Waiting for connection on {HOST}:{PORT}...")
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.data = np.zeros((3, capacity), dtype=np.float32)
+        self.pos = 0
+        self.lock = threading.Lock()
 
-        conn = None
-        raw_buf = b""
-        
-        try:
-            while is_running:
-                # Accept connection
-                if conn is None:
-                    s.settimeout(1.0)
-                    try:
-                        conn, addr = s.accept()
-                        print(f"Connected by {addr}")
-                        conn.settimeout(10.0)
-                    except socket.timeout:
-                        continue
-                    except Exception as e:
-                        print(f"Accept error: {e}")
-                        continue
-                
-                # Receive data
-                try:
-                    data = conn.recv(4096)
-                    if not data:
-                        print("Connection closed by device.")
-                        conn.close()
-                        conn = None
-                        continue
-                    
-                    raw_buf += data
-                    
-                    # Process lines similar to device_handler.py
-                    while b"\n" in raw_buf:
-                        line_bytes, raw_buf = raw_buf.split(b"\n", 1)
-                        line = line_bytes.decode(errors="ignore").strip()
-                        if not line: continue
-                        
-                        # Data format logic from device_handler.py
-                        # We ignore "ENV:" and "TEMP:" for this grapher, focused on Accel
-                        # "ax, ay, az, gx, gy, gz"
-                        
-                        parts = line.split(",")
-                        if len(parts) >= 6:
-                            try:
-                                val_ax = int(parts[0])
-                                val_ay = int(parts[1])
-                                val_az = int(parts[2])
-                                
-                                with data_lock:
-                                    ax_buf.append(val_ax)
-                                    ay_buf.append(val_ay)
-                                    az_buf.append(val_az)
-                            except ValueError:
-                                pass
-                                
-                except socket.timeout:
-                    print("Socket timeout (no data).")
-                    if conn:
-                        conn.close()
-                        conn = None
-                except Exception as e:
-                    print(f"Socket error: {e}")
-                    if conn:
-                        conn.close()
-                        conn = None
-
-        except KeyboardInterrupt:
-            # Main thread will handle this mostly, but good to have
-            pass
-        finally:
-            if conn:
-                conn.close()
-            print("Socket server stopped.")
+    def append(self, ax, ay, az):
+        with self.lock:
+            p = self.pos
+            self.data[0, p] = ax
+            self.data[1, p] = ay
+            self.data[2, p] = az
+            self.pos = (p + 1) % self.capacity
+
+    def copy_into(self, out):
+        """Copy samples oldest-first into a preallocated (3, capacity) array"""
+        with self.lock:
+            p = self.pos
+            tail = self.capacity - p
+            out[:, :tail] = self.data[:, p:]
+            out[:, tail:] = self.data[:, :p]
+
+def bus_consumer_thread(sub):
+    """Moves accel samples from the ingest bus subscription into the plot buffers"""
+    while is_running:
+        events = sub.drain()
+        if not events:
+            time.sleep(0.005)
+            continue
+        if ring is not None:
+            for ev in events:
+                ring.append(*ev.data[:3])
+        else:
+            with data_lock:
+                for ev in events:
+                    val_ax, val_ay, val_az = ev.data[:3]
+                    ax_buf.append(val_ax)
+                    ay_buf.append(val_ay)
+                    az_buf.append(val_az)
+    sub.close()
+
+def run(bus, fast=False, window=FAST_WINDOW_SIZE, autoscale=True):
+    """Plot the live stream from an ingest bus (blocks; matplotlib needs the main thread)"""
+    global ring, is_running
+    if fast:
+        # 소비 스레드가 시작되기 전에 링 버퍼를 준비
+        ring = RingBuffer(window)
+    # 플롯 프레임 사이에 쌓이는 샘플만 필요하므로 큐는 창 크기 정도면 충분 (초과분은 오래된 것부터 버림)
+    sub = bus.subscribe("accel-grapher", maxsize=max(window, WINDOW_SIZE), kinds=("sample",))
+    threading.Thread(target=bus_consumer_thread, args=(sub,), daemon=True).start()
+    try:
+        if fast:
+            run_fast_grapher(window, autoscale=autoscale)
+        else:
+            run_grapher()
+    except KeyboardInterrupt:
+        print("\nInterrupted by user.")
+    finally:
+        is_running = False
 
 def run_grapher():
     """
@@ -172,13 +154,97 @@ def run_grapher():
         print(f"Plot error: {e}")
         is_running = False
 
-if __name__ == "__main__":
-    # Start socket server in a separate daemon thread
-    t = threading.Thread(target=socket_server_thread, daemon=True)
-    t.start()
-    
+def run_fast_grapher(window=FAST_WINDOW_SIZE, autoscale=True):
+    """
+    High-performance live plot: NumPy ring buffer, blitting with cached backgrounds,
+    auto-scaling with hysteresis and a frame-time readout.
+    """
+    global ring
+    if ring is None or ring.capacity != window:
+        ring = RingBuffer(window)
+    view = np.zeros((3, window), dtype=np.float32)
+
+    fig = plt.figure(figsize=(10, 6))
+    ax = fig.add_subplot(1, 1, 1)
+
+    x_data = np.arange(window)
+    lines = [
+        ax.plot(x_data, view[i], color, label=label, alpha=0.8, linewidth=1, animated=True)[0]
+        for i, (color, label) in enumerate((('r-', 'AX'), ('g-', 'AY'), ('b-', 'AZ')))
+    ]
+    fps_text = ax.text(0.01, 0.97, "", transform=ax.transAxes, va='top', fontsize='small', animated=True)
+
+    ax.set_title(f"Real-time Acceleration - Fast Mode ({HOST}:{PORT})")
+    ax.set_ylim(-30000, 30000)
+    ax.set_xlim(0, window)
+    ax.grid(True, alpha=0.3)
+    ax.legend(loc='upper right')
+
+    timing = {"last": time.perf_counter(), "frame_ms": 0.0, "shrink_frames": 0}
+
+    def rescale():
+        """Grow immediately when data leaves the range, shrink only after Y_SHRINK_FRAMES quiet frames"""
+        lo, hi = float(view.min()), float(view.max())
+        y0, y1 = ax.get_ylim()
+        span = max(hi - lo, 1.0)
+        if lo < y0 or hi > y1:
+            timing["shrink_frames"] = 0
+        elif span < (y1 - y0) * Y_SHRINK_RATIO:
+            timing["shrink_frames"] += 1
+            if timing["shrink_frames"] < Y_SHRINK_FRAMES:
+                return
+        else:
+            timing["shrink_frames"] = 0
+            return
+        timing["shrink_frames"] = 0
+        ax.set_ylim(lo - span * Y_MARGIN, hi + span * Y_MARGIN)
+        # 눈금 라벨/격자는 blit 배경에 포함되므로 지금 바로 전체 다시 그리기
+        # (draw_idle은 GUI 백엔드에서 지연되어, 이 프레임의 blit이 이전 눈금의 화면을 새 범위의 배경으로 캐시함)
+        fig.canvas.draw()
+
+    def update(frame):
+        ring.copy_into(view)
+        for i, line in enumerate(lines):
+            line.set_ydata(view[i])
+        if autoscale:
+            rescale()
+
+        now = time.perf_counter()
+        dt = (now - timing["last"]) * 1000.0
+        timing["last"] = now
+        timing["frame_ms"] += 0.1 * (dt - timing["frame_ms"])
+        fps_text.set_text(f"{timing['frame_ms']:.1f} ms/frame ({1000.0 / max(timing['frame_ms'], 1e-3):.0f} fps)")
+        return (*lines, fps_text)
+
+    ani = animation.FuncAnimation(fig, update, interval=FAST_UPDATE_INTERVAL, blit=True, cache_frame_data=False)
+
+    def on_close(event):
+        global is_running
+        print("Window closed, stopping server...")
+        is_running = False
+
+    fig.canvas.mpl_connect('close_event', on_close)
+
+    print(f"Starting Fast Grapher ({window} samples)... Close the plot window to exit.")
     try:
-        run_grapher()
-    except KeyboardInterrupt:
+        plt.show()
+    except Exception as e:
+        print(f"Plot error: {e}")
         is_running = False
-        print("\nInterrupted by user.")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Real-time acceleration grapher")
+    parser.add_argument("--fast", action="store_true", help="Blitted ring-buffer plot (60 fps, large windows)")
+    parser.add_argument("--window", type=int, default=FAST_WINDOW_SIZE, help="Samples shown in fast mode")
+    parser.add_argument("--fixed-scale", action="store_true", help="Disable auto-scaling in fast mode")
+    args = parser.parse_args()
+
+    # 단독 실행: 이 프로세스가 장치 소켓을 직접 소유 (카운팅 중 함께 보려면 dumbbell.py --accel-graph)
+    event_bus = get_bus()
+    try:
+        IngestServer(event_bus).start()
+    except OSError as e:
+        print(f"Error binding to {HOST}:{PORT}: {e} (server already running? use dumbbell.py --accel-graph)")
+        raise SystemExit(1)
+
+    run(event_bus, args.fast, args.window, autoscale=not args.fixed_scale)
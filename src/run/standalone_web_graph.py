@@ -1,111 +1,32 @@
 from flask import Flask, Response, send_from_directory
+import argparse
+import base64
 import os
-import socket
+import struct
 import threading
 import time
 import json
-import collections
-from config import HOST, PORT
+from config import HOST, PORT, GRAPH_WEB_PORT
+from ingest import IngestServer, get_bus
 
 # Configuration
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 UI_DIR = os.path.join(BASE_DIR, 'ui')
+FRAME_RATE = 30  # SSE flushes per second (each carries every sample since the last flush)
+CLIENT_BUFFER = 4096  # Max samples kept per client between flushes (oldest dropped by the bus)
 
 app = Flask(__name__)
 
-# Global Data Buffer
-data_lock = threading.Lock()
-# Store last known values to send to client
-current_data = {
-    "ax": 0, "ay": 0, "az": 0,
-    "timestamp": 0
-}
+# Ingest bus the browsers subscribe to (set by serve)
+bus = None
 
-is_running = True
+def _to_int16(v):
+    return -32768 if v < -32768 else 32767 if v > 32767 else v
 
-def socket_server_thread():
-    """
-    Runs a socket server to receive data from the ESP32/Dumbbell.
-    """
-    global is_running
-    
-    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-        s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        try:
-            s.bind((HOST, PORT))
-        except OSError as e:
-            print(f"Error binding to {HOST}:{PORT}: {e}")
-            is_running = False
-            return
-
-        s.listen(1)
-        print(f"Socket Server listening on {HOST}:{PORT}...")
-
-        conn = None
-        raw_buf = b""
-        
-        try:
-            while is_running:
-                # Accept connection
-                if conn is None:
-                    s.settimeout(1.0)
-                    try:
-                        conn, addr = s.accept()
-                        print(f">>> Device connected: {addr}")
-                        conn.settimeout(10.0)
-                    except socket.timeout:
-                        continue
-                    except Exception as e:
-                        print(f"Accept error: {e}")
-                        continue
-                
-                # Receive data
-                try:
-                    data = conn.recv(4096)
-                    if not data:
-                        print(">>> Connection closed by device.")
-                        conn.close()
-                        conn = None
-                        continue
-                    
-                    raw_buf += data
-                    
-                    while b"\n" in raw_buf:
-                        line_bytes, raw_buf = raw_buf.split(b"\n", 1)
-                        line = line_bytes.decode(errors="ignore").strip()
-                        if not line: continue
-                        
-                        parts = line.split(",")
-                        if len(parts) >= 3: # Expecting at least ax,ay,az
-                            try:
-                                val_ax = int(parts[0])
-                                val_ay = int(parts[1])
-                                val_az = int(parts[2])
-                                
-                                with data_lock:
-                                    current_data["ax"] = val_ax
-                                    current_data["ay"] = val_ay
-                                    current_data["az"] = val_az
-                                    current_data["timestamp"] = time.time()
-                                    
-                            except ValueError:
-                                pass
-                                
-                except socket.timeout:
-                    # Keep connection alive, just check loop
-                    continue
-                except Exception as e:
-                    print(f"Socket error: {e}")
-                    if conn:
-                        conn.close()
-                        conn = None
-
-        except Exception as e:
-            print(f"Server loop error: {e}")
-        finally:
-            if conn:
-                conn.close()
-            print("Socket server stopped.")
+def pack_samples(samples):
+    """Interleaved ax,ay,az little-endian int16 samples as base64"""
+    flat = [_to_int16(v) for sample in samples for v in sample]
+    return base64.b64encode(struct.pack(f"<{len(flat)}h", *flat)).decode("ascii")
 
 @app.route('/')
 def index():
@@ -114,27 +35,47 @@ def index():
 @app.route('/stream')
 def stream():
     def generate():
-        last_ts = 0
-        while True:
-            with data_lock:
-                # If we have new data
-                if current_data["timestamp"] > last_ts:
-                    json_data = json.dumps(current_data)
-                    yield f"data: {json_data}\n\n"
-                    last_ts = current_data["timestamp"]
-            
-            time.sleep(0.02) # Check at 50Hz
+        # 브라우저마다 ingest 버스 구독 하나 (느린 클라이언트는 자기 큐의 오래된 샘플만 잃음)
+        sub = bus.subscribe("web-grapher", maxsize=CLIENT_BUFFER, kinds=("sample",))
+        try:
+            interval = 1.0 / FRAME_RATE
+            while True:
+                # 마지막 전송 이후 들어온 모든 샘플을 한 번에 묶어서 전송
+                samples = [ev.data[:3] for ev in sub.drain()]
+                if samples:
+                    payload = {"n": len(samples), "b64": pack_samples(samples)}
+                    yield f"data: {json.dumps(payload)}\n\n"
+                time.sleep(interval)
+        finally:
+            sub.close()
             
     return Response(generate(), mimetype="text/event-stream")
 
-if __name__ == "__main__":
-    # Start socket server
-    t = threading.Thread(target=socket_server_thread, daemon=True)
-    t.start()
-    
+def serve(event_bus, http_port=GRAPH_WEB_PORT):
+    global bus
+    bus = event_bus
     print("="*60)
-    print("Web Grapher running at http://localhost:5000")
+    print(f"Web Grapher running at http://localhost:{http_port}")
     print("="*60)
+    app.run(host='0.0.0.0', port=http_port, debug=False, use_reloader=False, threaded=True)
+
+def start_in_background(event_bus, http_port=GRAPH_WEB_PORT):
+    """Serve the grapher next to a running server (e.g. dumbbell.py --web-graph)"""
+    threading.Thread(target=serve, args=(event_bus, http_port), daemon=True).start()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Real-time acceleration web grapher")
+    parser.add_argument("--fps", type=int, default=FRAME_RATE, help="Batched SSE frames per second")
+    parser.add_argument("--http-port", type=int, default=GRAPH_WEB_PORT, help="Grapher web page port")
+    args = parser.parse_args()
+    FRAME_RATE = args.fps
+
+    # 단독 실행: 이 프로세스가 장치 소켓을 직접 소유 (dumbbell.py와 함께 보려면 dumbbell.py --web-graph)
+    event_bus = get_bus()
+    try:
+        IngestServer(event_bus).start()
+    except OSError as e:
+        print(f"Error binding to {HOST}:{PORT}: {e} (server already running? use dumbbell.py --web-graph)")
+        raise SystemExit(1)
     
-    # Run Flask
-    app.run(host='0.0.0.0', port=5000, debug=False, use_reloader=False)
+    serve(event_bus, args.http_port)
@@ -1,4 +1,10 @@
 import threading
+from waveform import LiveWaveform
+from session import SessionRegistry, new_station_stats
+from finalizer import SetFinalizer
+from profiles import ProfileCache
+from journal import JournalFlusher
+from config import DEFAULT_PROFILE, JOURNAL_ENABLED
 
 class AppState:
     _instance = None
@@ -9,22 +15,22 @@ class AppState:
             with cls._lock:
                 if cls._instance is None:
                     cls._instance = super(AppState, cls).__new__(cls)
+                    # 모든 아령이 공유하는 상태 (카운트/모드 등 기기별 상태는 DumbbellSession.stats)
                     cls._instance.stats = {
-                        "count": 0,
-                        "similarity": 0,
-                        "is_moving": False,
-                        "mode": "IDLE",
-                        "current_distribution": [],
-                        "expert_distribution": [],
                         "advice": "",
                         "advice_status": "",
                         "humidity": 0,
                         "connection_phase": "WAITING_ENV",
                         "allow_dumbbell": False,
-                        "is_set_active": False,
-                        "set_count": 0,
-                        "latest_graph": ""
+                        "latest_report": "",  # 복구된 세트 등 아직 기기가 없을 때 보여줄 보고서
+                        "pending_reports": 0,
+                        "profile": DEFAULT_PROFILE  # 새로 접속하는 아령의 기본 프로필
                     }
+                    cls._instance.waveform = LiveWaveform()  # 아령이 없을 때의 빈 파형
+                    cls._instance.sessions = SessionRegistry()
+                    cls._instance.finalizer = SetFinalizer(cls._instance.stats)
+                    cls._instance.journals = JournalFlusher() if JOURNAL_ENABLED else None
+                    cls._instance.profiles = ProfileCache()
                     cls._instance.ai_advice_triggered = False
                     cls._instance.ai_advice_completed = False
                     cls._instance.env_sensor_connected = False
@@ -33,3 +39,14 @@ class AppState:
     @classmethod
     def get_instance(cls):
         return cls()
+
+    def view(self, device_id=None):
+        """(stats, waveform) for one dashboard stream: the shared stats merged with one dumbbell's state.
+
+        device_id None follows the most recently connected dumbbell (single-station dashboard);
+        until a dumbbell connects, idle defaults are shown.
+        """
+        session = self.sessions.get(device_id)
+        if session is None:
+            return {**new_station_stats(device_id, self.stats["profile"]), **self.stats}, self.waveform
+        return {**self.stats, **session.stats}, session.waveform
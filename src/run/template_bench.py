@@ -0,0 +1,84 @@
+import argparse
+import time
+
+import numpy as np
+
+from config import ACC_LSB_PER_G, CHANNELS, EXPERT_TAKES, SAMPLE_RATE_HZ, MOTION_PIPELINE
+from analysis import build_expert_template, compute_rep_features, extract_movement_channels, get_active_axes, \
+    get_scoring_channels
+from motion import detection_setup, linear_acceleration_batch
+import workout_synth
+
+BASELINE = {"ax": 0.0, "ay": 0.0, "az": ACC_LSB_PER_G, "gx": 0.0, "gy": 0.0, "gz": 0.0}
+
+def calibrated_baseline(noise):
+    """Baseline as the calibrator would save it for the synthetic still sensor (mean + noise sigma)"""
+    return {**BASELINE, "std": {ch: noise * (0.5 if ch.startswith("g") else 1.0) for ch in CHANNELS}}
+
+def recorded_rep(spec, rng, args, det_baseline):
+    """One rep as the server sees it: still margins + sensor noise, MOTION_PIPELINE stage, movement segment only"""
+    rate = SAMPLE_RATE_HZ
+    still = workout_synth.still(0.5, rate)
+    values = np.concatenate((still, workout_synth.rep_motion(spec, rate, args.radius), still))
+    values += rng.normal(0, args.noise, values.shape) * np.array([1, 1, 1, 0.5, 0.5, 0.5])
+    raw = {ch: np.round(values[:, i]).tolist() for i, ch in enumerate(CHANNELS)}
+    if MOTION_PIPELINE == "LINEAR":
+        raw = linear_acceleration_batch(raw, BASELINE)
+    return extract_movement_channels(raw, det_baseline)
+
+def references(rng, args, det_baseline):
+    """(single take, EXPERT_TAKES-take template, same template without the std envelope) from one expert session"""
+    takes = [recorded_rep(workout_synth.random_rep(rng, args, form_error=False), rng, args, det_baseline)
+             for _ in range(args.takes)]
+    single = dict(takes[0])
+    template = build_expert_template(takes)
+    mean_only = {ch: vals for ch, vals in template.items() if ch not in ("std", "takes")}
+    return {"single/RANGE": single, f"mean{args.takes}/RANGE": mean_only, f"mean{args.takes}/ZSCORE": template}
+
+def score(ref, reps, det_baseline):
+    channels = get_scoring_channels(ref, det_baseline)
+    active = get_active_axes(ref, det_baseline)
+    return np.array([compute_rep_features(rep, det_baseline, ref, channels, active)[0].similarity for rep in reps])
+
+def main():
+    parser = argparse.ArgumentParser(description="Score stability of single-take vs multi-take expert references")
+    parser.add_argument("--takes", type=int, default=EXPERT_TAKES, help="Expert takes averaged into the template")
+    parser.add_argument("--sessions", type=int, default=20, help="Independent expert recordings to compare")
+    parser.add_argument("--reps", type=int, default=60, help="User reps scored against every reference")
+    parser.add_argument("--tempo", default="1.8-2.4")
+    parser.add_argument("--amplitude", default="1.3-1.5")
+    parser.add_argument("--noise", type=float, default=60.0)
+    parser.add_argument("--radius", type=float, default=0.3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    args.form_error_rate = 1.0  # 오류 회차는 모두 FORM_ERRORS 중 하나 (정상 회차/전문가 동작은 form_error=False)
+
+    rng = np.random.default_rng(args.seed)
+    _, det_baseline = detection_setup(calibrated_baseline(args.noise), MOTION_PIPELINE)
+    good = [recorded_rep(workout_synth.random_rep(rng, args, form_error=False), rng, args, det_baseline)
+            for _ in range(args.reps)]
+    bad = [recorded_rep(workout_synth.random_rep(rng, args), rng, args, det_baseline) for _ in range(args.reps)]
+
+    # 같은 사용자 회차를 전문가 녹화만 바꿔 가며 채점: 회차별 점수 흔들림(세션 간 표준편차)이 작을수록 안정적
+    scores, cost = {}, {}
+    for _ in range(args.sessions):
+        for name, ref in references(rng, args, det_baseline).items():
+            t0 = time.perf_counter()
+            good_scores = score(ref, good, det_baseline)
+            cost.setdefault(name, []).append((time.perf_counter() - t0) / len(good))
+            scores.setdefault(name, []).append((good_scores, score(ref, bad, det_baseline)))
+
+    print(f"\n {args.sessions} expert sessions x {args.reps} correct + {args.reps} form-error reps | "
+          f"{args.takes} takes per template | {MOTION_PIPELINE} pipeline")
+    print(f" {'reference':14s} | {'correct':>7s} | {'error':>6s} | {'gap':>5s} | {'spread/rep':>10s} | {'us/rep':>7s}")
+    print("-" * 66)
+    for name, runs in scores.items():
+        good_s = np.array([g for g, _ in runs])   # (sessions, reps)
+        bad_s = np.array([b for _, b in runs])
+        spread = good_s.std(axis=0).mean()
+        print(f" {name:14s} | {good_s.mean():7.1f} | {bad_s.mean():6.1f} | {good_s.mean() - bad_s.mean():5.1f} | "
+              f"{spread:10.2f} | {min(cost[name]) * 1e6:7.1f}")
+
+if __name__ == "__main__":
+    main()
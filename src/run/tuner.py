@@ -0,0 +1,169 @@
+import argparse
+import itertools
+import json
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import config
+from config import CALIBRATION_FILE, REFERENCE_FILE, REPS_DIR
+from rep_detector import ReplaySession, count_reps
+from motion import detection_setup, linear_acceleration_batch
+from filters import filter_batch
+from profiles import profile_paths
+
+LABELS_FILE = os.path.join(REPS_DIR, "labels.json")
+
+# 검출 허용 오차 파라미터는 세션의 Baseline에 실제로 적용되는 규칙(threshold_rule)의 것만 탐색
+THRESHOLD_SPACE = {
+    "PERCENT": {
+        "MOVEMENT_TOLERANCE_PERCENT": [0.04, 0.06, 0.08, 0.10, 0.12, 0.15],
+        "MIN_ABS_DIFF": [150, 200, 300, 400, 600, 800],
+    },
+    "NOISE": {
+        "NOISE_SIGMA_K": [3.0, 4.0, 5.0, 6.0, 8.0, 10.0],
+        "MIN_NOISE_TOLERANCE": [50, 100, 150, 200, 300, 400],
+    },
+}
+# 피크 구역 허용 오차는 Reference의 파이프라인별로 따로 탐색
+PEAK_SPACE = {
+    "RAW": {"PEAK_TOLERANCE_PERCENT": [0.05, 0.1, 0.15, 0.2, 0.25, 0.3, 0.4]},
+    "LINEAR": {"LINEAR_PEAK_TOLERANCE_PERCENT": [0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8]},
+}
+# 규칙과 무관한 검출 파라미터 (grid는 각 값의 조합, random은 min~max 구간에서 균등 샘플링)
+DETECTION_SPACE = {
+    "STILL_TIME_LIMIT": [0.2, 0.3, 0.4, 0.5, 0.6, 0.8, 1.0],
+}
+# 탐색하지 않는 파라미터는 config.py 값 (비율 규칙은 활성 축 판정과 std 없는 Baseline에 계속 쓰임)
+REPLAY_PARAMS = ["MOVEMENT_TOLERANCE_PERCENT", "MIN_ABS_DIFF", "STILL_TIME_LIMIT", "PEAK_TOLERANCE_PERCENT",
+                 "LINEAR_PEAK_TOLERANCE_PERCENT", "NOISE_SIGMA_K", "MIN_NOISE_TOLERANCE"]
+
+# Worker process state (set once per process by _init_worker)
+_sessions = None
+
+def load_sessions(labels_path=LABELS_FILE, archive_dir=REPS_DIR, ref_path=REFERENCE_FILE, baseline_path=CALIBRATION_FILE):
+    """Labeled archived sets prepared for replay. labels.json maps set file name -> true rep count"""
+    with open(labels_path, "r") as f:
+        labels = json.load(f)
+    with open(ref_path, "r") as f:
+        ref_data = json.load(f)
+    with open(baseline_path, "r") as f:
+        raw_baseline = json.load(f)
+    linear = ref_data.get("pipeline") == "LINEAR"
+    _, baseline = detection_setup(raw_baseline, ref_data.get("pipeline", "RAW"))
+
+    sessions = []
+    for name, count in labels.items():
+        path = os.path.join(archive_dir, name)
+        if not os.path.exists(path):
+            print(f"[WARNING] Labeled set not found: {path}")
+            continue
+        with open(path, "r") as f:
+            set_data = filter_batch(json.load(f)["data"])
+        if linear:
+            set_data = linear_acceleration_batch(set_data, raw_baseline)
+        sessions.append(ReplaySession(set_data, baseline, ref_data, label=int(count), name=name))
+    return sessions
+
+def threshold_rule(baseline):
+    """Tolerance rule get_tolerances applies to this baseline (NOISE needs the calibrated "std")"""
+    return "NOISE" if config.THRESHOLD_MODE == "NOISE" and baseline.get("std") else "PERCENT"
+
+def search_space(sessions):
+    """Threshold and peak parameters of every rule/pipeline in use across the sessions, plus the detection parameters"""
+    space = {}
+    for rule in sorted({threshold_rule(s.baseline) for s in sessions}):
+        space.update(THRESHOLD_SPACE[rule])
+    for pipeline in sorted({s.pipeline for s in sessions}):
+        space.update(PEAK_SPACE[pipeline])
+    return {**space, **DETECTION_SPACE}
+
+def grid_configs(space):
+    names = list(space)
+    return [dict(zip(names, values)) for values in itertools.product(*(space[k] for k in names))]
+
+def random_configs(space, n, seed=None):
+    rng = random.Random(seed)
+    return [{k: rng.uniform(min(vals), max(vals)) for k, vals in space.items()} for _ in range(n)]
+
+def evaluate(params, sessions):
+    """(total absolute count error, exact-match sessions) for one parameter set"""
+    p = {k: params.get(k, getattr(config, k)) for k in REPLAY_PARAMS}
+    total_err = 0
+    exact = 0
+    for s in sessions:
+        peak_tol = p["LINEAR_PEAK_TOLERANCE_PERCENT"] if s.pipeline == "LINEAR" else p["PEAK_TOLERANCE_PERCENT"]
+        pred = count_reps(s, p["MOVEMENT_TOLERANCE_PERCENT"], p["MIN_ABS_DIFF"], p["STILL_TIME_LIMIT"],
+                          peak_tol, noise_sigma_k=p["NOISE_SIGMA_K"],
+                          min_noise_tol=p["MIN_NOISE_TOLERANCE"])
+        total_err += abs(pred - s.label)
+        exact += (pred == s.label)
+    return total_err, exact
+
+def _init_worker(sessions):
+    global _sessions
+    _sessions = sessions
+
+def _evaluate_batch(batch):
+    return [(params, *evaluate(params, _sessions)) for params in batch]
+
+def run_search(sessions, configs, workers=None, chunk_size=256):
+    """Evaluate all configs in parallel, best first"""
+    chunks = [configs[i:i + chunk_size] for i in range(0, len(configs), chunk_size)]
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(sessions,)) as pool:
+        results = [row for rows in pool.map(_evaluate_batch, chunks) for row in rows]
+    # 오차 합이 작을수록, 같으면 정확히 맞힌 세트가 많을수록 우선
+    results.sort(key=lambda r: (r[1], -r[2]))
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Tune rep detection thresholds against labeled recordings")
+    parser.add_argument("--profile", default=None, help="User profile (sets the archive/reference/baseline defaults)")
+    parser.add_argument("--labels", default=None, help="JSON mapping set file name -> true rep count (default: <archive>/labels.json)")
+    parser.add_argument("--archive", default=None)
+    parser.add_argument("--reference", default=None)
+    parser.add_argument("--baseline", default=None)
+    parser.add_argument("--random", type=int, default=0, help="Random search with N samples instead of the full grid")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+    if args.profile:
+        baseline_path, ref_path, archive_dir = profile_paths(args.profile)
+    else:
+        baseline_path, ref_path, archive_dir = CALIBRATION_FILE, REFERENCE_FILE, REPS_DIR
+    args.archive = args.archive or archive_dir
+    args.reference = args.reference or ref_path
+    args.baseline = args.baseline or baseline_path
+    args.labels = args.labels or os.path.join(args.archive, "labels.json")
+
+    sessions = load_sessions(args.labels, args.archive, args.reference, args.baseline)
+    if not sessions:
+        print(">>> No labeled sessions to tune against.")
+        return
+    rules = sorted({threshold_rule(s.baseline) for s in sessions})
+    if config.THRESHOLD_MODE == "NOISE" and "PERCENT" in rules:
+        print("[WARNING] THRESHOLD_MODE is NOISE but the baseline has no noise stats (\"std\"): "
+              "the percent rule is in effect (re-calibrate to use NOISE)")
+    space = search_space(sessions)
+    configs = random_configs(space, args.random, args.seed) if args.random else grid_configs(space)
+    pipelines = sorted({s.pipeline for s in sessions})
+    print(f">>> Tuning ({'/'.join(rules)} thresholds, {'/'.join(pipelines)} reference): "
+          f"{len(configs)} configurations x {len(sessions)} sessions")
+
+    t0 = time.time()
+    results = run_search(sessions, configs, args.workers)
+    elapsed = time.time() - t0
+    print(f">>> Done in {elapsed:.1f}s ({len(configs) / elapsed * 60:.0f} configs/min)")
+
+    current = {k: getattr(config, k) for k in space}
+    err, exact = evaluate(current, sessions)
+    print(f"\n Current config.py | Error: {err:3d} | Exact: {exact}/{len(sessions)} | {current}")
+    print("-" * 60)
+    for params, err, exact in results[:args.top]:
+        shown = {k: round(v, 3) for k, v in params.items()}
+        print(f" Error: {err:3d} | Exact: {exact}/{len(sessions)} | {shown}")
+
+if __name__ == "__main__":
+    main()
@@ -1,42 +1,64 @@
 import matplotlib.pyplot as plt
+from matplotlib.collections import LineCollection
+import numpy as np
 import os
 import json
 from datetime import datetime
 from config import GRAPH_DIR, REFERENCE_FILE
+from report import decimate_minmax
+from graph_assets import enforce_retention
 
-def save_movement_graph(ax_list, ay_list, az_list, movement_num, similarity=None, offsets=None):
+MOVEMENT_FIGSIZE = (12, 6)
+MOVEMENT_DPI = 150
+# 그림 전체 폭의 픽셀 열 수: 열마다 min/max 두 점이면 원본과 같은 모양 (축 영역은 이보다 좁음)
+PIXEL_COLUMNS = int(MOVEMENT_FIGSIZE[0] * MOVEMENT_DPI)
+
+def decimate_for_plot(values, columns=PIXEL_COLUMNS):
+    """(x, y) with at most one min/max pair per pixel column"""
+    return decimate_minmax(values, 2 * columns)
+
+def expert_overlay(ref, offsets, colors=(("ax", 'r'), ("ay", 'g'), ("az", 'b'))):
+    """All repeated expert traces as one dashed LineCollection (one segment per rep and axis)"""
+    segments, seg_colors = [], []
+    for axis, color in colors:
+        x, y = decimate_for_plot(ref[axis])
+        for offset in offsets:
+            segments.append(np.column_stack((x + offset, y)))
+            seg_colors.append(color)
+    return LineCollection(segments, colors=seg_colors, linestyles='--', alpha=0.3, linewidths=plt.rcParams['lines.linewidth'])
+
+def save_movement_graph(ax_list, ay_list, az_list, movement_num, similarity=None, offsets=None, ref=None):
     if len(ax_list) < 5: return
     
-    plt.figure(figsize=(12, 6))
+    plt.figure(figsize=MOVEMENT_FIGSIZE)
     
     if movement_num == 0:
         # 전문가 동작 시각화
-        plt.plot(ax_list, 'r-', label="ax")
-        plt.plot(ay_list, 'g-', label="ay")
-        plt.plot(az_list, 'b-', label="az")
+        plt.plot(*decimate_for_plot(ax_list), 'r-', label="ax")
+        plt.plot(*decimate_for_plot(ay_list), 'g-', label="ay")
+        plt.plot(*decimate_for_plot(az_list), 'b-', label="az")
         plt.title("Expert Movement (Reference)")
         filename = "expert_movement.png"
     else:
         # [요청 반영] 전문가 가이드(점선) 오버레이
-        if offsets and os.path.exists(REFERENCE_FILE):
+        if offsets and (ref is not None or os.path.exists(REFERENCE_FILE)):
             try:
-                with open(REFERENCE_FILE, "r") as f:
-                    ref = json.load(f)
-                
-                for idx, offset in enumerate(offsets):
-                    x_range = range(offset, offset + len(ref["ax"]))
-                    # 범례가 중복되지 않도록 처음 한 번만 label 추가
-                    lbl_prefix = "Expert " if idx == 0 else ""
-                    plt.plot(x_range, ref["ax"], 'r--', alpha=0.3, label=f"{lbl_prefix}ax" if idx == 0 else None)
-                    plt.plot(x_range, ref["ay"], 'g--', alpha=0.3, label=f"{lbl_prefix}ay" if idx == 0 else None)
-                    plt.plot(x_range, ref["az"], 'b--', alpha=0.3, label=f"{lbl_prefix}az" if idx == 0 else None)
+                if ref is None:
+                    with open(REFERENCE_FILE, "r") as f:
+                        ref = json.load(f)
+
+                # 회차 수와 무관하게 아티스트 하나로 그림 (범례는 빈 선으로 축별 한 번만)
+                plt.gca().add_collection(expert_overlay(ref, offsets))
+                plt.plot([], [], 'r--', alpha=0.3, label="Expert ax")
+                plt.plot([], [], 'g--', alpha=0.3, label="Expert ay")
+                plt.plot([], [], 'b--', alpha=0.3, label="Expert az")
             except Exception as e:
                 print(f"[ERROR] Failed to overlay expert data: {e}")
 
         # 사용자 세트(스텝) 전체 운동 파형
-        plt.plot(ax_list, 'r-', alpha=0.8, label="User ax")
-        plt.plot(ay_list, 'g-', alpha=0.8, label="User ay")
-        plt.plot(az_list, 'b-', alpha=0.8, label="User az")
+        plt.plot(*decimate_for_plot(ax_list), 'r-', alpha=0.8, label="User ax")
+        plt.plot(*decimate_for_plot(ay_list), 'g-', alpha=0.8, label="User ay")
+        plt.plot(*decimate_for_plot(az_list), 'b-', alpha=0.8, label="User az")
         
         title = f"Workout Set #{movement_num}"
         if similarity: title += f" | Avg Accuracy: {similarity:.1f}%"
@@ -52,20 +74,22 @@ def save_movement_graph(ax_list, ay_list, az_list, movement_num, similarity=None
     
     filepath = os.path.join(GRAPH_DIR, filename)
     plt.tight_layout()
-    plt.savefig(filepath, dpi=150)
+    plt.savefig(filepath, dpi=MOVEMENT_DPI)
     plt.close()
     print(f">>> Graph saved: {filepath}")
+    enforce_retention()
     return filename
 
-def save_calibration_graph(ax_list, ay_list, az_list, baseline):
+def save_calibration_graph(baseline, tolerances):
+        """Baseline per axis with the measured noise (±sigma) and movement tolerance bands"""
+        std = baseline.get("std", {})
         plt.figure(figsize=(10, 5))
-        plt.plot(ax_list, 'r-', alpha=0.3, label="ax")
-        plt.plot(ay_list, 'g-', alpha=0.3, label="ay")
-        plt.plot(az_list, 'b-', alpha=0.3, label="az")
-        plt.axhline(y=baseline["ax"], color='r', linestyle='--', label=f"Ref ax ({baseline['ax']:.0f})")
-        plt.axhline(y=baseline["ay"], color='g', linestyle='--', label=f"Ref ay ({baseline['ay']:.0f})")
-        plt.axhline(y=baseline["az"], color='b', linestyle='--', label=f"Ref az ({baseline['az']:.0f})")
-        plt.title("Calibration Baseline (5 Seconds)")
+        for axis, color in (("ax", 'r'), ("ay", 'g'), ("az", 'b')):
+            base, sigma, tol = baseline[axis], std.get(axis, 0.0), tolerances[axis]
+            plt.axhline(y=base, color=color, linestyle='--', label=f"Ref {axis} ({base:.0f}, σ={sigma:.0f})")
+            plt.axhspan(base - tol, base + tol, color=color, alpha=0.08)
+            plt.axhspan(base - sigma, base + sigma, color=color, alpha=0.25)
+        plt.title(f"Calibration Baseline ({baseline.get('n', 0)} samples, shaded: ±σ / movement tolerance)")
         plt.legend()
         plt.grid(True, alpha=0.3)
         filepath = os.path.join(GRAPH_DIR, "calibration_baseline.png")
@@ -0,0 +1,64 @@
+import collections
+import math
+import threading
+from config import WAVEFORM_BUCKET, WAVEFORM_POINTS
+
+class LiveWaveform:
+    """Live accel magnitude stream, downsampled to the min and max of each bucket of samples.
+
+    The two extremes are kept in the order they occurred, so the trace keeps the
+    shape of the signal. Magnitudes are computed once per incoming sample; the
+    dashboard only receives the buckets it has not seen yet (see delta_since).
+    """
+
+    def __init__(self, bucket_size=WAVEFORM_BUCKET, max_points=WAVEFORM_POINTS):
+        self.bucket_size = bucket_size
+        self.lock = threading.Lock()
+        self.points = collections.deque(maxlen=max_points)  # (seq, 먼저 나온 극값, 나중 극값)
+        self.seq = 0
+        self._reset_bucket()
+
+    def _reset_bucket(self):
+        self._b_min = math.inf
+        self._b_max = -math.inf
+        self._b_min_i = self._b_max_i = 0
+        self._b_n = 0
+
+    def add(self, ax, ay, az):
+        mag = math.sqrt(ax * ax + ay * ay + az * az)
+        if mag < self._b_min: self._b_min, self._b_min_i = mag, self._b_n
+        if mag > self._b_max: self._b_max, self._b_max_i = mag, self._b_n
+        self._b_n += 1
+        if self._b_n >= self.bucket_size:
+            # 버킷 안에서 나온 순서대로 (하강 구간이면 max -> min)
+            lo, hi = int(self._b_min), int(self._b_max)
+            pair = (lo, hi) if self._b_min_i <= self._b_max_i else (hi, lo)
+            with self.lock:
+                self.seq += 1
+                self.points.append((self.seq, *pair))
+            self._reset_bucket()
+
+    def delta_since(self, last_seq, last_value=0):
+        """New points after last_seq as a delta-encoded flat list.
+
+        Returns (seq, reset, deltas, last_value) or None when nothing is new. Values are
+        the two extremes of each bucket in time order, each encoded as the difference
+        to the previous value;
+        when the client is new or fell behind the history, reset is True and decoding
+        starts from 0 instead of the client's last value.
+        """
+        with self.lock:
+            if self.seq == last_seq:
+                return None
+            oldest = self.points[0][0] if self.points else self.seq + 1
+            reset = last_seq == 0 or last_seq < oldest - 1 or last_seq > self.seq
+            new = list(self.points) if reset else [p for p in self.points if p[0] > last_seq]
+            seq = self.seq
+
+        prev = 0 if reset else last_value
+        deltas = []
+        for _, first, second in new:
+            deltas.append(first - prev)
+            deltas.append(second - first)
+            prev = second
+        return seq, reset, deltas, prev
@@ -1,9 +1,41 @@
-from flask import Flask, Response, send_from_directory
+from flask import Flask, Response, send_from_directory, send_file, request, abort
 import os
 import json
 import time
-from config import BASE_DIR, GRAPH_DIR
+from config import BASE_DIR, GRAPH_DIR, WEB_PORT, WEB_SERVER_MODE, OVERVIEW_INTERVAL
 from state import AppState
+from profiles import list_profiles
+from report import archive_path, build_set_report
+import graph_assets
+
+# Include advice, advice_status, humidity, and latest_graph in the change tracking
+TRACKED_KEYS = ["count", "similarity", "is_moving", "mode", "advice", "advice_status", "humidity", "connection_phase",
+                "is_set_active", "set_count", "latest_graph", "latest_report", "profile",
+                "last_rep", "device", "expert_takes"]
+
+def wave_frame(delta):
+    # 라이브 파형: 클라이언트가 아직 받지 않은 버킷만 델타로 전송
+    _, reset, deltas, _ = delta
+    return f"data: {json.dumps({'type': 'wave', 'reset': reset, 'd': deltas}, separators=(',', ':'))}\n\n"
+
+def update_frame(stats):
+    return f"data: {json.dumps({'type': 'update', **stats})}\n\n"
+
+def stats_changed(stats, last_sent):
+    return any(stats.get(key) != last_sent.get(key) for key in TRACKED_KEYS)
+
+def station_summaries(sessions):
+    """Compact per-dumbbell summaries for the overview stream (gym display)"""
+    summaries = []
+    for device_id, session in sessions.stations():
+        st = session.stats
+        summaries.append({"device": device_id, "count": st["count"], "similarity": round(st["similarity"], 1),
+                          "mode": st["mode"], "set_count": st["set_count"], "is_set_active": st["is_set_active"],
+                          "online": session.owner is not None})
+    return summaries
+
+def overview_frame(summaries):
+    return f"data: {json.dumps({'type': 'overview', 'stations': summaries}, separators=(',', ':'))}\n\n"
 
 class WebServer:
     def __init__(self):
@@ -14,17 +46,55 @@ class WebServer:
     def _setup_routes(self):
         self.app.add_url_rule('/', 'index', self.index)
         self.app.add_url_rule('/stream', 'stream', self.stream)
+        self.app.add_url_rule('/stream/<device>', 'device_stream', self.stream)
+        self.app.add_url_rule('/overview', 'overview', self.overview)
+        self.app.add_url_rule('/overview/stream', 'overview_stream', self.overview_stream)
         self.app.add_url_rule('/connect_dumbbell', 'connect_dumbbell', self.connect_dumbbell, methods=['POST'])
         self.app.add_url_rule('/graph/<path:filename>', 'get_graph', self.get_graph)
+        self.app.add_url_rule('/report/<profile>/<filename>', 'set_report', self.set_report)
+        self.app.add_url_rule('/profiles', 'profiles', self.profiles)
+        self.app.add_url_rule('/profile', 'select_profile', self.select_profile, methods=['POST'])
 
     def index(self):
         return send_from_directory(os.path.join(BASE_DIR, 'ui'), 'index.html')
 
-    def stream(self):
-        return Response(self._generate_events(), mimetype="text/event-stream")
+    def stream(self, device=None):
+        # 기기를 지정하지 않으면 가장 최근에 접속한 아령을 따라감 (단일 아령 대시보드)
+        return Response(self._generate_events(device), mimetype="text/event-stream")
+
+    def overview(self):
+        return send_from_directory(os.path.join(BASE_DIR, 'ui'), 'overview.html')
+
+    def overview_stream(self):
+        return Response(self._generate_overview(), mimetype="text/event-stream")
 
     def get_graph(self, filename):
-        return send_from_directory(GRAPH_DIR, filename)
+        # ?w=<px>: 캐시된 썸네일 (WebP 지원 브라우저는 WebP), 없으면 원본
+        if os.path.basename(filename) != filename:
+            abort(404)
+        original = os.path.join(GRAPH_DIR, filename)
+        if not os.path.isfile(original):
+            abort(404)
+        path = original
+        width = graph_assets.snap_width(request.args.get("w", 0, type=int)) if request.args.get("w") else None
+        if width:
+            path = graph_assets.thumbnail(filename, width, webp=request.accept_mimetypes["image/webp"] > 0)
+            graph_assets.touch(path)
+        graph_assets.touch(original) # 썸네일만 보여도 원본이 최근 사용으로 남도록
+
+        response = send_file(path, etag=graph_assets.etag_for(path), conditional=True)
+        response.headers["Cache-Control"] = graph_assets.cache_control(filename)
+        if width:
+            response.headers["Vary"] = "Accept"
+        return response
+
+    def set_report(self, profile, filename):
+        # 세트 아카이브에서 축별로 축약된 파형 + 회차 오프셋 + 전문가 오버레이 (Chart.js로 클라이언트 렌더링)
+        path = archive_path(profile, filename)
+        if path is None:
+            return {"status": "error", "message": "Report not found"}, 404
+        ref_data = self.app_state.profiles.get(profile).ref_data
+        return build_set_report(path, ref_data)
 
     def connect_dumbbell(self):
         print("\n[WEB] '아령 연결하기' 버튼 클릭됨! 아령 연결을 허용합니다.")
@@ -32,21 +102,76 @@ class WebServer:
         self.app_state.stats["connection_phase"] = "WAITING_DUMBBELL"
         return {"status": "success", "message": "Dumbbell connection allowed"}
 
-    def _generate_events(self):
-        stats = self.app_state.stats
+    def profiles(self):
+        stats, _ = self.app_state.view(request.args.get("device"))
+        return {"profiles": list_profiles(), "active": stats.get("profile")}
+
+    def select_profile(self):
+        # 새 프로필 이름이면 디렉터리가 생성되고 캘리브레이션부터 시작
+        body = request.get_json(silent=True) or {}
+        name, device = body.get("name", ""), body.get("device")
+        try:
+            self.app_state.profiles.get(name) # 캐시에 미리 로드 (전환 즉시 적용)
+        except Exception as e:
+            return {"status": "error", "message": str(e)}, 400
+        if device:
+            session = self.app_state.sessions.get(device)
+            if session is None:
+                return {"status": "error", "message": f"Unknown device: {device}"}, 404
+            sessions = [session]
+        else:
+            # 기기 지정이 없으면 기본 프로필 + 접속 중인 모든 아령 (세트가 끝난 뒤 적용)
+            self.app_state.stats["profile"] = name
+            sessions = [s for _, s in self.app_state.sessions.stations()]
+        for session in sessions:
+            session.stats["profile"] = name
+        print(f"\n[WEB] 프로필 선택: {name}" + (f" ({device})" if device else ""))
+        return {"status": "success", "profile": name}
+
+    def _generate_events(self, device=None):
         last_sent = {}
+        last_waveform = None
+        wave_seq, wave_value = 0, 0
         
         while True:
-            # Include advice, advice_status, humidity, and latest_graph in the change tracking
-            for key in ["count", "similarity", "is_moving", "mode", "advice", "advice_status", "humidity", "connection_phase", "is_set_active", "set_count", "latest_graph"]:
-                if stats.get(key) != last_sent.get(key):
-                    yield f"data: {json.dumps({'type': 'update', **stats})}\n\n"
-                    last_sent = stats.copy()
-                    break
+            stats, waveform = self.app_state.view(device)
+            if waveform is not last_waveform:
+                # 다른 아령(새 세션)으로 바뀌면 파형을 처음부터 다시 받음
+                last_waveform = waveform
+                wave_seq, wave_value = 0, 0
+            delta = waveform.delta_since(wave_seq, wave_value)
+            if delta:
+                wave_seq, _, _, wave_value = delta
+                yield wave_frame(delta)
+
+            if stats_changed(stats, last_sent):
+                last_sent = stats
+                yield update_frame(last_sent)
             time.sleep(0.1)
 
-    def run(self):
-        self.app.run(host='0.0.0.0', port=80, debug=False, use_reloader=False)
+    def _generate_overview(self):
+        last_sent = None
+        while True:
+            summaries = station_summaries(self.app_state.sessions)
+            if summaries != last_sent:
+                last_sent = summaries
+                yield overview_frame(summaries)
+            time.sleep(OVERVIEW_INTERVAL)
+
+    def run(self, host='0.0.0.0', port=WEB_PORT, mode=WEB_SERVER_MODE):
+        """Serve the dashboard: "async" (asyncio SSE fan-out, see async_server.py) or Flask's "dev" server"""
+        if mode == "async":
+            from async_server import AsyncWebServer
+            self.server = AsyncWebServer(self, host, port)
+            self.server.serve_forever()
+        else:
+            self.app.run(host=host, port=port, debug=False, use_reloader=False, threaded=True)
+
+    def shutdown(self, timeout=5.0):
+        """Graceful stop (async mode): close streams, finish in-flight requests"""
+        server = getattr(self, "server", None)
+        if server is not None:
+            server.shutdown(timeout)
 
 def run_flask_server():
     server = WebServer()
@@ -0,0 +1,328 @@
+import argparse
+import asyncio
+import json
+import math
+import os
+import socket
+import tempfile
+import threading
+import time
+import urllib.request
+from collections import namedtuple
+from datetime import datetime
+
+import numpy as np
+
+from config import (PORT, WEB_PORT, SAMPLE_RATE_HZ, CALIBRATION_TIME, ACC_LSB_PER_G, G, GYRO_LSB_PER_DPS, DEG2RAD,
+                    PUBLISH_ADDRESS, EXPERT_TAKES)
+from pubsub_client import Subscriber
+
+# 정답 라벨은 실제 세트 아카이브(reps/)와 섞이지 않도록 임시 폴더에 기록 (--labels로 변경)
+LABELS_FILE = os.path.join(tempfile.gettempdir(), "dumbbell_synthetic_labels.json")
+FORM_ERRORS = ("partial", "swing", "jerk")
+INT16 = 32767
+
+# 한 회차의 정답 파라미터 (duration: 초, concentric: 들어올리는 구간 비율, amplitude: 팔 회전 각도 rad)
+RepSpec = namedtuple("RepSpec", ["duration", "concentric", "amplitude", "form"])
+# 장치 하나의 전체 스트림: rows는 (n, 7) int 배열 (ax,ay,az,gx,gy,gz,btn), labels는 정답 기록
+DeviceStream = namedtuple("DeviceStream", ["device", "rows", "labels"])
+
+def _span(text):
+    """"a-b" -> (a, b), "a" -> (a, a)"""
+    lo, _, hi = str(text).partition("-")
+    return float(lo), float(hi or lo)
+
+def _angle(spec, rate):
+    """Forearm roll angle, its rate and acceleration for one rep (cosine ease up, then down to exactly 0)"""
+    n = max(int(round(spec.duration * rate)), 4)
+    n_up = min(max(int(round(n * spec.concentric)), 2), n - 2)
+    t_up = np.arange(n_up) / rate
+    t_down = np.arange(1, n - n_up + 1) / rate
+    T_up, T_down = n_up / rate, (n - n_up) / rate
+    A = spec.amplitude
+    w_up, w_down = math.pi / T_up, math.pi / T_down
+    theta = np.concatenate((A * (1 - np.cos(w_up * t_up)) / 2, A * (1 + np.cos(w_down * t_down)) / 2))
+    rate_ = np.concatenate((A * w_up / 2 * np.sin(w_up * t_up), -A * w_down / 2 * np.sin(w_down * t_down)))
+    accel = np.concatenate((A * w_up ** 2 / 2 * np.cos(w_up * t_up), -A * w_down ** 2 / 2 * np.cos(w_down * t_down)))
+    return theta, rate_, accel
+
+def rep_motion(spec, rate, radius):
+    """(n, 6) float sensor values for one curl: gravity seen by the rotating sensor + linear accel + gyro"""
+    roll, droll, ddroll = _angle(spec, rate)
+    n = len(roll)
+    pitch = np.zeros(n)
+    if spec.form == "swing":
+        # 몸통 반동: 회차 동안 옆으로 한 번 흔들림 (피치 축)
+        pitch = 0.35 * spec.amplitude * np.sin(2 * math.pi * np.arange(1, n + 1) / n)
+
+    g = ACC_LSB_PER_G
+    to_counts = ACC_LSB_PER_G / G
+    to_gyro = GYRO_LSB_PER_DPS / DEG2RAD
+    # 중력 성분은 MotionPipeline이 빼는 것과 같은 식: (-g sin p, g sin r cos p, g cos r cos p)
+    out = np.empty((n, 6))
+    out[:, 0] = -g * np.sin(pitch)
+    out[:, 1] = g * np.sin(roll) * np.cos(pitch) + radius * ddroll * to_counts   # 접선 가속도
+    out[:, 2] = g * np.cos(roll) * np.cos(pitch) - radius * droll ** 2 * to_counts  # 구심 가속도
+    # 자이로는 샘플 간 각도 변화: 서버의 상보 필터가 샘플 주기로 적분하면 정확히 같은 자세가 됨
+    out[:, 3] = np.diff(roll, prepend=0.0) * rate * to_gyro
+    out[:, 4] = np.diff(pitch, prepend=0.0) * rate * to_gyro
+    out[:, 5] = 0.0
+    return out
+
+def still(seconds, rate):
+    n = max(int(round(seconds * rate)), 1)
+    out = np.zeros((n, 6))
+    out[:, 2] = ACC_LSB_PER_G
+    return out
+
+def random_rep(rng, args, form_error=True):
+    form = None
+    if form_error and rng.random() < args.form_error_rate:
+        form = FORM_ERRORS[rng.integers(len(FORM_ERRORS))]
+    duration = rng.uniform(*_span(args.tempo))
+    concentric = rng.uniform(0.35, 0.5)
+    amplitude = rng.uniform(*_span(args.amplitude))
+    if form == "partial":
+        amplitude *= rng.uniform(0.55, 0.75)
+    elif form == "jerk":
+        # 반동으로 빠르게 들어올리고 천천히 내림
+        concentric = 0.2
+        duration *= 0.8
+    return RepSpec(round(duration, 3), round(concentric, 3), round(amplitude, 3), form)
+
+def synthesize_device(device, rng, args):
+    """One device session: calibration stillness, expert takes, then sets with button toggles"""
+    rate = args.rate
+    segments = []  # (values (n, 6), btn)
+    labels = {"device": device, "profile": args.profile, "expert": [], "sets": []}
+    cursor = 0
+
+    def add(values, btn):
+        nonlocal cursor
+        segments.append((values, btn))
+        start = cursor
+        cursor += len(values)
+        return start, cursor
+
+    add(still(1.0, rate), 0)
+    labels["calibration"] = list(add(still(CALIBRATION_TIME + 1.0, rate), 0))
+    for _ in range(args.expert_reps):
+        # 전문가도 매번 똑같지는 않음: 평균 템포/가동범위 주변에서 조금씩 흔들림
+        spec = RepSpec(round(float(np.mean(_span(args.tempo))) * rng.uniform(0.95, 1.05), 3),
+                       round(rng.uniform(0.4, 0.44), 3),
+                       round(float(np.mean(_span(args.amplitude))) * rng.uniform(0.97, 1.03), 3), None)
+        start, end = add(rep_motion(spec, rate, args.radius), 0)
+        labels["expert"].append({"start": start, "end": end, **spec._asdict()})
+        add(still(2.0, rate), 0)
+
+    lo, hi = (int(v) for v in _span(args.reps))
+    for set_num in range(1, args.sets + 1):
+        set_start, _ = add(still(1.0, rate), 1)
+        reps = []
+        for _ in range(int(rng.integers(lo, hi + 1))):
+            spec = random_rep(rng, args)
+            start, end = add(rep_motion(spec, rate, args.radius), 1)
+            reps.append({"start": start, "end": end, **spec._asdict()})
+            add(still(rng.uniform(*_span(args.rest)), rate), 1)
+        _, set_end = add(still(0.5, rate), 1)
+        labels["sets"].append({"set": set_num, "start": set_start, "end": set_end, "reps": len(reps), "rep_detail": reps})
+        add(still(args.set_rest, rate), 0)
+
+    values = np.concatenate([v for v, _ in segments])
+    btn = np.concatenate([np.full(len(v), b) for v, b in segments])
+    values += rng.normal(0, args.noise, values.shape) * np.array([1, 1, 1, 0.5, 0.5, 0.5])
+    # I2C 글리치: 한 샘플만 크게 튀는 값
+    glitch = rng.random(values.shape) < args.glitch_rate
+    values[glitch] += rng.choice([-1, 1], glitch.sum()) * rng.uniform(10000, 30000, glitch.sum())
+    rows = np.empty((len(values), 7), dtype=int)
+    rows[:, :6] = np.clip(np.round(values), -INT16 - 1, INT16)
+    rows[:, 6] = btn
+    labels["samples"] = len(rows)
+    return DeviceStream(device, rows, labels)
+
+def write_labels(path, streams, args):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    doc = {
+        "generated": datetime.now().strftime("%Y%m%d_%H%M%S"),
+        "seed": args.seed,
+        "rate": args.rate,
+        "params": {k: getattr(args, k) for k in ("sets", "reps", "tempo", "amplitude", "rest", "set_rest", "noise",
+                                                  "glitch_rate", "form_error_rate", "expert_reps", "radius")},
+        "devices": {s.device: s.labels for s in streams},
+    }
+    with open(path, "w") as f:
+        json.dump(doc, f, indent=1)
+    print(f">>> Labels written: {path}")
+
+def env_handshake(host, port, web):
+    """Get the server past its start-up phases: ENV sensor first, then the dashboard's "connect dumbbell" button"""
+    with socket.create_connection((host, port), timeout=10) as s:
+        s.sendall(b"ENV:22.0,45.0\n")
+        try:
+            while s.recv(1024):
+                pass
+        except OSError:
+            pass
+    time.sleep(0.5)
+    urllib.request.urlopen(urllib.request.Request(f"{web}/connect_dumbbell", data=b"", method="POST"), timeout=10).read()
+    print(">>> Server ready for dumbbells (ENV sent, connection allowed)")
+
+class Checker(threading.Thread):
+    """Collects set_end events per device from the server's publisher"""
+
+    def __init__(self, address, expected):
+        super().__init__(daemon=True)
+        self.sub = Subscriber(address)
+        self.expected = expected  # device -> 정답 세트 수
+        self.results = {}  # device -> [(counted reps, receive time)]
+        self.done = threading.Event()
+
+    def run(self):
+        for kind, msg in self.sub:
+            if kind == "event" and msg.get("event") == "set_end":
+                self.results.setdefault(msg.get("device"), []).append((msg.get("count", 0), time.perf_counter()))
+                if all(len(self.results.get(d, ())) >= n for d, n in self.expected.items()):
+                    self.done.set()
+
+async def stream_device(stream, host, port, rate, speed, t0, sent_at, tick=0.02):
+    """Send one device's lines paced at rate * speed (speed 0 = as fast as the socket allows).
+
+    Returns (writer, reader task), or None if the server dropped the connection.
+    """
+    reader, writer = await asyncio.open_connection(host, port)
+    drain = asyncio.create_task(_discard(reader))  # 서버가 보내는 CFG 줄은 읽고 버림
+    lines = [f"{r[0]},{r[1]},{r[2]},{r[3]},{r[4]},{r[5]},{r[6]}\n".encode() for r in stream.rows.tolist()]
+    set_ends = sorted(s["end"] for s in stream.labels["sets"])
+    sent = 0
+    try:
+        writer.write(f"HELLO:{stream.device},{stream.labels['profile']}\n".encode())
+        while sent < len(lines):
+            due = len(lines) if speed <= 0 else min(len(lines), int((time.perf_counter() - t0) * rate * speed) + 1)
+            if due > sent:
+                writer.write(b"".join(lines[sent:due]))
+                await writer.drain()
+                now = time.perf_counter()
+                # 세트 종료(버튼 OFF) 샘플을 보낸 시각: set_end 이벤트 지연 측정용
+                while set_ends and set_ends[0] < due:
+                    sent_at.setdefault(stream.device, []).append(now)
+                    set_ends.pop(0)
+                sent = due
+            await asyncio.sleep(tick)
+    except ConnectionError as e:
+        print(f"[ERROR] {stream.device}: connection lost after {sent} samples ({e})")
+        drain.cancel()
+        return None
+    return writer, drain
+
+async def _discard(reader):
+    try:
+        while await reader.read(4096):
+            pass
+    except ConnectionError:
+        pass
+
+async def run_streams(streams, args, sent_at, checker):
+    t0 = time.perf_counter()
+    conns = await asyncio.gather(*(stream_device(s, args.host, args.port, args.rate, args.speed, t0, sent_at)
+                                   for s in streams))
+    elapsed = time.perf_counter() - t0
+    if checker is not None:
+        # 카운팅 엔진이 밀려 있으면 마지막 세트 결과가 늦게 오므로 모두 받을 때까지 (최대 --wait초) 대기
+        if not await asyncio.get_running_loop().run_in_executor(None, checker.done.wait, args.wait):
+            print(f"[WARNING] Not all set results arrived within {args.wait}s")
+    for conn in conns:
+        if conn is not None:
+            writer, drain = conn
+            writer.close()
+            drain.cancel()
+    return elapsed
+
+def report(streams, checker, sent_at, elapsed):
+    total = sum(len(s.rows) for s in streams)
+    print(f"\n Streamed {total:,} samples from {len(streams)} connection(s) in {elapsed:.1f}s "
+          f"({total / elapsed:,.0f} samples/s)")
+    if checker is None:
+        return
+    abs_err = exact = n_sets = n_true = n_counted = 0
+    latencies = []
+    for s in streams:
+        counted = checker.results.get(s.device, [])
+        for i, truth in enumerate(s.labels["sets"]):
+            n_sets += 1
+            n_true += truth["reps"]
+            if i >= len(counted):
+                abs_err += truth["reps"]
+                continue
+            count, received = counted[i]
+            n_counted += count
+            abs_err += abs(count - truth["reps"])
+            exact += count == truth["reps"]
+            if i < len(sent_at.get(s.device, [])):
+                latencies.append(received - sent_at[s.device][i])
+        if len(streams) <= 10:
+            pairs = ", ".join(f"{t['reps']}->{counted[i][0] if i < len(counted) else '?'}"
+                              for i, t in enumerate(s.labels["sets"]))
+            print(f" {s.device}: reps true->counted {pairs}")
+    print(f" Sets: {n_sets} | exact: {exact} ({exact / max(n_sets, 1):.0%}) | total |error|: {abs_err} reps | "
+          f"count accuracy: {max(0, 1 - abs_err / max(n_true, 1)):.0%} ({n_counted} counted / {n_true} true)")
+    if n_true and not n_counted:
+        # 세트 결과는 왔는데 0회: 전문가 동작이 저장되지 않았거나 움직임이 끝나지 않음 (서버 로그의 Expert/Movement ENDED 확인)
+        print(" [WARNING] The server counted no reps: check that the expert takes were saved and movements end "
+              "(MOTION_PIPELINE, thresholds) in the server log")
+    if latencies:
+        latencies.sort()
+        pick = lambda q: latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000
+        print(f" set_end latency (button off sent -> event): p50 {pick(0.5):.0f} ms | p99 {pick(0.99):.0f} ms")
+
+def main():
+    parser = argparse.ArgumentParser(description="Synthetic workouts with ground-truth labels, streamed to the dumbbell server")
+    parser.add_argument("--connections", type=int, default=1, help="Simultaneous synthetic dumbbells")
+    parser.add_argument("--sets", type=int, default=3)
+    parser.add_argument("--reps", default="8-12", help="Reps per set (range)")
+    parser.add_argument("--tempo", default="1.8-2.4", help="Seconds per rep (range)")
+    parser.add_argument("--amplitude", default="1.3-1.5", help="Range of motion in rad (range)")
+    parser.add_argument("--rest", default="0.9-1.6", help="Pause between reps in seconds (range)")
+    parser.add_argument("--set-rest", type=float, default=4.0, help="Pause between sets (button off)")
+    parser.add_argument("--noise", type=float, default=60.0, help="Accel noise sigma in raw counts (gyro: half)")
+    parser.add_argument("--glitch-rate", type=float, default=0.001, help="Single-sample spike probability per channel")
+    parser.add_argument("--form-error-rate", type=float, default=0.1, help=f"Share of reps with a form error {FORM_ERRORS}")
+    parser.add_argument("--expert-reps", type=int, default=EXPERT_TAKES, help="Expert takes before the first set (correct form, slight tempo/range variation)")
+    parser.add_argument("--radius", type=float, default=0.3, help="Forearm length in m (linear accel of the curl)")
+    parser.add_argument("--rate", type=float, default=SAMPLE_RATE_HZ, help="Data sample rate (keep at SAMPLE_RATE_HZ for --sample-clock)")
+    parser.add_argument("--speed", type=float, default=1.0, help="Playback speed-up (0 = unthrottled); the server needs --sample-clock above 1")
+    parser.add_argument("--profile", default="synthetic", help="Profile sent in HELLO (all connections)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--labels", default=LABELS_FILE, help="Ground-truth output")
+    parser.add_argument("--dry-run", action="store_true", help="Only generate the labels")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--web", default=f"http://127.0.0.1:{WEB_PORT}", help="Dashboard URL for the connect step")
+    parser.add_argument("--no-handshake", action="store_true", help="Server already accepts dumbbells (skip ENV + connect)")
+    parser.add_argument("--check", nargs="?", const=PUBLISH_ADDRESS, default=None, metavar="ADDR",
+                        help=f"Compare counts with the server's set_end events (server started with --publish, default {PUBLISH_ADDRESS})")
+    parser.add_argument("--wait", type=float, default=60.0, help="Max seconds to wait for set results after the last sample (--check)")
+    args = parser.parse_args()
+
+    streams = [synthesize_device(f"synth-{i:03d}", np.random.default_rng([args.seed, i]), args)
+               for i in range(args.connections)]
+    write_labels(args.labels, streams, args)
+    n = sum(len(s.rows) for s in streams)
+    sets = sum(len(s.labels["sets"]) for s in streams)
+    reps = sum(r["reps"] for s in streams for r in s.labels["sets"])
+    print(f">>> {args.connections} device(s), {n:,} samples ({n / args.rate / max(args.connections, 1):.0f}s of data each), "
+          f"{sets} sets, {reps} reps")
+    if args.dry_run:
+        return
+
+    if not args.no_handshake:
+        env_handshake(args.host, args.port, args.web)
+    checker = None
+    if args.check:
+        checker = Checker(args.check, {s.device: len(s.labels["sets"]) for s in streams})
+        checker.start()
+    sent_at = {}
+    elapsed = asyncio.run(run_streams(streams, args, sent_at, checker))
+    report(streams, checker, sent_at, elapsed)
+
+if __name__ == "__main__":
+    main()